@@ -0,0 +1,170 @@
+import json
+
+from vm import (
+    NUM_REGS, OP_LOAD, OP_LOAD_CONST, OP_ROR, OP_STORE, OPCODE_NAMES, get_predecoded,
+)
+
+# Статический анализ адресов обращений к памяти.
+#
+# В программе нет переходов, поэтому команды выполняются строго по
+# порядку, а значение регистра после LOAD_CONST известно до запуска (в
+# начале все регистры — 0). Проход по предекодированному коду отслеживает
+# такие константы и для каждой команды LOAD/STORE/ROR определяет, известен
+# ли адрес и лежит ли он в памяти. Доказанные обращения выполняются
+# обработчиками *_at с адресом, подставленным в запись команды, — без
+# чтения регистра-адреса и без проверки границ.
+#
+# Анализ верен, пока код совпадает с тем, что был декодирован. STORE,
+# который может записать в ещё не выполненную часть кода (адрес неизвестен
+# или лежит в [pc, code_size)), делает дальнейшие выводы недостоверными:
+# после него доказательства не ставятся. STORE в уже выполненный код
+# на дальнейшее выполнение не влияет.
+
+PROVEN = "proven"             # адрес известен и лежит в памяти
+OUT_OF_RANGE = "out_of_range"  # адрес известен, обращение выдаст ошибку
+UNKNOWN = "unknown"           # адрес зависит от памяти
+UNSAFE = "unsafe"             # выше по коду возможна запись в код
+
+MEMORY_OPS = (OP_LOAD, OP_STORE, OP_ROR)
+
+# Записи *_at помечаются опкодом с этим битом: он вне 6-битного поля A,
+# поэтому цикл выполнения не принимает такой STORE за запись в код.
+UNCHECKED_FLAG = 1 << 6
+
+
+def _exec_load_at(B: int, addr: int, registers: list[int], memory: list[int]):
+    registers[B] = memory[addr]
+
+
+def _exec_store_at(B: int, addr: int, registers: list[int], memory: list[int]):
+    memory[addr] = registers[B]
+
+
+def _exec_ror_at(B: int, addr: int, registers: list[int], memory: list[int]):
+    shift = memory[addr] % 32
+    value = registers[B] & 0xFFFFFFFF
+    registers[B] = ((value >> shift) | (value << (32 - shift))) & 0xFFFFFFFF
+
+
+_UNCHECKED = {OP_LOAD: _exec_load_at, OP_STORE: _exec_store_at, OP_ROR: _exec_ror_at}
+
+
+class AddressReport:
+    """Результат анализа: по записи (pc, операция, регистр-адрес, адрес, статус) на обращение."""
+
+    def __init__(self, code_size: int, memory_size: int):
+        self.code_size = code_size
+        self.memory_size = memory_size
+        self.accesses = []
+        self.unsafe_from = None  # pc первого STORE, после которого анализ не верен
+
+    def count(self, status: str) -> int:
+        return sum(1 for access in self.accesses if access[4] == status)
+
+    def to_dict(self) -> dict:
+        return {
+            "code_size": self.code_size,
+            "memory_size": self.memory_size,
+            "unsafe_from": self.unsafe_from,
+            "summary": {s: self.count(s) for s in (PROVEN, OUT_OF_RANGE, UNKNOWN, UNSAFE)},
+            "accesses": [
+                {"pc": pc, "op": op, "addr_reg": reg, "addr": addr, "status": status}
+                for pc, op, reg, addr, status in self.accesses
+            ],
+        }
+
+    def save_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def report(self) -> str:
+        total = len(self.accesses)
+        lines = [f"Обращений к памяти: {total}"]
+        for status, title in ((PROVEN, "адрес доказан, без проверки"),
+                              (OUT_OF_RANGE, "адрес вне памяти"),
+                              (UNKNOWN, "адрес зависит от памяти"),
+                              (UNSAFE, "после возможной записи в код")):
+            n = self.count(status)
+            share = n / total * 100 if total else 0.0
+            lines.append(f"  {title:<30} {n:>8} ({share:5.1f}%)")
+        if self.unsafe_from is not None:
+            lines.append(f"Анализ прерван STORE по адресу {self.unsafe_from}")
+        return "\n".join(lines)
+
+
+def analyze_addresses(code: list, code_size: int, memory_size: int) -> AddressReport:
+    """Анализирует предекодированный код (см. predecode_program)."""
+    report = AddressReport(code_size, memory_size)
+    consts = [0] * NUM_REGS  # известные значения регистров (None — неизвестно)
+    pc = 0
+    while pc < code_size:
+        entry = code[pc]
+        if entry is None:
+            break  # дальше выполнение остановится ошибкой декодирования
+        _, B, C, size, A = entry
+        if A == OP_LOAD_CONST:
+            consts[B] = C
+        elif A in MEMORY_OPS:
+            addr = consts[C]
+            if report.unsafe_from is not None:
+                status = UNSAFE
+            elif addr is None:
+                status = UNKNOWN
+            elif addr < memory_size:
+                status = PROVEN
+            else:
+                status = OUT_OF_RANGE
+            report.accesses.append((pc, OPCODE_NAMES[A], C, addr, status))
+            if A == OP_STORE:
+                if report.unsafe_from is None and (addr is None or pc <= addr < code_size):
+                    report.unsafe_from = pc
+            else:
+                consts[B] = None  # LOAD/ROR: значение зависит от памяти
+        else:
+            break  # неизвестный опкод: выполнение на нём остановится
+        pc += size
+    return report
+
+
+def apply_unchecked(code: list, report: AddressReport) -> int:
+    """
+    Заменяет в code записи доказанных обращений на обработчики без проверок.
+    STORE в код (нужен сброс предекодированных команд) не заменяется.
+    Возвращает число заменённых команд.
+    """
+    replaced = 0
+    for pc, _, _, addr, status in report.accesses:
+        _, B, _, size, A = code[pc]
+        if status != PROVEN or (A == OP_STORE and addr < report.code_size):
+            continue
+        code[pc] = (_UNCHECKED[A], B, addr, size, A | UNCHECKED_FLAG)
+        replaced += 1
+    return replaced
+
+
+# Результат зависит от байтов кода и размера памяти. Анализ стоит примерно
+# столько же, сколько сэкономленные проверки одного запуска, поэтому он
+# делается только со второго запуска программы (как компиляция блоков).
+ANALYZE_THRESHOLD = 2
+UNCHECKED_CACHE_SIZE = 32
+_unchecked_cache: dict[tuple, list | int] = {}
+
+
+def get_unchecked_code(program_bytes: bytes, memory) -> list:
+    """
+    Копия предекодированного кода, в которой доказанные обращения к памяти
+    идут без проверок границ (анализ кэшируется по программе).
+    """
+    key = (bytes(program_bytes), len(memory))
+    code = _unchecked_cache.pop(key, 0)
+    if isinstance(code, int):
+        runs = code + 1
+        if len(_unchecked_cache) >= UNCHECKED_CACHE_SIZE:
+            del _unchecked_cache[next(iter(_unchecked_cache))]
+        code = get_predecoded(program_bytes, memory)
+        if runs < ANALYZE_THRESHOLD:
+            _unchecked_cache[key] = runs
+            return code
+        apply_unchecked(code, analyze_addresses(code, len(program_bytes), len(memory)))
+    _unchecked_cache[key] = code
+    return code.copy()
@@ -0,0 +1,207 @@
+import hashlib
+import os
+import re
+
+import yaml
+
+from assembler import TEXT_EXTENSION, YamlLoader, assemble, assemble_text, load_program
+
+# Кэш ассемблирования на диске.
+#
+# Ключ записи — sha256 от версии кодировщика и текста исходника, поэтому
+# неизменённая программа берётся из кэша целиком, без разбора YAML.
+# Если файл изменился, список program в блочном стиле режется по строкам
+# на блоки по CHUNK_ITEMS команд, и каждый блок кэшируется отдельно по
+# хэшу своего текста: правка в одном месте перекодирует только её блок.
+# Блоки разбираются как самостоятельные YAML-списки; если это не удаётся
+# (якорь из другого блока, program в потоковом стиле и т.п.), программа
+# ассемблируется целиком, как без кэша.
+#
+# Записи — файлы <ключ>.bin в каталоге кэша. При попадании у файла
+# обновляется mtime; когда суммарный размер превышает max_bytes, удаляются
+# файлы с самым старым mtime (LRU).
+
+# Меняется при любом изменении кодирования команд — старые записи
+# перестают совпадать по ключу и со временем вытесняются.
+ENCODER_VERSION = 1
+
+DEFAULT_CACHE_DIR = ".uvm_asm_cache"
+DEFAULT_MAX_BYTES = 64 << 20
+CHUNK_ITEMS = 1024
+
+_PROGRAM_KEY = re.compile(r"program\s*:\s*(#.*)?$")
+_ITEM = re.compile(r"( *)- ")
+
+
+def content_key(text: str, syntax: str = "yaml") -> str:
+    # у .uasm свой префикс: одинаковый текст в разных форматах — разные ключи
+    prefix = f"uvm-asm-{ENCODER_VERSION}"
+    if syntax != "yaml":
+        prefix += f"-{syntax}"
+    return hashlib.sha256(f"{prefix}\n{text}".encode("utf-8")).hexdigest()
+
+
+class AssemblyCache:
+    def __init__(self, path: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError:
+            pass  # кэш необязателен: без каталога get промахивается, put молчит
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + ".bin")
+
+    def get(self, key: str) -> bytes | None:
+        path = self._file(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # отметка для LRU
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self._file(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)  # параллельные сборки не видят недописанный файл
+        except OSError:
+            # каталог только для чтения, диск заполнен: сборка идёт без кэша
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Удаляет давно не использованные записи, пока кэш больше max_bytes."""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    if entry.name.endswith(".bin") and entry.is_file():
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+        except OSError:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def split_program(text: str) -> tuple[str, list[str], str] | None:
+    """
+    Режет текст исходника на (всё до элементов program, блоки по CHUNK_ITEMS
+    элементов, ключи после program). Возвращает None, если список program
+    не в блочном стиле или размечен нестандартно.
+    """
+    lines = text.splitlines(keepends=True)
+    start = None
+    for i, line in enumerate(lines):
+        if _PROGRAM_KEY.match(line):
+            start = i + 1
+            break
+    if start is None:
+        return None
+
+    indent = None
+    chunks, current, items = [], [], 0
+    end = len(lines)
+    for i in range(start, len(lines)):
+        line = lines[i]
+        item = _ITEM.match(line)
+        if item is not None and indent is None:
+            indent = len(item.group(1))
+        if item is not None and len(item.group(1)) == indent:
+            if items == CHUNK_ITEMS:
+                chunks.append("".join(current))
+                current, items = [], 0
+            items += 1
+        elif line.strip() and not line.lstrip().startswith("#"):
+            column = len(line) - len(line.lstrip(" "))
+            if column == 0 and indent is not None:
+                end = i  # следующий ключ верхнего уровня
+                break
+            if indent is None or column <= indent:
+                return None
+        current.append(line)
+    if indent is None:
+        return None
+    chunks.append("".join(current))
+    return "".join(lines[:start]), chunks, "".join(lines[end:])
+
+
+def _assemble_chunks(text: str, cache: AssemblyCache) -> bytes | None:
+    parts = split_program(text)
+    if parts is None:
+        return None
+    head, chunks, tail = parts
+    # остальные ключи документа должны быть корректным YAML-словарём
+    try:
+        data = yaml.load(head + tail, Loader=YamlLoader)
+    except yaml.YAMLError:
+        return None
+    if not isinstance(data, dict) or "program" not in data or data["program"] is not None:
+        return None
+
+    codes = []
+    for chunk in chunks:
+        key = content_key(chunk)
+        code = cache.get(key)
+        if code is None:
+            try:
+                items = yaml.load(chunk, Loader=YamlLoader)
+            except yaml.YAMLError:
+                return None
+            if not isinstance(items, list):
+                return None
+            code = bytes(assemble(items)[0])
+            cache.put(key, code)
+        codes.append(code)
+    return b"".join(codes)
+
+
+def assemble_cached(source: str, cache: AssemblyCache) -> bytes:
+    """
+    Машинный код программы source с использованием кэша. Файл .uasm
+    разбирается быстро и кэшируется только целиком, без блоков.
+    """
+    with open(source, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    if source.endswith(TEXT_EXTENSION):
+        key = content_key(text, "uasm")
+        code = cache.get(key)
+        if code is None:
+            code = bytes(assemble_text(text)[0])
+            cache.put(key, code)
+            cache.evict()
+        return code
+
+    key = content_key(text)
+    code = cache.get(key)
+    if code is not None:
+        return code
+
+    code = _assemble_chunks(text, cache)
+    if code is None:
+        code = bytes(assemble(load_program(source))[0])
+    cache.put(key, code)
+    cache.evict()
+    return code
@@ -1,46 +1,26 @@
-import sys
+import argparse
+import os
+import tempfile
+
 import yaml
 
+# C-загрузчик (libyaml) в разы быстрее чистого Python, если PyYAML собран с ним
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+STREAM_CHUNK = 1 << 16  # байт машинного кода, накапливаемых перед записью
+SCALAR_CACHE_LIMIT = 4096  # различных скаляров в кэше потокового разбора
+
 
 def load_program(path):
 
     with open(path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
+        data = yaml.load(f, Loader=YamlLoader)
 
     if not isinstance(data, dict) or "program" not in data:
         raise ValueError("В YAML должен быть объект с ключом 'program'")
 
     return data["program"]
 
-def instr_to_fields(ins):
-
-    op = ins["op"].upper()
-
-    if op == "LOAD_CONST":
-        A = 30
-        B = int(ins["dst"])
-        C = int(ins["value"])
-
-    elif op == "LOAD":
-        A = 5
-        B = int(ins["dst"])
-        C = int(ins["addr_reg"])
-
-    elif op == "STORE":
-        A = 33
-        B = int(ins["src"])
-        C = int(ins["addr_reg"])
-
-    elif op == "ROR":
-        A = 37
-        B = int(ins["dst"])
-        C = int(ins["mem_reg"])
-
-    else:
-        raise ValueError("Неизвестная операция:", op)
-
-    return op, A, B, C
-
 def encode_load_const(A: int, B: int, C: int) -> bytes:
 
     A_masked = A & 0x3F            # 6 бит: 0b11_1111
@@ -80,31 +60,35 @@ def encode_ror(A: int, B: int, C: int) -> bytes:
     word = A_masked | (B_masked << 6) | (C_masked << 9)
     return word.to_bytes(2, byteorder="little")
 
-def encode_instruction(op: str, A: int, B: int, C: int) -> bytes:
+# op -> (A, поле для B, поле для C, кодировщик)
+OPCODES = {
+    "LOAD_CONST": (30, "dst", "value", encode_load_const),
+    "LOAD": (5, "dst", "addr_reg", encode_load),
+    "STORE": (33, "src", "addr_reg", encode_store),
+    "ROR": (37, "dst", "mem_reg", encode_ror),
+}
 
-    if op == "LOAD_CONST":
-        return encode_load_const(A, B, C)
-    elif op == "LOAD":
-        return encode_load(A, B, C)
-    elif op == "STORE":
-        return encode_store(A, B, C)
-    elif op == "ROR":
-        return encode_ror(A, B, C)
-    else:
-        raise ValueError("Неизвестная операция при кодировании:", op)
 
+def instr_to_fields(ins):
 
-def main():
-    if len(sys.argv) < 3:
-        print("Использование: python assembler.py source.yaml out.bin [--test]")
-        sys.exit(1)
+    op = ins["op"].upper()
+    spec = OPCODES.get(op)
+    if spec is None:
+        raise ValueError("Неизвестная операция:", op)
 
-    source = sys.argv[1]
-    output = sys.argv[2]
-    test_mode = "--test" in sys.argv
+    A, b_field, c_field, _ = spec
+    return op, A, int(ins[b_field]), int(ins[c_field])
 
-    program = load_program(source)
+def encode_instruction(op: str, A: int, B: int, C: int) -> bytes:
 
+    spec = OPCODES.get(op)
+    if spec is None:
+        raise ValueError("Неизвестная операция при кодировании:", op)
+    return spec[3](A, B, C)
+
+
+def assemble(program) -> tuple[bytearray, list[tuple[int, int, int]]]:
+    """Кодирует список команд программы. Возвращает (байты, список (A, B, C))."""
     abc_list = []
     all_bytes = bytearray()
 
@@ -114,6 +98,337 @@ def main():
         encoded = encode_instruction(op, A, B, C)
         all_bytes.extend(encoded)
 
+    return all_bytes, abc_list
+
+
+# Текстовый формат: одна команда на строку, комментарии после ";" или "#"
+#
+#   LOAD_CONST r5, 748      ; r5 = 748 (C можно писать в hex: 0x2EC)
+#   LOAD r6, [r0]           ; r6 = mem[r0]
+#   STORE r1, [r7]          ; mem[r7] = r1
+#   ROR r7, [r5]            ; r7 = ror(r7, mem[r5])
+#   .byte 0x3F, 0x00        ; байты как есть (то, что не является командой)
+
+TEXT_EXTENSION = ".uasm"
+MAX_CONST = (1 << 17) - 1
+
+
+def _parse_reg(token: str, lineno: int) -> int:
+    token = token.strip()
+    if len(token) == 2 and token[0] in "rR" and "0" <= token[1] <= "7":
+        return ord(token[1]) - 48
+    raise ValueError(f"Строка {lineno}: ожидался регистр r0..r7, получено {token!r}")
+
+
+def _parse_mem(token: str, lineno: int) -> int:
+    token = token.strip()
+    if token[:1] != "[" or token[-1:] != "]":
+        raise ValueError(f"Строка {lineno}: ожидался операнд вида [rN], получено {token!r}")
+    return _parse_reg(token[1:-1], lineno)
+
+
+def _parse_int(token: str, lineno: int, limit: int) -> int:
+    try:
+        value = int(token.strip(), 0)
+    except ValueError:
+        raise ValueError(f"Строка {lineno}: ожидалось число, получено {token.strip()!r}") from None
+    if not (0 <= value <= limit):
+        raise ValueError(f"Строка {lineno}: число {value} вне диапазона 0..{limit}")
+    return value
+
+
+# op -> (A, разбор второго операнда)
+TEXT_OPERANDS = {
+    "LOAD_CONST": (30, lambda t, n: _parse_int(t, n, MAX_CONST)),
+    "LOAD": (5, _parse_mem),
+    "STORE": (33, _parse_mem),
+    "ROR": (37, _parse_mem),
+}
+
+
+def assemble_text(text: str) -> tuple[bytearray, list[tuple[int, int, int]]]:
+    """
+    Ассемблирует программу в текстовом формате.
+    Возвращает то же, что assemble: (байты, список (A, B, C)); .byte в список не попадает.
+    """
+    abc_list = []
+    all_bytes = bytearray()
+
+    for lineno, line in enumerate(text.splitlines(), 1):
+        for mark in ";#":
+            cut = line.find(mark)
+            if cut >= 0:
+                line = line[:cut]
+        parts = line.split(None, 1)
+        if not parts:
+            continue
+
+        op = parts[0].upper()
+        operands = parts[1].split(",") if len(parts) > 1 else []
+        if op == ".BYTE":
+            if not operands:
+                raise ValueError(f"Строка {lineno}: .byte без значений")
+            all_bytes.extend(_parse_int(t, lineno, 0xFF) for t in operands)
+            continue
+
+        spec = OPCODES.get(op)
+        if spec is None:
+            raise ValueError(f"Строка {lineno}: неизвестная операция {parts[0]}")
+        if len(operands) != 2:
+            raise ValueError(f"Строка {lineno}: у {op} должно быть два операнда")
+        A, parse_c = TEXT_OPERANDS[op]
+        B = _parse_reg(operands[0], lineno)
+        C = parse_c(operands[1], lineno)
+        abc_list.append((A, B, C))
+        all_bytes += spec[3](A, B, C)
+
+    return all_bytes, abc_list
+
+
+OPCODE_BY_A = {spec[0]: op for op, spec in OPCODES.items()}
+
+
+def format_instruction(op: str, B: int, C: int) -> str:
+    if op == "LOAD_CONST":
+        return f"LOAD_CONST r{B}, {C}"
+    return f"{op} r{B}, [r{C}]"
+
+
+def _format_bytes(data: bytes) -> str:
+    return ".byte " + ", ".join(f"0x{b:02X}" for b in data)
+
+
+def disassemble(code: bytes) -> list[str]:
+    """
+    Переводит машинный код в текстовый формат (по строке на команду).
+    Поля разбираются decode_program (как в decode_instruction); байты,
+    которые не кодируются обратно в то же самое (неизвестный opcode, лишние
+    старшие биты, неполная команда в конце), выводятся директивой .byte, так что
+    assemble_text(disassemble(code)) == code.
+    """
+    from decoder import decode_program  # NumPy нужен только дизассемблеру
+
+    lines = []
+    decoded = decode_program(code)
+    for pc, A, B, C, size in decoded.instructions():
+        op = OPCODE_BY_A.get(A)
+        if op is not None and OPCODES[op][3](A, B, C) == code[pc:pc + size]:
+            lines.append(format_instruction(op, B, C))
+        else:
+            lines.append(_format_bytes(code[pc:pc + size]))
+    if decoded.end < len(code):
+        lines.append(_format_bytes(code[decoded.end:]))  # хвост короче команды
+    return lines
+
+
+def _compose(loader, event, anchors: dict):
+    """Собирает узел YAML из событий, начиная с уже полученного event."""
+    if isinstance(event, yaml.AliasEvent):
+        if event.anchor not in anchors:
+            raise yaml.composer.ComposerError(
+                None, None, f"неизвестный якорь {event.anchor}", event.start_mark)
+        return anchors[event.anchor]
+
+    if isinstance(event, yaml.ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+        node = yaml.ScalarNode(tag, event.value, event.start_mark, event.end_mark, event.style)
+    elif isinstance(event, yaml.SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.SequenceNode, None, event.implicit)
+        node = yaml.SequenceNode(tag, [], event.start_mark, None, event.flow_style)
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node.value.append(_compose(loader, loader.get_event(), anchors))
+        node.end_mark = loader.get_event().end_mark
+    elif isinstance(event, yaml.MappingStartEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.MappingNode, None, event.implicit)
+        node = yaml.MappingNode(tag, [], event.start_mark, None, event.flow_style)
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = _compose(loader, loader.get_event(), anchors)
+            value = _compose(loader, loader.get_event(), anchors)
+            node.value.append((key, value))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        raise ValueError(f"Неожиданное событие YAML: {event}")
+
+    if getattr(event, "anchor", None) is not None:
+        anchors[event.anchor] = node
+    return node
+
+
+def _construct(loader, event, anchors: dict, scalars: dict):
+    """Строит значение из событий; простые скаляры берутся из кэша scalars."""
+    if type(event) is yaml.ScalarEvent and event.anchor is None and event.tag is None:
+        key = (event.value, event.implicit)
+        value = scalars.get(key, scalars)
+        if value is scalars:
+            value = loader.construct_document(_compose(loader, event, anchors))
+            if len(scalars) >= SCALAR_CACHE_LIMIT:
+                scalars.clear()
+            scalars[key] = value
+        return value
+    return loader.construct_document(_compose(loader, event, anchors))
+
+
+def _read_entry(loader, anchors: dict, scalars: dict):
+    """Читает одну команду. Плоский словарь скаляров собирается без узлов YAML."""
+    event = loader.get_event()
+    if type(event) is not yaml.MappingStartEvent or event.anchor is not None or event.tag is not None:
+        return _construct(loader, event, anchors, scalars)
+    entry = {}
+    while not loader.check_event(yaml.MappingEndEvent):
+        key = _construct(loader, loader.get_event(), anchors, scalars)
+        entry[key] = _construct(loader, loader.get_event(), anchors, scalars)
+    loader.get_event()
+    return entry
+
+
+def iter_program(stream):
+    """
+    Потоково читает команды из ключа program YAML-документа: в памяти
+    одновременно находится только текущая команда, а не весь список.
+    """
+    loader = YamlLoader(stream)
+    anchors = {}
+    scalars = {}  # (текст, implicit) -> значение: операции и номера регистров повторяются
+    try:
+        loader.get_event()  # StreamStart
+        if loader.check_event(yaml.StreamEndEvent):
+            raise ValueError("В YAML должен быть объект с ключом 'program'")
+        loader.get_event()  # DocumentStart
+        if not loader.check_event(yaml.MappingStartEvent):
+            raise ValueError("В YAML должен быть объект с ключом 'program'")
+        loader.get_event()
+
+        found = False
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = _construct(loader, loader.get_event(), anchors, scalars)
+            if key != "program" or not loader.check_event(yaml.SequenceStartEvent):
+                # прочие ключи (и program не-списком) разбираются целиком
+                value = _construct(loader, loader.get_event(), anchors, scalars)
+                if key == "program":
+                    found = True
+                    yield from value
+                continue
+            found = True
+            loader.get_event()
+            while not loader.check_event(yaml.SequenceEndEvent):
+                yield _read_entry(loader, anchors, scalars)
+            loader.get_event()
+
+        if not found:
+            raise ValueError("В YAML должен быть объект с ключом 'program'")
+    finally:
+        loader.dispose()
+
+
+def _umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def assemble_stream(source: str, output: str, chunk_size: int = STREAM_CHUNK) -> tuple[int, int]:
+    """
+    Ассемблирует source в output, не держа в памяти ни программу, ни код:
+    команды читаются по одной, байты пишутся блоками по chunk_size.
+    Код пишется во временный файл рядом с output и подменяет его только
+    после успешного завершения: при ошибке прежний output не испорчен.
+    Возвращает (размер кода в байтах, число команд).
+    """
+    buffer = bytearray()
+    written = count = 0
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output)),
+                                    prefix=".asm-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out, open(source, "r", encoding="utf-8") as src:
+            for ins in iter_program(src):
+                op = ins["op"].upper()
+                spec = OPCODES.get(op)
+                if spec is None:
+                    raise ValueError("Неизвестная операция:", op)
+                A, b_field, c_field, encode = spec
+                buffer += encode(A, int(ins[b_field]), int(ins[c_field]))
+                count += 1
+                if len(buffer) >= chunk_size:
+                    out.write(buffer)
+                    written += len(buffer)
+                    buffer.clear()
+            out.write(buffer)
+            written += len(buffer)
+        # mkstemp создаёт файл с правами 0600; output получает обычные, по umask
+        os.chmod(tmp_path, 0o666 & ~_umask())
+        os.replace(tmp_path, output)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return written, count
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ассемблер УВМ (вариант 5)")
+    ap.add_argument("source", help="исходник .yaml или .uasm (для --disasm — файл .bin)")
+    ap.add_argument("output", help="выходной .bin (для --disasm — файл .uasm)")
+    ap.add_argument("--test", action="store_true",
+                    help="напечатать поля A, B, C и машинный код")
+    ap.add_argument("--stream", action="store_true",
+                    help="потоковое ассемблирование большого YAML")
+    ap.add_argument("--cache", action="store_true",
+                    help="брать машинный код из кэша по содержимому исходника")
+    ap.add_argument("--disasm", action="store_true",
+                    help="дизассемблировать .bin в текстовый формат")
+    args = ap.parse_args()
+
+    source = args.source
+    output = args.output
+    test_mode = args.test
+
+    if args.disasm:
+        with open(source, "rb") as f:
+            lines = disassemble(f.read())
+        with open(output, "w", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in lines)
+        print(f"Команд: {len(lines)}")
+        return
+
+    text_source = source.endswith(TEXT_EXTENSION)
+
+    # ни потоковый режим, ни кэш не строят список полей, который печатает
+    # --test; потоковый режим не держит код в памяти, чтобы положить его в кэш
+    for flag, other in (("stream", "test"), ("cache", "test"), ("stream", "cache")):
+        if getattr(args, flag) and getattr(args, other):
+            ap.error(f"--{flag} несовместим с --{other}")
+
+    if args.stream:
+        if text_source:
+            ap.error(f"--stream работает только с YAML, а не с {TEXT_EXTENSION}")
+        size, _ = assemble_stream(source, output)
+        print(f"Размер бинарного файла: {size} байт")
+        return
+
+    if args.cache:
+        from asm_cache import DEFAULT_CACHE_DIR, AssemblyCache, assemble_cached
+
+        cache_dir = os.environ.get("UVM_ASM_CACHE", DEFAULT_CACHE_DIR)
+        cache = AssemblyCache(cache_dir)
+        all_bytes = assemble_cached(source, cache)
+        with open(output, "wb") as f:
+            f.write(all_bytes)
+        print(f"Размер бинарного файла: {len(all_bytes)} байт")
+        print(f"Кэш {cache_dir}: попаданий {cache.hits}, промахов {cache.misses}")
+        return
+
+    if text_source:
+        with open(source, "r", encoding="utf-8") as f:
+            all_bytes, abc_list = assemble_text(f.read())
+    else:
+        program = load_program(source)
+        all_bytes, abc_list = assemble(program)
+
     with open(output, "wb") as f:
         f.write(all_bytes)
 
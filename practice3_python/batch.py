@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from vm import DEFAULT_MEMORY_SIZE, DUMP_FORMATS, dump_memory, load_binary, run_program_predecoded
+
+# Пакетный запуск программ УВМ.
+#
+# Манифест — JSON-список заданий:
+# [
+#   {"program": "copy_array.bin", "dump": "copy_array.xml", "start": 100, "end": 202},
+#   {"program": "out.bin", "dump": "out.rle", "start": 0, "end": 1023, "format": "rle"}
+# ]
+# Относительные пути считаются от каталога манифеста.
+
+
+def load_manifest(path: str) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+
+    if not isinstance(entries, list):
+        raise ValueError("Манифест должен быть JSON-списком заданий")
+
+    base = os.path.dirname(os.path.abspath(path))
+    for entry in entries:
+        for key in ("program", "dump"):
+            if key not in entry:
+                raise ValueError(f"В задании нет ключа {key!r}: {entry}")
+            entry[key] = os.path.join(base, entry[key])
+    return entries
+
+
+def run_entry(entry: dict) -> dict:
+    """
+    Выполняет одно задание манифеста (в процессе пула).
+    Ошибки не выбрасываются, а попадают в результат.
+    """
+    result = {"program": entry["program"], "ok": False, "error": None,
+              "code_bytes": 0, "seconds": 0.0}
+    started = time.perf_counter()
+    try:
+        start_addr = int(entry["start"])
+        end_addr = int(entry["end"])
+        if start_addr < 0 or end_addr < start_addr:
+            raise ValueError("Некорректный диапазон адресов памяти")
+
+        program_bytes = load_binary(entry["program"])
+        result["code_bytes"] = len(program_bytes)
+        registers, memory = run_program_predecoded(
+            program_bytes, entry.get("memory_size", DEFAULT_MEMORY_SIZE))
+        dump_memory(memory, registers, entry["dump"], start_addr, end_addr,
+                    entry.get("format", "xml"))
+
+        result["registers"] = list(registers)
+        result["ok"] = True
+    except Exception as e:  # ошибка одной программы не прерывает пакет
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def run_batch(entries: list[dict], jobs: int | None = None) -> tuple[list[dict], dict]:
+    """
+    Распределяет задания по пулу процессов.
+    Возвращает (результаты в порядке манифеста, сводная статистика).
+    """
+    jobs = jobs or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    if jobs == 1:
+        results = [run_entry(e) for e in entries]
+    else:
+        chunksize = max(1, len(entries) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(run_entry, entries, chunksize=chunksize))
+
+    wall = time.perf_counter() - started
+    ok = sum(1 for r in results if r["ok"])
+    busy = sum(r["seconds"] for r in results)
+    code_bytes = sum(r["code_bytes"] for r in results)
+    stats = {
+        "programs": len(results),
+        "ok": ok,
+        "failed": len(results) - ok,
+        "jobs": jobs,
+        "wall_seconds": wall,
+        "busy_seconds": busy,
+        "programs_per_second": len(results) / wall if wall else 0.0,
+        "code_bytes_per_second": code_bytes / wall if wall else 0.0,
+    }
+    return results, stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Пакетный запуск программ УВМ")
+    ap.add_argument("manifest", help="JSON-манифест заданий")
+    ap.add_argument("--jobs", type=int, default=None,
+                    help="число процессов (по умолчанию — число ядер)")
+    ap.add_argument("--report", help="сохранить результаты и статистику в JSON")
+    args = ap.parse_args()
+
+    try:
+        entries = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print("Ошибка чтения манифеста:", e)
+        sys.exit(1)
+
+    results, stats = run_batch(entries, args.jobs)
+
+    for r in results:
+        if not r["ok"]:
+            print(f"ОШИБКА {r['program']}: {r['error']}")
+
+    print(f"Программ: {stats['programs']}, успешно: {stats['ok']}, "
+          f"с ошибками: {stats['failed']}")
+    print(f"Процессов: {stats['jobs']}, время: {stats['wall_seconds']:.3f} с, "
+          f"{stats['programs_per_second']:.1f} программ/с")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"stats": stats, "results": results}, f, ensure_ascii=False, indent=2)
+
+    sys.exit(0 if stats["failed"] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import yaml
+
+from assembler import assemble, load_program
+from vm import DEFAULT_MEMORY_SIZE, ENGINE_NAMES, get_engine
+
+# Бенчмарк ассемблера и УВМ.
+#
+# Генерирует синтетические YAML-программы заданного размера и состава
+# команд, замеряет время ассемблирования на команду, скорость каждого
+# движка УВМ (MIPS — миллионов команд в секунду) и пиковую память
+# (tracemalloc, отдельным прогоном, чтобы не искажать время).
+# Результаты сохраняются в JSON вместе с коммитом; --compare сравнивает
+# два таких файла.
+#
+# Регистры r0..r3 — адресные, r4..r6 — значения, r7 = 0 указывает на
+# ячейку 0, куда пролог кладёт 16 (сдвиг для ROR при построении адресов).
+# Пока код и окно данных адресуются 17-битной константой, адреса задаются
+# LOAD_CONST; иначе адрес строится как LOAD_CONST k; ROR на 16 => k << 16,
+# то есть данные лежат на страницах по 64K за концом кода.
+
+# Разбор YAML занимает сотни микросекунд на команду, поэтому программа
+# из 10^6 команд ассемблируется минутами и включается только по --full.
+DEFAULT_SIZES = (10, 100, 1000, 10_000, 100_000)
+FULL_SIZES = DEFAULT_SIZES + (1_000_000,)
+
+# Доли операций в смеси: addr — смена адреса, остальные — команды
+MIXES = {
+    "balanced": {"addr": 0.15, "LOAD_CONST": 0.25, "LOAD": 0.2, "STORE": 0.25, "ROR": 0.15},
+    "memory": {"addr": 0.2, "LOAD_CONST": 0.05, "LOAD": 0.35, "STORE": 0.35, "ROR": 0.05},
+    "const": {"addr": 0.05, "LOAD_CONST": 0.75, "LOAD": 0.1, "STORE": 0.05, "ROR": 0.05},
+    "ror": {"addr": 0.1, "LOAD_CONST": 0.2, "LOAD": 0.1, "STORE": 0.1, "ROR": 0.5},
+}
+
+DATA_WINDOW = 4096   # ячеек данных в режиме прямых адресов
+DATA_PAGES = 4       # страниц по 64K в режиме адресов k << 16
+MAX_CONST = (1 << 17) - 1
+WARM_RUNS = 2        # прогонов до замера «прогретой» скорости
+
+
+def generate_program(size: int, mix: str, seed: int = 0) -> tuple[list[dict], int]:
+    """
+    Генерирует программу из size команд (включая пролог).
+    Возвращает (список команд в формате YAML ассемблера, размер памяти).
+    """
+    rnd = random.Random(seed)
+    weights = MIXES[mix]
+    kinds = list(weights)
+    cum = [weights[k] for k in kinds]
+
+    direct = size * 4 + DATA_WINDOW <= MAX_CONST
+    if direct:
+        base = size * 4
+        memory_size = max(DEFAULT_MEMORY_SIZE, base + DATA_WINDOW)
+    else:
+        base = (size * 4 + 0xFFFF) >> 16   # первая страница за концом кода
+        memory_size = (base + DATA_PAGES) << 16
+
+    program = [
+        {"op": "LOAD_CONST", "dst": 7, "value": 0},
+        {"op": "LOAD_CONST", "dst": 6, "value": 16},
+        {"op": "STORE", "src": 6, "addr_reg": 7},  # mem[0] = 16 (код уже выполнен)
+    ]
+
+    def set_addr(reg: int):
+        if direct:
+            program.append({"op": "LOAD_CONST", "dst": reg,
+                            "value": base + rnd.randrange(DATA_WINDOW)})
+        else:
+            page = base + rnd.randrange(DATA_PAGES)
+            program.append({"op": "LOAD_CONST", "dst": reg, "value": page})
+            program.append({"op": "ROR", "dst": reg, "mem_reg": 7})
+
+    for reg in range(4):
+        set_addr(reg)
+
+    while len(program) < size:
+        kind = rnd.choices(kinds, cum)[0]
+        if kind == "addr":
+            set_addr(rnd.randrange(4))
+        elif kind == "LOAD_CONST":
+            program.append({"op": "LOAD_CONST", "dst": 4 + rnd.randrange(3),
+                            "value": rnd.randrange(MAX_CONST + 1)})
+        elif kind == "LOAD":
+            program.append({"op": "LOAD", "dst": 4 + rnd.randrange(3),
+                            "addr_reg": rnd.randrange(4)})
+        elif kind == "STORE":
+            program.append({"op": "STORE", "src": 4 + rnd.randrange(3),
+                            "addr_reg": rnd.randrange(4)})
+        else:
+            program.append({"op": "ROR", "dst": 4 + rnd.randrange(3),
+                            "mem_reg": rnd.randrange(4)})
+
+    return program[:size], memory_size
+
+
+# Кэши движков по содержимому программы: перед холодным замером их
+# очищают, иначе движок, запущенный после соседа с общим кэшем
+# (predecoded -> idioms, blocks), мерился бы уже прогретым.
+_ENGINE_CACHES = (
+    ("vm", "_predecode_cache"),
+    ("vm", "_entry_by_word"),
+    ("addr_analysis", "_unchecked_cache"),
+    ("block_compiler", "_block_cache"),
+    ("idioms", "_idiom_cache"),
+)
+
+
+def reset_engine_caches():
+    """Очищает кэши уже импортированных модулей движков."""
+    for module_name, attr in _ENGINE_CACHES:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            getattr(module, attr).clear()
+
+
+def _peak_memory(func, *args) -> int:
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_case(size: int, mix: str, engines: list[str], workdir: str,
+               measure_memory: bool = True) -> list[dict]:
+    program, memory_size = generate_program(size, mix)
+    path = os.path.join(workdir, f"bench_{mix}_{size}.yaml")
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump({"program": program}, f, sort_keys=False)
+
+    def assemble_file():
+        return assemble(load_program(path))[0]
+
+    started = time.perf_counter()
+    code = bytes(assemble_file())
+    asm_seconds = time.perf_counter() - started
+    n = len(program)
+
+    common = {"size": n, "mix": mix, "code_bytes": len(code),
+              "asm_seconds": asm_seconds, "asm_us_per_instr": asm_seconds / n * 1e6}
+    if measure_memory:
+        common["asm_peak_bytes"] = _peak_memory(assemble_file)
+
+    records = []
+    for name in engines:
+        run = get_engine(name)
+
+        # cold — первый запуск с пустыми кэшами (как одиночный запуск vm.py),
+        # warm — после WARM_RUNS прогонов той же программы
+        reset_engine_caches()
+        started = time.perf_counter()
+        run(code, memory_size)
+        cold = time.perf_counter() - started
+        for _ in range(WARM_RUNS - 1):
+            run(code, memory_size)
+        started = time.perf_counter()
+        run(code, memory_size)
+        warm = time.perf_counter() - started
+
+        record = dict(common, engine=name,
+                      cold_seconds=cold, cold_mips=n / cold / 1e6,
+                      warm_seconds=warm, warm_mips=n / warm / 1e6)
+        if measure_memory:
+            record["vm_peak_bytes"] = _peak_memory(run, code, memory_size)
+        records.append(record)
+    return records
+
+
+def current_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_records(records: list[dict]):
+    print(f"{'size':>8} {'mix':<9} {'engine':<11} {'asm мкс/к':>10} "
+          f"{'cold MIPS':>10} {'warm MIPS':>10} {'пик VM, КБ':>11}")
+    for r in records:
+        peak = r.get("vm_peak_bytes")
+        peak_s = f"{peak / 1024:11.0f}" if peak is not None else f"{'-':>11}"
+        print(f"{r['size']:>8} {r['mix']:<9} {r['engine']:<11} {r['asm_us_per_instr']:10.2f} "
+              f"{r['cold_mips']:10.3f} {r['warm_mips']:10.3f} {peak_s}")
+
+
+def compare(base_path: str, new_path: str):
+    """Печатает отношение скоростей new/base по совпадающим замерам."""
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+
+    def key(r):
+        return r["size"], r["mix"], r["engine"]
+
+    base_by_key = {key(r): r for r in base["records"]}
+    print(f"{base['commit']} -> {new['commit']}")
+    print(f"{'size':>8} {'mix':<9} {'engine':<11} {'asm':>7} {'cold':>7} {'warm':>7}")
+    for r in new["records"]:
+        b = base_by_key.get(key(r))
+        if b is None:
+            continue
+        print(f"{r['size']:>8} {r['mix']:<9} {r['engine']:<11} "
+              f"{b['asm_seconds'] / r['asm_seconds']:6.2f}x "
+              f"{r['cold_mips'] / b['cold_mips']:6.2f}x "
+              f"{r['warm_mips'] / b['warm_mips']:6.2f}x")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Бенчмарк ассемблера и УВМ")
+    ap.add_argument("--sizes", type=int, nargs="+", default=None,
+                    help="размеры программ в командах")
+    ap.add_argument("--full", action="store_true",
+                    help="добавить программы из 10^6 команд")
+    ap.add_argument("--mixes", nargs="+", choices=list(MIXES), default=list(MIXES))
+    ap.add_argument("--engines", nargs="+", choices=ENGINE_NAMES, default=list(ENGINE_NAMES))
+    ap.add_argument("--no-memory", action="store_true", help="не замерять пиковую память")
+    ap.add_argument("--workdir", help="куда писать сгенерированные YAML "
+                                      "(по умолчанию — временный каталог)")
+    ap.add_argument("--output", default="bench_results.json", help="файл результатов")
+    ap.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"),
+                    help="сравнить два файла результатов и выйти")
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sizes = args.sizes or (FULL_SIZES if args.full else DEFAULT_SIZES)
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            for mix in args.mixes:
+                records.extend(bench_case(size, mix, args.engines, args.workdir or tmp,
+                                          not args.no_memory))
+    print_records(records)
+
+    result = {"commit": current_commit(), "python": sys.version.split()[0],
+              "time": time.strftime("%Y-%m-%d %H:%M:%S"), "records": records}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
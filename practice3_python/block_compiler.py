@@ -0,0 +1,175 @@
+from vm import (
+    DEFAULT_MEMORY_SIZE, NUM_REGS, OP_LOAD, OP_LOAD_CONST, OP_ROR, OP_STORE,
+    decode_entry, decode_instruction, init_memory,
+)
+
+# Компилятор базовых блоков УВМ в функции Python.
+#
+# Блок — непрерывная последовательность команд, начиная с заданного pc.
+# Для блока генерируется исходный текст функции block(registers, memory),
+# в которой регистры живут в локальных переменных r0..r7, константы
+# LOAD_CONST подставлены прямо в код, а в конце блока регистры
+# записываются обратно и возвращается адрес следующей команды.
+#
+# Если STORE внутри блока пишет в область кода, блок записывает регистры
+# и возвращает адрес этой команды, не выполняя её: команду выполняет
+# интерпретатор, затем блоки, затронутые записью, сбрасываются.
+#
+# compile() обходится в десятки микросекунд на команду, а без переходов
+# каждая команда за запуск выполняется один раз. Поэтому блок компилируется,
+# только когда его адрес встретился COMPILE_THRESHOLD раз (с учётом прошлых
+# запусков той же программы); до этого команды выполняет интерпретатор.
+
+MAX_BLOCK_INSTRUCTIONS = 256  # ограничивает стоимость compile() одного блока
+COMPILE_THRESHOLD = 2
+
+_REGS = ", ".join(f"r{i}" for i in range(NUM_REGS))
+
+
+class CompiledBlock:
+    def __init__(self, start: int, end: int, func, count: int):
+        self.start = start  # адрес первой команды
+        self.end = end      # адрес команды после блока
+        self.func = func
+        self.count = count  # число команд в блоке
+
+
+def decode_block(memory, pc: int, code_size: int) -> list[tuple]:
+    """
+    Декодирует подряд идущие команды начиная с pc: список (pc, A, B, C, size).
+    Останавливается на конце кода, неполной или неизвестной команде
+    (их выполнит интерпретатор) и на MAX_BLOCK_INSTRUCTIONS.
+    """
+    instrs = []
+    while pc < code_size and len(instrs) < MAX_BLOCK_INSTRUCTIONS:
+        try:
+            A, B, C, size = decode_instruction(memory, pc, code_size)
+        except ValueError:
+            break
+        if size == 0 or A not in (OP_LOAD_CONST, OP_LOAD, OP_STORE, OP_ROR):
+            break
+        instrs.append((pc, A, B, C, size))
+        pc += size
+    return instrs
+
+
+def _bounds_check(lines: list[str], name: str, mem_size: int):
+    lines.append(f"    if a >= {mem_size}:")
+    lines.append(f"        raise IndexError(f'{name}: выход за пределы памяти: addr={{a}}')")
+
+
+def generate_block_source(instrs: list[tuple], code_size: int, mem_size: int) -> str:
+    """Генерирует исходный текст функции block(registers, memory)."""
+    # Регистры всегда неотрицательны, поэтому достаточно проверки сверху.
+    lines = ["def block(registers, memory):", f"    {_REGS} = registers"]
+    for pc, A, B, C, size in instrs:
+        if A == OP_LOAD_CONST:
+            lines.append(f"    r{B} = {C}")
+        elif A == OP_LOAD:
+            lines.append(f"    a = r{C}")
+            _bounds_check(lines, "LOAD", mem_size)
+            lines.append(f"    r{B} = memory[a]")
+        elif A == OP_STORE:
+            lines.append(f"    a = r{C}")
+            lines.append(f"    if a < {code_size}:")
+            lines.append(f"        registers[:] = ({_REGS})")
+            lines.append(f"        return {pc}")
+            _bounds_check(lines, "STORE", mem_size)
+            lines.append(f"    memory[a] = r{B}")
+        elif A == OP_ROR:
+            lines.append(f"    a = r{C}")
+            _bounds_check(lines, "ROR", mem_size)
+            lines.append("    s = memory[a] % 32")
+            lines.append(f"    v = r{B} & 0xFFFFFFFF")
+            lines.append(f"    r{B} = ((v >> s) | (v << (32 - s))) & 0xFFFFFFFF")
+    end = instrs[-1][0] + instrs[-1][4]
+    lines.append(f"    registers[:] = ({_REGS})")
+    lines.append(f"    return {end}")
+    return "\n".join(lines) + "\n"
+
+
+def compile_block(memory, pc: int, code_size: int) -> CompiledBlock | None:
+    """Компилирует блок, начинающийся с pc. None — если компилировать нечего."""
+    instrs = decode_block(memory, pc, code_size)
+    if not instrs:
+        return None
+
+    source = generate_block_source(instrs, code_size, len(memory))
+    namespace = {}
+    exec(compile(source, f"<uvm block {pc}>", "exec"), namespace)
+    end = instrs[-1][0] + instrs[-1][4]
+    return CompiledBlock(pc, end, namespace["block"], len(instrs))
+
+
+def _invalidate_blocks(blocks: dict, addr: int):
+    for start in [s for s, blk in blocks.items() if blk.start <= addr < blk.end]:
+        del blocks[start]
+
+
+# Скомпилированные блоки зависят только от байтов кода и размера памяти,
+# поэтому повторные запуски той же программы их переиспользуют.
+# Значение кэша — (блоки по адресу начала, счётчики посещений адресов).
+BLOCK_CACHE_SIZE = 32
+_block_cache: dict[tuple, tuple[dict, dict]] = {}
+
+
+def _cached_blocks(program_bytes: bytes, memory_size: int) -> tuple[dict, dict]:
+    key = (bytes(program_bytes), memory_size)
+    cached = _block_cache.pop(key, None)
+    if cached is None:
+        cached = ({}, {})
+        if len(_block_cache) >= BLOCK_CACHE_SIZE:
+            del _block_cache[next(iter(_block_cache))]
+    _block_cache[key] = cached
+    return cached
+
+
+def run_program_blocks(program_bytes: bytes, memory_size: int = DEFAULT_MEMORY_SIZE):
+    """
+    То же, что run_program, но базовые блоки выполняются скомпилированными
+    функциями Python. Возвращает (registers, memory).
+    """
+    memory = init_memory(program_bytes, memory_size)
+    registers = [0] * NUM_REGS
+    code_size = len(program_bytes)
+    shared, heat = _cached_blocks(program_bytes, memory_size)
+    blocks = shared
+    modified = None  # адреса кода, изменённые STORE в этом запуске
+
+    pc = 0
+    while pc < code_size:
+        blk = blocks.get(pc)
+        if blk is None:
+            hits = heat.get(pc, 0) + 1
+            heat[pc] = hits
+            if hits >= COMPILE_THRESHOLD:
+                blk = compile_block(memory, pc, code_size)
+            if blk is not None:
+                blocks[pc] = blk
+                if modified is not None and not any(blk.start <= a < blk.end for a in modified):
+                    # блок не затронут самомодификацией — годится и для кэша
+                    shared.setdefault(pc, blk)
+
+        if blk is not None:
+            pc = blk.func(registers, memory)
+            if pc == blk.end:
+                continue
+
+        # Одна команда через интерпретатор: блок ещё не скомпилирован,
+        # выход из блока на STORE в код, неполная/неизвестная команда
+        # или конец программы
+        entry = decode_entry(memory, pc, code_size)
+        if entry is None:
+            break
+        handler, B, C, size, A = entry
+        handler(B, C, registers, memory)
+        if A == OP_STORE and registers[C] < code_size:
+            if modified is None:
+                # кэш остаётся для неизменённой программы, дальше — своя копия
+                blocks = dict(shared)
+                modified = set()
+            modified.add(registers[C])
+            _invalidate_blocks(blocks, registers[C])
+        pc += size
+
+    return registers, memory
@@ -0,0 +1,130 @@
+from array import array
+
+from vm import OP_LOAD_CONST, decode_instruction
+
+try:
+    import numpy as np
+except ImportError:  # без NumPy работает построчный декодер
+    np = None
+
+# Декодирование всей области кода за один вызов.
+#
+# Команды идут подряд с адреса 0 и занимают 2 или 4 байта, поэтому начала
+# команд — всегда чётные адреса, и код удобно рассматривать как массив
+# 16-битных полуслов h[0..n). Полуслово j — начало команды тогда и только
+# тогда, когда перед ним не стоит начало LOAD_CONST (чьё второе полуслово
+# оно было бы). Пусть L[j] — «у h[j] opcode LOAD_CONST». Внутри серии
+# подряд идущих L начала команд чередуются, а после полуслова без L
+# команда начинается всегда. Отсюда: j — начало команды, если число
+# полуслов с L, стоящих подряд непосредственно перед j, чётно. Длина серии
+# считается без цикла через накопленный максимум индексов полуслов без L.
+#
+# Поля разбираются так же, как в decode_instruction, включая ячейки
+# памяти больше 255 (после самомодификации).
+
+
+class DecodedProgram:
+    """
+    Результат decode_program в виде структуры массивов: pc, A, B, C, size —
+    по элементу на команду (numpy.ndarray или array). truncated — код
+    обрывается на неполной LOAD_CONST; end — адрес за последней командой.
+    """
+
+    def __init__(self, pc, A, B, C, size, truncated: bool):
+        self.pc, self.A, self.B, self.C, self.size = pc, A, B, C, size
+        self.truncated = truncated
+
+    def __len__(self) -> int:
+        return len(self.pc)
+
+    @property
+    def end(self) -> int:
+        if not len(self.pc):
+            return 0
+        return int(self.pc[-1]) + int(self.size[-1])
+
+    def instructions(self):
+        """Команды по порядку: (pc, A, B, C, size) из чисел Python."""
+        columns = (self.pc, self.A, self.B, self.C, self.size)
+        if np is not None and isinstance(self.pc, np.ndarray):
+            columns = [c.tolist() for c in columns]
+        return zip(*columns)
+
+
+def _decode_python(memory, code_size: int) -> DecodedProgram:
+    columns = [array("q") for _ in range(5)]
+    pc_col, a_col, b_col, c_col, size_col = columns
+    truncated = False
+    pc = 0
+    while True:
+        try:
+            A, B, C, size = decode_instruction(memory, pc, code_size)
+        except ValueError:
+            truncated = True
+            break
+        if size == 0:
+            break
+        pc_col.append(pc)
+        a_col.append(A)
+        b_col.append(B)
+        c_col.append(C)
+        size_col.append(size)
+        pc += size
+    return DecodedProgram(*columns, truncated)
+
+
+def _cells(memory, code_size: int):
+    if isinstance(memory, array):
+        cells = np.frombuffer(memory, dtype=np.dtype(memory.typecode), count=code_size)
+        return cells.astype(np.uint64)
+    try:
+        # bytes, bytearray, mmap из load_binary — всё, что отдаёт буфер
+        cells = np.frombuffer(memory, dtype=np.uint8, count=code_size)
+    except TypeError:
+        return np.array(memory[:code_size], dtype=np.uint64)
+    return cells.astype(np.uint64)
+
+
+def _decode_numpy(memory, code_size: int) -> DecodedProgram:
+    n = code_size // 2
+    cells = _cells(memory, 2 * n)
+    half = cells[0::2] | (cells[1::2] << np.uint64(8))
+    is_const = (half & np.uint64(0x3F)) == OP_LOAD_CONST
+
+    index = np.arange(n, dtype=np.int64)
+    last_plain = np.maximum.accumulate(np.where(is_const, -1, index)) if n else index
+    starts_mask = np.ones(n, dtype=bool)
+    starts_mask[1:] = ((index[:-1] - last_plain[:-1]) & 1) == 0
+    starts = np.flatnonzero(starts_mask)
+
+    const = is_const[starts]
+    truncated = bool(len(starts)) and bool(const[-1]) and starts[-1] + 1 >= n
+    if truncated:
+        starts, const = starts[:-1], const[:-1]
+
+    word = half[starts]
+    const_at = starts[const]
+    word[const] |= half[const_at + 1] << np.uint64(16)
+
+    c_mask = np.where(const, np.uint64((1 << 17) - 1), np.uint64(0x07))
+    return DecodedProgram(
+        pc=starts * 2,
+        A=(word & np.uint64(0x3F)).astype(np.int64),
+        B=((word >> np.uint64(6)) & np.uint64(0x07)).astype(np.int64),
+        C=((word >> np.uint64(9)) & c_mask).astype(np.int64),
+        size=np.where(const, 4, 2).astype(np.int64),
+        truncated=truncated,
+    )
+
+
+def decode_program(memory, code_size: int | None = None, use_numpy: bool = True) -> DecodedProgram:
+    """
+    Декодирует все команды области кода memory[0:code_size] (по умолчанию —
+    всю memory, например байты .bin). Декодирование останавливается там же,
+    где остановился бы последовательный вызов decode_instruction.
+    """
+    if code_size is None:
+        code_size = len(memory)
+    if np is not None and use_numpy:
+        return _decode_numpy(memory, code_size)
+    return _decode_python(memory, code_size)
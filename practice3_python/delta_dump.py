@@ -0,0 +1,190 @@
+import argparse
+import struct
+from array import array
+
+from paged_memory import PagedMemory
+from vm import (
+    DEFAULT_MEMORY_SIZE, DIRTY_PAGE_BITS, DUMP_FORMATS, MEMORY_TYPECODE, VM, dump_memory,
+    load_binary,
+)
+
+# Инкрементальные дампы памяти.
+#
+# Первый дамп — полный, в формате bin (см. vm._write_bin). Каждый
+# следующий — дельта: регистры и только те участки диапазона дампа, что
+# лежат на страницах, в которые писал STORE после предыдущего дампа
+# (VM.track_dirty / take_dirty). Полный дамп на момент k-й дельты
+# собирается из базы и дельт 1..k по порядку.
+#
+# Файл дельты (little-endian):
+#   b"UVDD", версия (H), номер дельты (I), начало и конец диапазона (I),
+#   число регистров (B), регистры (I), число участков (I),
+#   затем для каждого участка: адрес (I), число ячеек (I), ячейки (I).
+
+DELTA_MAGIC = b"UVDD"
+DELTA_VERSION = 1
+_HEADER = struct.Struct("<4sHIIIB")
+_BIN_HEADER = struct.Struct("<4sIIB")
+PAGE_SIZE = 1 << DIRTY_PAGE_BITS
+
+
+def dirty_runs(pages, start_addr: int, end_addr: int) -> list[tuple[int, int]]:
+    """Грязные страницы -> участки (адрес, число ячеек) внутри [start_addr, end_addr]."""
+    runs = []
+    for page in sorted(pages):
+        lo = max(page << DIRTY_PAGE_BITS, start_addr)
+        hi = min((page + 1) << DIRTY_PAGE_BITS, end_addr + 1)
+        if lo >= hi:
+            continue
+        if runs and runs[-1][0] + runs[-1][1] == lo:
+            runs[-1] = (runs[-1][0], hi - runs[-1][0])  # соседние страницы — один участок
+        else:
+            runs.append((lo, hi - lo))
+    return runs
+
+
+def write_delta(path: str, memory, registers: list[int], pages,
+                start_addr: int, end_addr: int, seq: int) -> int:
+    """Пишет дельту. Возвращает число записанных ячеек."""
+    runs = dirty_runs(pages, start_addr, end_addr)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(DELTA_MAGIC, DELTA_VERSION, seq, start_addr, end_addr,
+                             len(registers)))
+        f.write(struct.pack(f"<{len(registers)}I", *registers))
+        f.write(struct.pack("<I", len(runs)))
+        for addr, count in runs:
+            f.write(struct.pack("<II", addr, count))
+            f.write(struct.pack(f"<{count}I", *memory[addr:addr + count]))
+    return sum(count for _, count in runs)
+
+
+def read_delta(path: str):
+    """Возвращает (номер, начало, конец, регистры, [(адрес, ячейки)])."""
+    with open(path, "rb") as f:
+        magic, version, seq, start_addr, end_addr, nregs = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != DELTA_MAGIC or version != DELTA_VERSION:
+            raise ValueError(f"Файл {path} не является дельтой дампа версии {DELTA_VERSION}")
+        registers = list(struct.unpack(f"<{nregs}I", f.read(4 * nregs)))
+        (nruns,) = struct.unpack("<I", f.read(4))
+        runs = []
+        for _ in range(nruns):
+            addr, count = struct.unpack("<II", f.read(8))
+            cells = array(MEMORY_TYPECODE)
+            cells.frombytes(f.read(4 * count))
+            runs.append((addr, cells))
+    return seq, start_addr, end_addr, registers, runs
+
+
+def read_bin_dump(path: str):
+    """Читает полный дамп формата bin. Возвращает (начало, конец, регистры, ячейки)."""
+    with open(path, "rb") as f:
+        magic, start_addr, end_addr, nregs = _BIN_HEADER.unpack(f.read(_BIN_HEADER.size))
+        if magic != b"UVMD":
+            raise ValueError(f"Файл {path} не является дампом формата bin")
+        registers = list(struct.unpack(f"<{nregs}I", f.read(4 * nregs)))
+        cells = array(MEMORY_TYPECODE)
+        cells.frombytes(f.read(4 * (end_addr - start_addr + 1)))
+    return start_addr, end_addr, registers, cells
+
+
+def merge_dumps(base_path: str, delta_paths: list[str]):
+    """
+    Применяет дельты к базовому дампу по порядку.
+    Возвращает (начало, конец, регистры, ячейки диапазона).
+    """
+    start_addr, end_addr, registers, cells = read_bin_dump(base_path)
+    last_seq = 0
+    for path in delta_paths:
+        seq, d_start, d_end, d_registers, runs = read_delta(path)
+        if (d_start, d_end) != (start_addr, end_addr):
+            raise ValueError(f"{path}: диапазон {d_start}..{d_end} не совпадает с базой")
+        if seq != last_seq + 1:
+            raise ValueError(f"{path}: ожидалась дельта {last_seq + 1}, а это {seq}")
+        last_seq = seq
+        registers = d_registers
+        for addr, values in runs:
+            cells[addr - start_addr:addr - start_addr + len(values)] = values
+    return start_addr, end_addr, registers, cells
+
+
+class IncrementalDumper:
+    """
+    Периодические дампы работающей УВМ: dump() в первый раз пишет полный
+    дамп {prefix}.base.bin, затем — дельты {prefix}.NNNN.delta.
+    Дельты верны, только если память между дампами меняется через
+    vm.step() и vm.poke(): прямые записи в vm.memory в них не попадут.
+    """
+
+    def __init__(self, vm: VM, prefix: str, start_addr: int, end_addr: int):
+        # грязные страницы отмечает только VM; у движков run_program* их нет
+        if not isinstance(vm, VM):
+            raise TypeError("IncrementalDumper работает только с vm.VM")
+        if start_addr < 0 or end_addr < start_addr or end_addr >= len(vm.memory):
+            raise ValueError("Диапазон адресов выходит за пределы памяти")
+        self.vm = vm
+        self.prefix = prefix
+        self.start_addr = start_addr
+        self.end_addr = end_addr
+        self.seq = 0
+        vm.track_dirty()
+
+    def dump(self) -> str:
+        vm = self.vm
+        pages = vm.take_dirty()
+        if self.seq == 0:
+            path = f"{self.prefix}.base.bin"
+            dump_memory(vm.memory, vm.registers, path, self.start_addr, self.end_addr, "bin")
+        else:
+            path = f"{self.prefix}.{self.seq:04d}.delta"
+            write_delta(path, vm.memory, vm.registers, pages,
+                        self.start_addr, self.end_addr, self.seq)
+        self.seq += 1
+        return path
+
+
+def run_with_deltas(program_bytes: bytes, prefix: str, start_addr: int, end_addr: int,
+                    every: int, memory_size: int = DEFAULT_MEMORY_SIZE) -> list[str]:
+    """Выполняет программу, снимая дамп в начале, каждые every команд и в конце."""
+    vm = VM(program_bytes, memory_size)
+    dumper = IncrementalDumper(vm, prefix, start_addr, end_addr)
+    paths = [dumper.dump()]
+    while not vm.halted:
+        if vm.step(every):
+            paths.append(dumper.dump())
+    return paths
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Инкрементальные дампы памяти УВМ")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="выполнить программу с дельта-дампами")
+    run.add_argument("program", help="бинарный файл программы")
+    run.add_argument("prefix", help="префикс файлов дампов")
+    run.add_argument("start_addr", type=int)
+    run.add_argument("end_addr", type=int)
+    run.add_argument("--every", type=int, default=10000, help="команд между дампами")
+    run.add_argument("--memory-size", type=int, default=DEFAULT_MEMORY_SIZE)
+
+    merge = sub.add_parser("merge", help="собрать полный дамп из базы и дельт")
+    merge.add_argument("base", help="полный дамп формата bin")
+    merge.add_argument("deltas", nargs="*", help="дельты по порядку")
+    merge.add_argument("--output", required=True, help="файл полного дампа")
+    merge.add_argument("--format", choices=DUMP_FORMATS, default="xml")
+    args = ap.parse_args()
+
+    if args.command == "run":
+        paths = run_with_deltas(load_binary(args.program), args.prefix, args.start_addr,
+                                args.end_addr, args.every, args.memory_size)
+        print(f"Записано дампов: {len(paths)} (база {paths[0]})")
+        return
+
+    start_addr, end_addr, registers, cells = merge_dumps(args.base, args.deltas)
+    memory = PagedMemory(end_addr + 1)
+    memory[start_addr:end_addr + 1] = cells
+    dump_memory(memory, registers, args.output, start_addr, end_addr, args.format)
+    print(f"Собран дамп {args.output} из базы и {len(args.deltas)} дельт")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+
+from vm import (
+    DEFAULT_MEMORY_SIZE, DENSE_MEMORY_LIMIT, DUMP_FORMATS, MEMORY_TYPECODE, NUM_REGS,
+    OP_STORE, OPCODE_NAMES, data_spans, dump_memory, execute_instruction, init_memory,
+)
+
+# Трасса выполнения УВМ.
+#
+# На каждую выполненную команду пишется запись фиксированной длины:
+#   pc (I), opcode (B), цель (B: номер регистра или MEM_TARGET для STORE),
+#   адрес ячейки (I, для STORE), старое значение (I), новое значение (I).
+# Каждая команда варианта 5 меняет ровно один регистр или одну ячейку,
+# поэтому старого и нового значения достаточно, чтобы пройти трассу и
+# вперёд, и назад. Записи упаковываются struct.pack_into в заранее
+# выделенный буфер: на шаг не создаётся ни одного объекта Python.
+#
+# TraceWriter пишет полную трассу в файл блоками по FILE_BUFFER_RECORDS.
+# RingTrace хранит в памяти только последние capacity записей; при
+# сохранении к ним добавляется конечное состояние (регистры и ненулевые
+# страницы памяти), от которого состояние в окне восстанавливается назад.
+#
+# Файл трассы (little-endian):
+#   b"UVMT", версия (H), флаги (B, FLAG_RING), размер памяти (Q),
+#   номер первой записи (Q), размер кода (I), байты кода;
+#   для кольцевой трассы — регистры (I), число страниц (I) и страницы
+#   (номер I, TRACE_PAGE ячеек I); затем записи до конца файла.
+
+TRACE_MAGIC = b"UVMT"
+TRACE_VERSION = 1
+FLAG_RING = 1
+MEM_TARGET = 0xFF
+
+_HEADER = struct.Struct("<4sHBQQI")
+RECORD = struct.Struct("<IBBIII")
+TRACE_PAGE = 4096
+_PAGE = struct.Struct(f"<{TRACE_PAGE}I")
+
+FILE_BUFFER_RECORDS = 4096
+DEFAULT_RING_RECORDS = 1 << 16
+CHECKPOINT_INTERVAL = 4096  # записей между контрольными точками при воспроизведении
+MAX_CHECKPOINTS = 64
+
+
+def _execute_traced(buffer, offset: int, pc: int, A: int, B: int, C: int,
+                    registers: list[int], memory):
+    """Выполняет команду и пишет её запись в buffer по смещению offset."""
+    if A == OP_STORE:
+        addr = registers[C]
+        old = memory[addr] if 0 <= addr < len(memory) else 0
+        execute_instruction(A, B, C, registers, memory)
+        RECORD.pack_into(buffer, offset, pc, A, MEM_TARGET, addr, old, memory[addr])
+    else:
+        old = registers[B]
+        execute_instruction(A, B, C, registers, memory)
+        RECORD.pack_into(buffer, offset, pc, A, B, 0, old, registers[B])
+
+
+def _write_header(f, program_bytes: bytes, memory_size: int, flags: int, first_step: int):
+    f.write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, flags, memory_size,
+                         first_step, len(program_bytes)))
+    f.write(program_bytes)
+
+
+class TraceWriter:
+    """Полная трасса в файл. Использование: with TraceWriter(...) as trace: run_program(..., trace=trace)."""
+
+    def __init__(self, path: str, program_bytes: bytes, memory_size: int = DEFAULT_MEMORY_SIZE,
+                 buffer_records: int = FILE_BUFFER_RECORDS):
+        self.file = open(path, "wb")
+        _write_header(self.file, bytes(program_bytes), memory_size, 0, 0)
+        self.buffer = bytearray(buffer_records * RECORD.size)
+        self.limit = len(self.buffer)
+        self.offset = 0
+        self.steps = 0
+
+    def execute(self, pc: int, A: int, B: int, C: int, registers: list[int], memory):
+        _execute_traced(self.buffer, self.offset, pc, A, B, C, registers, memory)
+        self.offset += RECORD.size
+        self.steps += 1
+        if self.offset == self.limit:
+            self.flush()
+
+    def flush(self):
+        self.file.write(memoryview(self.buffer)[:self.offset])
+        self.offset = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RingTrace:
+    """Последние capacity записей в кольцевом буфере в памяти."""
+
+    def __init__(self, program_bytes: bytes, memory_size: int = DEFAULT_MEMORY_SIZE,
+                 capacity: int = DEFAULT_RING_RECORDS):
+        self.program_bytes = bytes(program_bytes)
+        self.memory_size = memory_size
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * RECORD.size)
+        self.limit = len(self.buffer)
+        self.offset = 0
+        self.steps = 0
+        self.registers = None
+        self.memory = None
+
+    def execute(self, pc: int, A: int, B: int, C: int, registers: list[int], memory):
+        # ссылки на состояние — чтобы сохранить его и после ошибки в run_program
+        self.registers = registers
+        self.memory = memory
+        _execute_traced(self.buffer, self.offset, pc, A, B, C, registers, memory)
+        self.offset += RECORD.size
+        if self.offset == self.limit:
+            self.offset = 0
+        self.steps += 1
+
+    @property
+    def first_step(self) -> int:
+        return max(0, self.steps - self.capacity)
+
+    def records(self) -> bytes:
+        """Сохранённые записи от старой к новой."""
+        if self.steps < self.capacity:
+            return bytes(self.buffer[:self.offset])
+        return bytes(self.buffer[self.offset:] + self.buffer[:self.offset])
+
+    def save(self, path: str):
+        """Сохраняет окно трассы вместе с состоянием УВМ после последней записи."""
+        registers, memory = self.registers, self.memory
+        if registers is None:
+            registers = [0] * NUM_REGS
+            memory = init_memory(self.program_bytes, self.memory_size)
+        with open(path, "wb") as f:
+            _write_header(f, self.program_bytes, self.memory_size, FLAG_RING, self.first_step)
+            _write_state(f, registers, memory)
+            f.write(self.records())
+
+
+def _write_state(f, registers: list[int], memory):
+    f.write(struct.pack(f"<{NUM_REGS}I", *registers))
+    pages = []
+    next_index = 0  # страницы трассы до этой уже просмотрены
+    # у разреженной памяти просматриваются только выделенные страницы
+    for span_start, span_end in data_spans(memory, 0, len(memory)):
+        for index in range(max(span_start // TRACE_PAGE, next_index),
+                           (span_end - 1) // TRACE_PAGE + 1):
+            cells = memory[index * TRACE_PAGE:(index + 1) * TRACE_PAGE]
+            if any(cells):
+                pages.append((index, cells))
+            next_index = index + 1
+    f.write(struct.pack("<I", len(pages)))
+    for index, cells in pages:
+        f.write(struct.pack("<I", index))
+        f.write(_PAGE.pack(*cells, *([0] * (TRACE_PAGE - len(cells)))))
+
+
+def _empty_memory(memory_size: int):
+    if memory_size > DENSE_MEMORY_LIMIT:
+        from paged_memory import PagedMemory
+        return PagedMemory(memory_size)
+    return array(MEMORY_TYPECODE, [0]) * memory_size
+
+
+def _copy_memory(memory):
+    return memory.fork() if hasattr(memory, "fork") else memory[:]
+
+
+class TraceReplay:
+    """
+    Восстановление состояния УВМ по файлу трассы. seek(step) выставляет
+    registers и memory в состояние после step выполненных команд (step
+    считается от начала программы). Переход идёт вперёд или назад от
+    текущего положения или от ближайшей контрольной точки — что ближе;
+    точки запоминаются по пути через каждые interval записей.
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, memory_size, first_step, code_size = _HEADER.unpack_from(data, 0)
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise ValueError(f"Файл {path} не является трассой УВМ версии {TRACE_VERSION}")
+        offset = _HEADER.size
+        self.program_bytes = bytes(data[offset:offset + code_size])
+        offset += code_size
+        self.memory_size = memory_size
+        self.first_step = first_step
+        self.ring = bool(flags & FLAG_RING)
+
+        if self.ring:
+            registers = list(struct.unpack_from(f"<{NUM_REGS}I", data, offset))
+            offset += 4 * NUM_REGS
+            (npages,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            memory = _empty_memory(memory_size)
+            for _ in range(npages):
+                (index,) = struct.unpack_from("<I", data, offset)
+                start = index * TRACE_PAGE
+                cells = _PAGE.unpack_from(data, offset + 4)[:max(0, memory_size - start)]
+                memory[start:start + len(cells)] = array(MEMORY_TYPECODE, cells)
+                offset += 4 + _PAGE.size
+        else:
+            registers = [0] * NUM_REGS
+            memory = init_memory(self.program_bytes, memory_size)
+
+        self.data = data
+        self.records_offset = offset
+        self.count = (len(data) - offset) // RECORD.size
+        self.registers = registers
+        self.memory = memory
+        # кольцевая трасса начинается с конечного состояния, полная — с начального
+        self.position = self.count if self.ring else 0
+        self.checkpoints = {self.position: (list(registers), _copy_memory(memory))}
+        # каждая точка — копия памяти, поэтому их число ограничено
+        self.interval = max(CHECKPOINT_INTERVAL, -(-self.count // MAX_CHECKPOINTS))
+
+    @property
+    def last_step(self) -> int:
+        return self.first_step + self.count
+
+    def record(self, step: int) -> tuple:
+        """Запись команды номер step (от начала программы): (pc, A, цель, адрес, старое, новое)."""
+        index = step - self.first_step
+        if not (0 <= index < self.count):
+            raise IndexError(f"Шаг {step} вне трассы [{self.first_step}, {self.last_step})")
+        return RECORD.unpack_from(self.data, self.records_offset + index * RECORD.size)
+
+    def _apply(self, index: int, forward: bool):
+        _, _, target, addr, old, new = RECORD.unpack_from(
+            self.data, self.records_offset + index * RECORD.size)
+        value = new if forward else old
+        if target == MEM_TARGET:
+            self.memory[addr] = value
+        else:
+            self.registers[target] = value
+
+    def seek(self, step: int):
+        index = step - self.first_step
+        if not (0 <= index <= self.count):
+            raise IndexError(f"Шаг {step} вне трассы [{self.first_step}, {self.last_step}]")
+
+        # ближайшая точка, от которой идти вперёд или назад
+        base = min(self.checkpoints, key=lambda c: abs(index - c))
+        if abs(index - base) < abs(index - self.position):
+            registers, memory = self.checkpoints[base]
+            self.registers, self.memory = list(registers), _copy_memory(memory)
+            self.position = base
+
+        while self.position < index:
+            self._apply(self.position, True)
+            self.position += 1
+            self._checkpoint()
+        while self.position > index:
+            self.position -= 1
+            self._apply(self.position, False)
+            self._checkpoint()
+
+    def _checkpoint(self):
+        if self.position % self.interval == 0 and self.position not in self.checkpoints:
+            self.checkpoints[self.position] = (list(self.registers), _copy_memory(self.memory))
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def format_record(step: int, record: tuple) -> str:
+    pc, A, target, addr, old, new = record
+    name = OPCODE_NAMES.get(A, f"A={A}")
+    where = f"mem[{addr}]" if target == MEM_TARGET else f"r{target}"
+    return f"{step:>10} pc={pc:<8} {name:<10} {where} = {new} (было {old})"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Воспроизведение трассы выполнения УВМ")
+    ap.add_argument("trace", help="файл трассы (vm.py --trace)")
+    ap.add_argument("--step", type=int, help="восстановить состояние после step команд")
+    ap.add_argument("--show", type=int, nargs=2, metavar=("FROM", "TO"),
+                    help="напечатать записи шагов [FROM, TO)")
+    ap.add_argument("--dump", nargs=3, metavar=("PATH", "START", "END"),
+                    help="дамп памяти восстановленного состояния")
+    ap.add_argument("--format", choices=DUMP_FORMATS, default="xml")
+    args = ap.parse_args()
+
+    replay = TraceReplay(args.trace)
+    kind = "кольцевая" if replay.ring else "полная"
+    print(f"Трасса ({kind}): шаги {replay.first_step}..{replay.last_step}, "
+          f"код {len(replay.program_bytes)} байт, память {replay.memory_size} ячеек")
+
+    if args.show:
+        start = max(args.show[0], replay.first_step)
+        end = min(args.show[1], replay.last_step)
+        for step in range(start, end):
+            print(format_record(step, replay.record(step)))
+
+    if args.step is not None:
+        try:
+            replay.seek(args.step)
+        except IndexError as e:
+            print(e)
+            sys.exit(1)
+        print(f"Регистры после шага {args.step}: {replay.registers}")
+        if args.dump:
+            path, start, end = args.dump
+            dump_memory(replay.memory, replay.registers, path, int(start), int(end), args.format)
+    replay.close()
+
+
+if __name__ == "__main__":
+    main()
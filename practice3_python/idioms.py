@@ -0,0 +1,222 @@
+from array import array
+
+from decoder import decode_program
+from vm import (
+    DEFAULT_MEMORY_SIZE, MEMORY_TYPECODE, NUM_REGS, OP_LOAD, OP_LOAD_CONST, OP_STORE,
+    decode_entry, get_predecoded, init_memory, invalidate_code,
+)
+
+# Распознавание идиом копирования и заполнения памяти.
+#
+# Программа без переходов выполняется строго по порядку, поэтому значения
+# регистров, заданные LOAD_CONST, известны статически (в начале все
+# регистры — 0). Проход по коду ищет серии из «звеньев» вида
+#
+#   LOAD_CONST ...        (0 и больше — установка адресов/значений)
+#   LOAD rT, [rA]         (копирование: STORE пишет только что загруженный rT)
+#   STORE rT, [rB]
+# или
+#   LOAD_CONST ...
+#   STORE rV, [rB]        (запись известной константы rV)
+#
+# где адреса источника/приёмника идут подряд. Серия заменяется одной
+# операцией над срезом памяти; итоговые регистры выставляются так же,
+# как после покомандного выполнения. Серия не распознаётся, если
+# приёмник пересекает код, выходит за память или (для копирования)
+# перекрывается с источником так, что покомандная копия дала бы другой
+# результат. Если во время выполнения STORE всё же пишет в код,
+# статический анализ больше не верен и идиомы отключаются.
+
+MIN_IDIOM_UNITS = 3  # короче — выигрыш меньше накладных расходов
+
+
+class BulkCopy:
+    """memory[dst:dst+count] = memory[src:src+count]"""
+
+    def __init__(self, start: int, end: int, src: int, dst: int, count: int, final: dict):
+        self.start, self.end = start, end
+        self.src, self.dst, self.count = src, dst, count
+        self.final = final  # регистр -> ("const", значение) | ("mem", адрес источника)
+
+    def apply(self, registers: list[int], memory):
+        # все LOAD серии читают ещё не перезаписанные ячейки источника
+        for reg, (kind, value) in self.final.items():
+            registers[reg] = value if kind == "const" else memory[value]
+        memory[self.dst:self.dst + self.count] = memory[self.src:self.src + self.count]
+
+
+class BulkStore:
+    """memory[dst:dst+count] = values (заполнение — частный случай)"""
+
+    def __init__(self, start: int, end: int, dst: int, values: list[int], final: dict):
+        self.start, self.end = start, end
+        self.dst, self.count = dst, len(values)
+        self.values = array(MEMORY_TYPECODE, values)
+        self.final = final
+
+    def apply(self, registers: list[int], memory):
+        for reg, (_, value) in self.final.items():
+            registers[reg] = value
+        memory[self.dst:self.dst + self.count] = self.values
+
+
+def _decode_linear(memory, code_size: int) -> list[tuple]:
+    """Команды программы по порядку: (pc, A, B, C, size), до первой ошибки."""
+    return list(decode_program(memory, code_size).instructions())
+
+
+def _parse_unit(instrs: list[tuple], i: int, consts: list, final: dict):
+    """
+    Разбирает одно звено серии начиная с instrs[i]. consts и final
+    обновляются на месте. Возвращает (индекс после звена, вид, адрес
+    источника или значение, адрес приёмника) или None.
+    """
+    n = len(instrs)
+    while i < n and instrs[i][1] == OP_LOAD_CONST:
+        _, _, B, C, _ = instrs[i]
+        consts[B] = C
+        final[B] = ("const", C)
+        i += 1
+    if i >= n:
+        return None
+
+    _, A, B, C, _ = instrs[i]
+    if A == OP_LOAD and i + 1 < n:
+        src = consts[C]
+        _, A2, B2, C2, _ = instrs[i + 1]
+        if src is None or A2 != OP_STORE or B2 != B or C2 == B or consts[C2] is None:
+            return None
+        consts[B] = None
+        final[B] = ("mem", src)
+        return i + 2, "copy", src, consts[C2]
+
+    if A == OP_STORE and consts[B] is not None and consts[C] is not None:
+        return i + 1, "store", consts[B], consts[C]
+
+    return None
+
+
+def _match_run(instrs: list[tuple], i: int, consts: list, code_size: int, memory_size: int):
+    """Пытается собрать серию звеньев от instrs[i]. Возвращает (идиома, индекс конца)."""
+    kind = None
+    first_src = first_dst = None
+    values = []
+    count = 0
+    end_i = i
+    run_consts, run_final = list(consts), {}
+
+    while True:
+        unit_consts, unit_final = list(run_consts), dict(run_final)
+        unit = _parse_unit(instrs, end_i, unit_consts, unit_final)
+        if unit is None:
+            break
+        next_i, unit_kind, src, dst = unit
+        if kind is None:
+            kind, first_src, first_dst = unit_kind, src, dst
+        elif (unit_kind != kind or dst != first_dst + count
+              or (kind == "copy" and src != first_src + count)):
+            break
+        if kind == "store":
+            values.append(src)
+        count += 1
+        end_i, run_consts, run_final = next_i, unit_consts, unit_final
+
+    if count < MIN_IDIOM_UNITS:
+        return None
+
+    dst_end = first_dst + count
+    if first_dst < code_size or dst_end > memory_size:
+        return None
+    start_pc = instrs[i][0]
+    end_pc = instrs[end_i - 1][0] + instrs[end_i - 1][4]
+
+    if kind == "copy":
+        if first_src + count > memory_size or first_src < first_dst < first_src + count:
+            return None
+        idiom = BulkCopy(start_pc, end_pc, first_src, first_dst, count, run_final)
+    else:
+        idiom = BulkStore(start_pc, end_pc, first_dst, values, run_final)
+
+    consts[:] = run_consts
+    return idiom, end_i
+
+
+def find_idioms(memory, code_size: int) -> dict:
+    """Находит идиомы в коде программы. Возвращает {адрес начала: идиома}."""
+    instrs = _decode_linear(memory, code_size)
+    consts = [0] * NUM_REGS  # известные значения регистров (None — неизвестно)
+    idioms = {}
+    i = 0
+    while i < len(instrs):
+        match = _match_run(instrs, i, consts, code_size, len(memory))
+        if match is not None:
+            idiom, i = match
+            idioms[idiom.start] = idiom
+            continue
+        _, A, B, C, _ = instrs[i]
+        if A == OP_LOAD_CONST:
+            consts[B] = C
+        elif A != OP_STORE:
+            consts[B] = None  # LOAD/ROR: значение зависит от памяти
+        i += 1
+    return idioms
+
+
+# Идиомы зависят только от байтов кода и размера памяти
+IDIOM_CACHE_SIZE = 32
+_idiom_cache: dict[tuple, dict] = {}
+
+
+def get_idioms(program_bytes: bytes, memory) -> dict:
+    """find_idioms с кэшем по программе: повторные запуски не анализируют код заново."""
+    key = (bytes(program_bytes), len(memory))
+    idioms = _idiom_cache.pop(key, None)
+    if idioms is None:
+        idioms = find_idioms(memory, len(program_bytes))
+        if len(_idiom_cache) >= IDIOM_CACHE_SIZE:
+            del _idiom_cache[next(iter(_idiom_cache))]
+    _idiom_cache[key] = idioms
+    return idioms
+
+
+def _exec_idiom(idiom, _, registers: list[int], memory):
+    idiom.apply(registers, memory)
+
+
+def run_program_idioms(program_bytes: bytes, memory_size: int = DEFAULT_MEMORY_SIZE):
+    """
+    То же, что run_program_predecoded, но распознанные серии копирования и
+    заполнения выполняются одной операцией над срезом памяти.
+    Возвращает (registers, memory).
+    """
+    memory = init_memory(program_bytes, memory_size)
+    registers = [0] * NUM_REGS
+    code_size = len(program_bytes)
+    code = get_predecoded(program_bytes, memory)
+
+    idioms = get_idioms(program_bytes, memory)
+    for pc, idiom in idioms.items():
+        code[pc] = (_exec_idiom, idiom, None, idiom.end - idiom.start, None)
+
+    store = OP_STORE
+    pc = 0
+    while pc < code_size:
+        entry = code[pc]
+        if entry is None:
+            entry = decode_entry(memory, pc, code_size)
+            if entry is None:
+                break
+            code[pc] = entry
+
+        handler, B, C, size, A = entry
+        handler(B, C, registers, memory)
+        if A == store and registers[C] < code_size:
+            if idioms:
+                # код изменился — статические значения регистров больше не верны
+                for start in idioms:
+                    code[start] = None
+                idioms = {}
+            invalidate_code(code, registers[C])
+        pc += size
+
+    return registers, memory
@@ -0,0 +1,148 @@
+from array import array
+
+from vm import DEFAULT_MEMORY_SIZE, MEMORY_TYPECODE, program_cells
+
+# Разреженная страничная память УВМ с копированием при записи.
+#
+# Память разбита на страницы по PAGE_SIZE ячеек и хранит только страницы,
+# в которые что-то записывалось: остальные читаются как нули. Поэтому
+# адресное пространство может быть до 4 ГиБ (регистры 32-битные), а память
+# и время запуска растут с числом затронутых страниц.
+#
+# fork() создаёт новую память, разделяющую с исходной все страницы;
+# страница копируется только при первой записи в неё. Поэтому форк стоит
+# O(число выделенных страниц), а не O(размер памяти).
+
+PAGE_BITS = 12
+PAGE_SIZE = 1 << PAGE_BITS   # 4096 ячеек
+PAGE_MASK = PAGE_SIZE - 1
+MAX_MEMORY_SIZE = 1 << 32    # адресуемо 32-битным регистром
+
+_ZERO_PAGE = array(MEMORY_TYPECODE, [0]) * PAGE_SIZE
+
+
+class PagedMemory:
+    """Память УВМ, совместимая по индексации и срезам с array/list."""
+
+    def __init__(self, size: int = DEFAULT_MEMORY_SIZE, pages: dict | None = None):
+        if not (0 < size <= MAX_MEMORY_SIZE):
+            raise ValueError(f"Размер памяти должен быть от 1 до {MAX_MEMORY_SIZE}")
+        self.size = size
+        # номер страницы -> array; отсутствующая страница состоит из нулей
+        self.pages = pages if pages is not None else {}
+        # страницы, принадлежащие только этой памяти; чужие копируются при записи
+        self.owned = set() if pages is not None else None
+
+    @classmethod
+    def from_program(cls, program_bytes: bytes, size: int = DEFAULT_MEMORY_SIZE) -> "PagedMemory":
+        if len(program_bytes) > size:
+            raise ValueError("Программа не помещается в память УВМ")
+        memory = cls(size)
+        memory[0:len(program_bytes)] = program_cells(program_bytes)
+        return memory
+
+    def fork(self) -> "PagedMemory":
+        """Дешёвая копия: страницы общие до первой записи с любой стороны."""
+        self.owned = set()
+        return PagedMemory(self.size, dict(self.pages))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, addr):
+        if isinstance(addr, slice):
+            return self._get_slice(*addr.indices(self.size))
+        if not (0 <= addr < self.size):
+            raise IndexError(addr)
+        page = self.pages.get(addr >> PAGE_BITS)
+        return page[addr & PAGE_MASK] if page is not None else 0
+
+    def _writable_page(self, index: int) -> array:
+        page = self.pages.get(index)
+        if page is None:
+            page = array(MEMORY_TYPECODE, _ZERO_PAGE)
+        elif self.owned is None or index in self.owned:
+            return page
+        else:
+            page = array(MEMORY_TYPECODE, page)
+        self.pages[index] = page
+        if self.owned is not None:
+            self.owned.add(index)
+        return page
+
+    def __setitem__(self, addr, value):
+        if isinstance(addr, slice):
+            self._set_slice(addr, value)
+            return
+        if not (0 <= addr < self.size):
+            raise IndexError(addr)
+        if value == 0 and (addr >> PAGE_BITS) not in self.pages:
+            return  # ноль в невыделенную страницу ничего не меняет
+        self._writable_page(addr >> PAGE_BITS)[addr & PAGE_MASK] = value
+
+    def _get_slice(self, start: int, stop: int, step: int) -> array:
+        if step != 1:
+            return array(MEMORY_TYPECODE, (self[i] for i in range(start, stop, step)))
+        out = array(MEMORY_TYPECODE)
+        while start < stop:
+            offset = start & PAGE_MASK
+            take = min(PAGE_SIZE - offset, stop - start)
+            page = self.pages.get(start >> PAGE_BITS, _ZERO_PAGE)
+            out.extend(page[offset:offset + take])
+            start += take
+        return out
+
+    def _set_slice(self, addr: slice, values):
+        start, stop, step = addr.indices(self.size)
+        if step != 1 or stop - start != len(values):
+            raise ValueError("PagedMemory поддерживает только срезы без шага и той же длины")
+        if not isinstance(values, array) or values.typecode != MEMORY_TYPECODE:
+            values = array(MEMORY_TYPECODE, values)
+        pos = 0
+        while start < stop:
+            offset = start & PAGE_MASK
+            take = min(PAGE_SIZE - offset, stop - start)
+            chunk = values[pos:pos + take]
+            if (start >> PAGE_BITS) in self.pages or any(chunk):
+                self._writable_page(start >> PAGE_BITS)[offset:offset + take] = chunk
+            start += take
+            pos += take
+
+    def __iter__(self):
+        for start in range(0, self.size, PAGE_SIZE):
+            yield from self._get_slice(start, min(start + PAGE_SIZE, self.size), 1)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PagedMemory):
+            # ячейки за концом последней страницы всегда нули
+            return self.size == other.size and all(
+                self.pages.get(i, _ZERO_PAGE) == other.pages.get(i, _ZERO_PAGE)
+                for i in self.pages.keys() | other.pages.keys())
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def allocated_ranges(self, start: int, stop: int):
+        """
+        Участки [начало, конец) внутри [start, stop), лежащие в выделенных
+        страницах, по возрастанию; соседние страницы сливаются в один участок.
+        Всё вне этих участков — нули. Ключи страниц сортируются один раз.
+        """
+        first, last = start >> PAGE_BITS, (stop - 1) >> PAGE_BITS
+        span_start = span_end = None
+        for index in sorted(i for i in self.pages if first <= i <= last):
+            page_start = index << PAGE_BITS
+            if page_start != span_end:
+                if span_end is not None:
+                    yield max(span_start, start), min(span_end, stop)
+                span_start = page_start
+            span_end = page_start + PAGE_SIZE
+        if span_end is not None:
+            yield max(span_start, start), min(span_end, stop)
+
+    def allocated_pages(self) -> int:
+        return len(self.pages)
+
+    def shared_pages(self) -> int:
+        """Число выделенных страниц, ещё не скопированных этой памятью."""
+        if self.owned is None:
+            return 0
+        return len(self.pages) - len(self.owned)
@@ -0,0 +1,119 @@
+import json
+import time
+from collections import Counter
+
+from vm import (
+    DEFAULT_MEMORY_SIZE, NUM_REGS, OP_LOAD, OP_ROR, OP_STORE, OPCODE_HANDLERS, OPCODE_NAMES,
+    decode_instruction, init_memory,
+)
+
+# Профилировщик УВМ.
+#
+# Инструментирован отдельный цикл run_program_profiled, поэтому обычные
+# движки (run_program, run_program_predecoded, blocks) не платят за
+# профилирование ничего: в их горячих циклах нет ни проверок, ни вызовов.
+
+HEATMAP_BUCKET = 256  # ячеек в одной клетке сводной тепловой карты
+TOP_N = 10
+
+
+class Profile:
+    """Собранная статистика одного запуска."""
+
+    def __init__(self):
+        self.op_counts = Counter()   # имя опкода -> число выполнений
+        self.op_ns = Counter()       # имя опкода -> суммарное время, нс
+        self.pc_counts = Counter()   # адрес команды -> число выполнений
+        self.reads = Counter()       # адрес памяти -> число чтений (LOAD, ROR)
+        self.writes = Counter()      # адрес памяти -> число записей (STORE)
+        self.total_ns = 0
+
+    @property
+    def instructions(self) -> int:
+        return sum(self.op_counts.values())
+
+    def to_dict(self) -> dict:
+        def buckets(counter: Counter) -> dict:
+            result = Counter()
+            for addr, n in counter.items():
+                result[addr // HEATMAP_BUCKET * HEATMAP_BUCKET] += n
+            return {str(k): v for k, v in sorted(result.items())}
+
+        return {
+            "instructions": self.instructions,
+            "total_ns": self.total_ns,
+            "opcodes": {
+                name: {"count": n, "ns": self.op_ns[name]}
+                for name, n in self.op_counts.most_common()
+            },
+            "pc_counts": {str(pc): n for pc, n in sorted(self.pc_counts.items())},
+            "memory": {
+                "bucket": HEATMAP_BUCKET,
+                "reads": {str(a): n for a, n in sorted(self.reads.items())},
+                "writes": {str(a): n for a, n in sorted(self.writes.items())},
+                "read_buckets": buckets(self.reads),
+                "write_buckets": buckets(self.writes),
+            },
+        }
+
+    def save_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def report(self) -> str:
+        lines = []
+        total = self.instructions
+        seconds = self.total_ns / 1e9
+        lines.append(f"Выполнено команд: {total}, время: {seconds:.6f} с")
+        lines.append("По опкодам:")
+        for name, n in self.op_counts.most_common():
+            ns = self.op_ns[name]
+            lines.append(f"  {name:<10} {n:>10} ({n / total:6.1%})  "
+                         f"{ns / 1e6:10.3f} мс  {ns / n:8.0f} нс/команду")
+        lines.append(f"Самые частые адреса команд (топ {TOP_N}):")
+        for pc, n in self.pc_counts.most_common(TOP_N):
+            lines.append(f"  pc={pc:<8} {n}")
+        for title, counter in (("Чтения памяти", self.reads), ("Записи в память", self.writes)):
+            lines.append(f"{title} (топ {TOP_N}):")
+            for addr, n in counter.most_common(TOP_N):
+                lines.append(f"  addr={addr:<8} {n}")
+        return "\n".join(lines)
+
+
+def run_program_profiled(program_bytes: bytes, memory_size: int = DEFAULT_MEMORY_SIZE,
+                         profile: Profile | None = None):
+    """
+    То же, что run_program, но со сбором статистики.
+    Возвращает (registers, memory, profile).
+    """
+    profile = profile if profile is not None else Profile()
+    op_counts, op_ns, pc_counts = profile.op_counts, profile.op_ns, profile.pc_counts
+    reads, writes = profile.reads, profile.writes
+    clock = time.perf_counter_ns
+
+    memory = init_memory(program_bytes, memory_size)
+    registers = [0] * NUM_REGS
+    code_size = len(program_bytes)
+
+    started = clock()
+    pc = 0
+    while pc < code_size:
+        A, B, C, size = decode_instruction(memory, pc, code_size)
+        if size == 0:
+            break
+
+        name = OPCODE_NAMES.get(A, f"A={A}")
+        if A == OP_STORE:
+            writes[registers[C]] += 1
+        elif A == OP_LOAD or A == OP_ROR:
+            reads[registers[C]] += 1
+
+        t0 = clock()
+        OPCODE_HANDLERS[A](B, C, registers, memory)
+        op_ns[name] += clock() - t0
+        op_counts[name] += 1
+        pc_counts[pc] += 1
+        pc += size
+    profile.total_ns += clock() - started
+
+    return registers, memory, profile
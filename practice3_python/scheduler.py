@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import time
+
+from vm import DEFAULT_MEMORY_SIZE, VM, load_binary
+
+# Кооперативный планировщик множества УВМ в одном процессе.
+#
+# Каждая УВМ выполняется квантами по quota команд (VM.step), после кванта
+# планировщик отдаёт управление циклу asyncio, так что ни длинная
+# программа, ни сам планировщик не блокируют остальные сопрограммы
+# сервиса дольше одного кванта.
+#
+# Очередность — шаговое планирование (stride scheduling): у задачи есть
+# «проход» pass, после каждого кванта он растёт на STRIDE_BASE // priority,
+# выполняется задача с наименьшим pass. Поэтому доля процессора
+# пропорциональна приоритету, и задача с любым приоритетом рано или поздно
+# получает квант. Новая задача начинает с текущего pass планировщика и не
+# получает «долга» за время, пока её не было.
+
+DEFAULT_QUOTA = 1000
+STRIDE_BASE = 1 << 20
+MAX_PRIORITY = 1000
+
+
+class VMTask:
+    """УВМ в планировщике. await task возвращает (registers, memory)."""
+
+    def __init__(self, vm: VM, name: str, priority: int, quota: int, future: asyncio.Future):
+        self.vm = vm
+        self.name = name
+        self.priority = priority
+        self.quota = quota
+        self.future = future
+        self.stride = STRIDE_BASE // priority
+        self.pass_ = 0
+        self.slices = 0
+        self.run_ns = 0
+        self.max_slice_ns = 0
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+
+    def __await__(self):
+        return self.future.__await__()
+
+    @property
+    def state(self) -> str:
+        if self.finished is None:
+            return "waiting" if self.started is None else "running"
+        if self.future.cancelled():
+            return "cancelled"
+        return "failed" if self.future.exception() is not None else "done"
+
+    def metrics(self) -> dict:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        run_seconds = self.run_ns / 1e9
+        return {
+            "name": self.name,
+            "priority": self.priority,
+            "state": self.state,
+            "instructions": self.vm.executed,
+            "slices": self.slices,
+            "run_seconds": run_seconds,
+            "max_slice_ms": self.max_slice_ns / 1e6,
+            "mips": self.vm.executed / run_seconds / 1e6 if run_seconds else 0.0,
+            # от постановки в очередь до первого кванта и до завершения
+            "wait_seconds": (self.started or end) - self.submitted,
+            "latency_seconds": end - self.submitted,
+        }
+
+
+class Scheduler:
+    def __init__(self, quota: int = DEFAULT_QUOTA):
+        if quota < 1:
+            raise ValueError("Квант должен быть не меньше одной команды")
+        self.quota = quota
+        self.tasks = []      # все поставленные задачи, включая завершённые
+        self._queue = []     # куча (pass, номер, задача)
+        self._seq = itertools.count()
+        self._pass = 0
+        self._wakeup = asyncio.Event()
+
+    def submit(self, vm: VM, priority: int = 1, quota: int | None = None,
+               name: str | None = None) -> VMTask:
+        """Ставит УВМ в очередь. Вызывается из работающего цикла asyncio."""
+        if not (1 <= priority <= MAX_PRIORITY):
+            raise ValueError(f"Приоритет должен быть от 1 до {MAX_PRIORITY}")
+        future = asyncio.get_running_loop().create_future()
+        task = VMTask(vm, name or f"vm{len(self.tasks)}", priority, quota or self.quota, future)
+        task.pass_ = self._pass
+        self.tasks.append(task)
+        heapq.heappush(self._queue, (task.pass_, next(self._seq), task))
+        self._wakeup.set()
+        return task
+
+    def _finish(self, task: VMTask, error: BaseException | None = None):
+        task.finished = time.perf_counter()
+        if task.future.done():
+            return  # ожидающий отменил задачу
+        if error is not None:
+            task.future.set_exception(error)
+        else:
+            task.future.set_result((task.vm.registers, task.vm.memory))
+
+    async def run(self, forever: bool = False):
+        """
+        Выполняет задачи, пока очередь не опустеет. С forever=True ждёт
+        новых задач (режим сервиса) до отмены сопрограммы.
+        """
+        clock = time.perf_counter_ns
+        while True:
+            if not self._queue:
+                if not forever:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            self._pass, _, task = heapq.heappop(self._queue)
+            if task.future.cancelled():
+                self._finish(task)
+                continue
+            if task.started is None:
+                task.started = time.perf_counter()
+
+            started = clock()
+            try:
+                task.vm.step(task.quota)
+            except Exception as e:
+                self._finish(task, e)
+            else:
+                if task.vm.halted:
+                    self._finish(task)
+                else:
+                    task.pass_ += task.stride
+                    heapq.heappush(self._queue, (task.pass_, next(self._seq), task))
+            elapsed = clock() - started
+            task.run_ns += elapsed
+            task.slices += 1
+            task.max_slice_ns = max(task.max_slice_ns, elapsed)
+
+            await asyncio.sleep(0)  # квант окончен — очередь остальным сопрограммам
+
+    def metrics(self) -> dict:
+        tasks = [task.metrics() for task in self.tasks]
+        return {
+            "quota": self.quota,
+            "tasks": tasks,
+            "active": sum(1 for t in tasks if t["state"] in ("waiting", "running")),
+            "instructions": sum(t["instructions"] for t in tasks),
+            "slices": sum(t["slices"] for t in tasks),
+        }
+
+
+def print_metrics(metrics: dict):
+    print(f"{'имя':<20} {'прио':>4} {'состояние':<10} {'команд':>10} {'квантов':>8} "
+          f"{'MIPS':>7} {'макс. квант, мс':>16} {'ожидание, с':>12} {'всего, с':>9}")
+    for t in metrics["tasks"]:
+        print(f"{t['name']:<20} {t['priority']:>4} {t['state']:<10} {t['instructions']:>10} "
+              f"{t['slices']:>8} {t['mips']:7.3f} {t['max_slice_ms']:16.3f} "
+              f"{t['wait_seconds']:12.4f} {t['latency_seconds']:9.4f}")
+
+
+async def run_programs(programs: list[tuple[str, int]], quota: int, memory_size: int) -> dict:
+    scheduler = Scheduler(quota)
+    tasks = [scheduler.submit(VM(load_binary(path), memory_size), priority, name=path)
+             for path, priority in programs]
+    await scheduler.run()
+    for task in tasks:
+        if task.state == "failed":
+            print(f"{task.name}: {task.future.exception()}")
+    return scheduler.metrics()
+
+
+def parse_program_arg(arg: str) -> tuple[str, int]:
+    path, sep, priority = arg.rpartition(":")
+    if sep and priority.isdigit():
+        return path, int(priority)
+    return arg, 1
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Совместное выполнение нескольких программ УВМ")
+    ap.add_argument("programs", nargs="+", metavar="PROGRAM[:PRIORITY]",
+                    help="бинарные файлы программ, приоритет по умолчанию 1")
+    ap.add_argument("--quota", type=int, default=DEFAULT_QUOTA, help="команд за квант")
+    ap.add_argument("--memory-size", type=int, default=DEFAULT_MEMORY_SIZE)
+    ap.add_argument("--json", metavar="PATH", help="сохранить метрики в JSON")
+    args = ap.parse_args()
+
+    programs = [parse_program_arg(arg) for arg in args.programs]
+    metrics = asyncio.run(run_programs(programs, args.quota, args.memory_size))
+    print_metrics(metrics)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import yaml
+
+from assembler import TEXT_EXTENSION, YamlLoader, assemble, assemble_text
+from vm import DEFAULT_MEMORY_SIZE, ENGINE_NAMES, get_engine, load_binary
+
+# Долгоживущий сервер «ассемблировать и выполнить».
+#
+# Запуск интерпретатора и импорт PyYAML для каждой маленькой программы
+# стоят дороже самой программы. Сервер держит прогретые процессы-
+# исполнители (модули импортированы, тестовая программа уже прогнана) и
+# принимает запросы JSON-строками — из stdin или через локальный Unix-сокет.
+# На каждую строку запроса выдаётся одна строка ответа; ответы могут идти
+# не в порядке запросов, их сопоставляют по id.
+#
+# Запрос: {"id": ..., одно из
+#            "source": текст YAML (или .uasm при "syntax": "uasm"),
+#            "binary": машинный код в base64,
+#            "path": путь к .yaml, .uasm или .bin;
+#          "start": 0, "end": 100, "memory_size": 65536, "engine": "predecoded"}
+# Ответ:  {"id": ..., "ok": true, "registers": [...], "memory": [ячейки start..end],
+#          "code_bytes": N, "timing": {"queue_ms", "assemble_ms", "run_ms", "total_ms"}}
+#         или {"id": ..., "ok": false, "error": "..."}
+#
+# Запросы проверяются до отправки исполнителю: memory_size не больше
+# --max-memory, диапазон start..end не длиннее MAX_RESPONSE_CELLS ячеек,
+# "path" — только внутри каталога --root. Если процесс-исполнитель упал,
+# запросы получают ответ с ошибкой, а пул создаётся заново.
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_MAX_MEMORY = 1 << 24    # ячеек; разреженная память, но страницы реальны
+MAX_RESPONSE_CELLS = 1 << 16    # ячеек памяти в одном ответе
+_WARMUP_SOURCE = "LOAD_CONST r0, 1\nLOAD_CONST r1, 100\nSTORE r0, [r1]\nLOAD r2, [r1]\n"
+
+
+def load_code(request: dict) -> bytes:
+    """Машинный код из запроса: ассемблирует исходник или берёт готовый бинарник."""
+    if "binary" in request:
+        return base64.b64decode(request["binary"])
+    if "source" in request:
+        if request.get("syntax", "yaml") == "uasm":
+            return bytes(assemble_text(request["source"])[0])
+        data = yaml.load(request["source"], Loader=YamlLoader)
+        if not isinstance(data, dict) or "program" not in data:
+            raise ValueError("В YAML должен быть объект с ключом 'program'")
+        return bytes(assemble(data["program"])[0])
+    if "path" in request:
+        path = request["path"]
+        if path.endswith(".bin"):
+            return load_binary(path)
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        syntax = "uasm" if path.endswith(TEXT_EXTENSION) else "yaml"
+        return load_code({"source": text, "syntax": syntax})
+    raise ValueError("В запросе нет ни source, ни binary, ни path")
+
+
+def _int_field(request: dict, name: str, default: int) -> int:
+    value = request.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"Поле {name} должно быть целым числом")
+    return value
+
+
+def validate_request(request: dict, root: str, max_memory: int) -> dict:
+    """
+    Проверяет ограничения сервера до выполнения. Возвращает запрос с путём,
+    приведённым к абсолютному (внутри root). Ошибки — ValueError.
+    """
+    memory_size = _int_field(request, "memory_size", DEFAULT_MEMORY_SIZE)
+    if not (1 <= memory_size <= max_memory):
+        raise ValueError(f"memory_size должен быть от 1 до {max_memory}")
+    start = _int_field(request, "start", 0)
+    end = _int_field(request, "end", start - 1)
+    if start < 0 or end >= memory_size or end < start - 1:
+        raise ValueError("Диапазон адресов выходит за пределы памяти")
+    if end - start + 1 > MAX_RESPONSE_CELLS:
+        raise ValueError(f"В ответе не больше {MAX_RESPONSE_CELLS} ячеек памяти")
+    if "path" in request:
+        if not isinstance(request["path"], str):
+            raise ValueError("Поле path должно быть строкой")
+        path = os.path.realpath(os.path.join(root, request["path"]))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Путь вне каталога {root}")
+        request = dict(request, path=path)
+    return request
+
+
+def handle_request(request: dict) -> dict:
+    """Выполняет один запрос. Исключения превращаются в ответ с ok=false."""
+    started = time.perf_counter()
+    response = {"id": request.get("id")}
+    try:
+        code = load_code(request)
+        assembled = time.perf_counter()
+
+        engine = request.get("engine", "predecoded")
+        if engine not in ENGINE_NAMES:
+            raise ValueError(f"Неизвестный движок: {engine}")
+        registers, memory = get_engine(engine)(code, int(request.get("memory_size",
+                                                                     DEFAULT_MEMORY_SIZE)))
+        finished = time.perf_counter()
+
+        start = int(request.get("start", 0))
+        end = int(request.get("end", start - 1))  # по умолчанию — без ячеек
+        if start < 0 or end >= len(memory) or end < start - 1:
+            raise ValueError("Диапазон адресов выходит за пределы памяти")
+        response.update(ok=True, registers=list(registers),
+                        memory=list(memory[start:end + 1]), code_bytes=len(code))
+        response["timing"] = {"assemble_ms": (assembled - started) * 1e3,
+                              "run_ms": (finished - assembled) * 1e3}
+    except Exception as e:
+        response.update(ok=False, error=f"{type(e).__name__}: {e}")
+        response["timing"] = {}
+    response["timing"]["total_ms"] = (time.perf_counter() - started) * 1e3
+    return response
+
+
+def warm_up() -> int:
+    """Прогревает процесс: импорты уже выполнены, прогоняем маленькую программу."""
+    for engine in ENGINE_NAMES:
+        handle_request({"source": _WARMUP_SOURCE, "syntax": "uasm", "engine": engine})
+    handle_request({"source": "program: [{op: LOAD_CONST, dst: 0, value: 1}]"})
+    return os.getpid()
+
+
+class Server:
+    def __init__(self, workers: int = DEFAULT_WORKERS, root: str | None = None,
+                 max_memory: int = DEFAULT_MAX_MEMORY):
+        # workers=0 — выполнять запросы прямо в процессе сервера
+        self.workers = workers
+        self.pool = self._new_pool()
+        # файлы по "path" читаются только внутри root
+        self.root = os.path.realpath(root or os.getcwd())
+        self.max_memory = max_memory
+        self.requests = 0
+        self.failed = 0
+        self.restarts = 0
+
+    def _new_pool(self) -> ProcessPoolExecutor | None:
+        if not self.workers:
+            return None
+        return ProcessPoolExecutor(self.workers, initializer=warm_up)
+
+    def _restart_pool(self, broken: ProcessPoolExecutor):
+        """Заменяет упавший пул; одновременные ошибки пересоздают его один раз."""
+        if self.pool is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.pool = self._new_pool()
+        self.restarts += 1
+        print(f"Процесс-исполнитель упал, пул создан заново ({self.restarts})", file=sys.stderr)
+
+    async def start(self):
+        """Поднимает и прогревает все процессы-исполнители заранее."""
+        loop = asyncio.get_running_loop()
+        if self.pool is None:
+            warm_up()
+            return
+        await asyncio.gather(*(loop.run_in_executor(self.pool, os.getpid)
+                               for _ in range(self.workers)))
+
+    async def process_line(self, line: str) -> str | None:
+        line = line.strip()
+        if not line:
+            return None
+        received = time.perf_counter()
+        request = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("запрос должен быть JSON-объектом")
+            request = validate_request(request, self.root, self.max_memory)
+        except ValueError as e:
+            request_id = request.get("id") if isinstance(request, dict) else None
+            response = {"id": request_id, "ok": False, "error": f"Некорректный запрос: {e}",
+                        "timing": {"total_ms": 0.0}}
+        else:
+            if self.pool is None:
+                response = handle_request(request)
+            else:
+                loop = asyncio.get_running_loop()
+                pool = self.pool
+                try:
+                    response = await loop.run_in_executor(pool, handle_request, request)
+                except BrokenProcessPool:
+                    self._restart_pool(pool)
+                    response = {"id": request.get("id"), "ok": False,
+                                "error": "Процесс-исполнитель завершился аварийно",
+                                "timing": {"total_ms": 0.0}}
+        timing = response["timing"]
+        # время в очереди и на передачу между процессами
+        timing["queue_ms"] = (time.perf_counter() - received) * 1e3 - timing["total_ms"]
+        self.requests += 1
+        self.failed += not response["ok"]
+        return json.dumps(response, ensure_ascii=False)
+
+    async def serve_stdin(self):
+        loop = asyncio.get_running_loop()
+        pending = set()
+
+        async def answer(line: str):
+            out = await self.process_line(line)
+            if out is not None:
+                sys.stdout.write(out + "\n")
+                sys.stdout.flush()
+
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                break
+            task = asyncio.create_task(answer(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.wait(pending)
+
+    async def serve_socket(self, path: str):
+        async def client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                while line := await reader.readline():
+                    out = await self.process_line(line.decode("utf-8"))
+                    if out is not None:
+                        writer.write(out.encode("utf-8") + b"\n")
+                        await writer.drain()
+            finally:
+                writer.close()
+
+        if os.path.exists(path):
+            os.remove(path)
+        server = await asyncio.start_unix_server(client, path)
+        print(f"Сервер слушает {path}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+async def serve(args):
+    server = Server(args.workers, args.root, args.max_memory)
+    try:
+        started = time.perf_counter()
+        await server.start()
+        print(f"Исполнителей: {args.workers}, прогрев {time.perf_counter() - started:.2f} с",
+              file=sys.stderr)
+        if args.socket:
+            await server.serve_socket(args.socket)
+        else:
+            await server.serve_stdin()
+    finally:
+        server.close()
+        print(f"Запросов: {server.requests}, ошибок: {server.failed}", file=sys.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Сервер ассемблирования и выполнения программ УВМ")
+    ap.add_argument("--socket", metavar="PATH",
+                    help="слушать Unix-сокет вместо stdin/stdout")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                    help="число прогретых процессов (0 — выполнять в процессе сервера)")
+    ap.add_argument("--root", metavar="DIR",
+                    help="каталог, вне которого запросы не читают файлы по path "
+                         "(по умолчанию — текущий)")
+    ap.add_argument("--max-memory", type=int, default=DEFAULT_MAX_MEMORY,
+                    help=f"наибольший memory_size запроса (по умолчанию {DEFAULT_MAX_MEMORY})")
+    args = ap.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
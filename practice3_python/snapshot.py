@@ -0,0 +1,101 @@
+import struct
+from array import array
+
+from paged_memory import PAGE_BITS, PAGE_SIZE, PagedMemory
+from vm import DEFAULT_MEMORY_SIZE, MEMORY_TYPECODE, VM
+
+# Снимки состояния УВМ.
+#
+# Снимок хранит регистры, pc, число выполненных команд и страничную
+# память после общего пролога программы. fork() порождает из снимка
+# новую УВМ за O(число страниц): память общая до первой записи.
+#
+# Формат файла снимка (little-endian):
+#   b"UVMS", версия (H), размер памяти, размер кода, pc, выполнено (Q каждый),
+#   число регистров (B), регистры (I), число сохранённых страниц (I),
+#   затем для каждой выделенной ненулевой страницы: номер (I) и PAGE_SIZE слов (I).
+
+SNAPSHOT_MAGIC = b"UVMS"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct("<4sHQQQQB")
+_PAGE = struct.Struct(f"<{PAGE_SIZE}I")
+
+
+class Snapshot:
+    def __init__(self, memory: PagedMemory, registers: list[int], pc: int,
+                 code_size: int, executed: int = 0, code: list | None = None):
+        self.memory = memory
+        self.registers = list(registers)
+        self.pc = pc
+        self.code_size = code_size
+        self.executed = executed
+        self.code = code  # предекодированный код; после load() строится заново
+
+    @classmethod
+    def from_vm(cls, vm: VM) -> "Snapshot":
+        memory = vm.memory
+        if isinstance(memory, PagedMemory):
+            memory = memory.fork()
+        else:
+            # плотная память (array) копируется в страничную, нулевые страницы не выделяются
+            dense, memory = memory, PagedMemory(len(memory))
+            memory[0:len(dense)] = dense
+        return cls(memory, vm.registers, vm.pc, vm.code_size, vm.executed, vm.code.copy())
+
+    def fork(self) -> VM:
+        """Новая УВМ, продолжающая выполнение с момента снимка."""
+        return VM.from_state(self.memory.fork(), self.registers, self.pc,
+                             self.code_size, self.code, self.executed)
+
+    def save(self, path: str):
+        memory = self.memory
+        pages = [(i, page) for i, page in sorted(memory.pages.items()) if any(page)]
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, memory.size, self.code_size,
+                                 self.pc, self.executed, len(self.registers)))
+            f.write(struct.pack(f"<{len(self.registers)}I", *self.registers))
+            f.write(struct.pack("<I", len(pages)))
+            for index, page in pages:
+                f.write(struct.pack("<I", index))
+                f.write(_PAGE.pack(*page))
+
+    @classmethod
+    def load(cls, path: str) -> "Snapshot":
+        with open(path, "rb") as f:
+            magic, version, size, code_size, pc, executed, nregs = _HEADER.unpack(
+                f.read(_HEADER.size))
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError(f"Файл {path} не является снимком УВМ версии {SNAPSHOT_VERSION}")
+            registers = list(struct.unpack(f"<{nregs}I", f.read(4 * nregs)))
+            (npages,) = struct.unpack("<I", f.read(4))
+
+            memory = PagedMemory(size)
+            for _ in range(npages):
+                (index,) = struct.unpack("<I", f.read(4))
+                if index << PAGE_BITS >= size:
+                    raise ValueError(f"Повреждённый снимок: страница {index} вне памяти")
+                memory.pages[index] = array(MEMORY_TYPECODE, _PAGE.unpack(f.read(_PAGE.size)))
+        return cls(memory, registers, pc, code_size, executed)
+
+
+def take_snapshot(program_bytes: bytes, steps: int,
+                  memory_size: int = DEFAULT_MEMORY_SIZE) -> Snapshot:
+    """Выполняет первые steps команд программы и снимает состояние."""
+    vm = VM(program_bytes, memory=PagedMemory.from_program(program_bytes, memory_size))
+    vm.step(steps)
+    return Snapshot.from_vm(vm)
+
+
+def run_forks(snapshot: Snapshot, variants: list[dict[int, int]]) -> list[tuple]:
+    """
+    Для каждого варианта — словаря {адрес: значение}, записываемого в память
+    перед продолжением, — выполняет программу от снимка до конца.
+    Возвращает список (registers, memory).
+    """
+    results = []
+    for pokes in variants:
+        vm = snapshot.fork()
+        for addr, value in pokes.items():
+            vm.poke(addr, value)
+        results.append(vm.run())
+    return results
@@ -1,8 +1,577 @@
 # test_assembler.py
-from assembler import instr_to_fields, encode_instruction
+import os
+import tempfile
+from array import array
 
+from assembler import assemble, assemble_stream, assemble_text, disassemble, instr_to_fields, encode_instruction
+from vm import DENSE_MEMORY_LIMIT, MEMORY_TYPECODE, dump_memory, load_binary, run_program, run_program_predecoded
 
-def main():
+# Программа с самомодификацией: STORE записывает 200 в третий байт
+# последней команды LOAD_CONST (адрес 12) уже после того, как весь код
+# предекодирован, так что движки обязаны декодировать её заново.
+SELF_MODIFYING_SOURCE = """
+LOAD_CONST r1, 200
+LOAD_CONST r2, 12
+STORE r1, [r2]
+LOAD_CONST r3, 5
+LOAD_CONST r4, 100
+STORE r3, [r4]
+LOAD r5, [r4]
+ROR r5, [r2]
+"""
+
+# Повторных запусков на движок: кэши и анализ адресов включаются со второго
+ENGINE_RUNS = 3
+
+
+def check(name: str, ok: bool) -> bool:
+    print(f"Тест: {name}")
+    print("  => OK\n" if ok else "  => FAIL\n")
+    return ok
+
+
+def same_state(result, expected) -> bool:
+    registers, memory = result
+    ref_registers, ref_memory = expected
+    return list(registers) == list(ref_registers) and list(memory) == list(ref_memory)
+
+
+def check_engine_matches_reference(name: str, run) -> bool:
+    """
+    Движок совпадает с run_program на самомодифицирующемся коде и на
+    случайных программах из bench.py.
+    """
+    code = bytes(assemble_text(SELF_MODIFYING_SOURCE)[0])
+    expected = run_program(code, 256)
+    ok = expected[0][3] != 5  # STORE действительно изменил команду
+    for _ in range(ENGINE_RUNS):
+        ok = same_state(run(code, 256), expected) and ok
+
+    from bench import generate_program
+    for mix in ("balanced", "memory"):
+        program, memory_size = generate_program(300, mix, seed=1)
+        code = bytes(assemble(program)[0])
+        expected = run_program(code, memory_size)
+        for _ in range(ENGINE_RUNS):
+            ok = same_state(run(code, memory_size), expected) and ok
+    return check(f"движок {name} совпадает с run_program", ok)
+
+
+def test_predecoded() -> bool:
+    return check_engine_matches_reference("predecoded", run_program_predecoded)
+
+
+def test_blocks() -> bool:
+    from block_compiler import run_program_blocks
+    return check_engine_matches_reference("blocks", run_program_blocks)
+
+
+def test_paged_memory_fork() -> bool:
+    """Форк PagedMemory делит страницы до записи и не видит чужих записей."""
+    from paged_memory import PAGE_SIZE, PagedMemory
+
+    memory = PagedMemory(PAGE_SIZE * 4)
+    memory[5] = 1
+    memory[PAGE_SIZE + 5] = 2
+    child = memory.fork()
+    ok = child.shared_pages() == 2 and child[5] == 1 and child == memory
+
+    child[5] = 10               # копия страницы только у форка
+    memory[PAGE_SIZE + 5] = 20  # копия страницы только у исходной памяти
+    memory[3 * PAGE_SIZE] = 30  # новая страница
+    ok = (ok and memory[5] == 1 and child[5] == 10
+          and child[PAGE_SIZE + 5] == 2 and memory[PAGE_SIZE + 5] == 20
+          and child[3 * PAGE_SIZE] == 0 and child.shared_pages() == 1
+          and child.allocated_pages() == 2 and memory.allocated_pages() == 3)
+    return check("PagedMemory: fork и копирование при записи", ok)
+
+
+def test_vm_resume() -> bool:
+    """Прерванная и продолженная (в том числе со снимка) УВМ совпадает с run_program."""
+    from snapshot import run_forks, take_snapshot
+    from vm import VM
+
+    code = bytes(assemble_text(SELF_MODIFYING_SOURCE)[0])
+    expected = run_program(code, 256)
+    vm = VM(code, 256)
+    ok = vm.step(2) == 2 and not vm.halted
+    ok = same_state(vm.run(), expected) and vm.executed == 8 and ok
+
+    # снимок до самомодифицирующего STORE; второй форк меняет старший
+    # байт ещё не выполненной команды LOAD_CONST r3
+    snapshot = take_snapshot(code, 2, 256)
+    plain, poked = run_forks(snapshot, [{}, {13: 1}])
+    patched = bytearray(code)
+    patched[13] = 1
+    ok = ok and same_state(plain, expected) and same_state(poked, run_program(patched, 256))
+    ok = ok and poked[0][3] != expected[0][3]
+    ok = ok and list(snapshot.fork().memory[:len(code)]) == list(code)
+    return check("VM: step/run и форки снимка", ok)
+
+
+def test_snapshot_file() -> bool:
+    """Снимок обычной УВМ сохраняется в файл, загружается и продолжается форками."""
+    from snapshot import Snapshot, run_forks
+    from vm import VM
+
+    code = bytes(assemble_text(SELF_MODIFYING_SOURCE)[0])
+    expected = run_program(code, 256)
+    patched = bytearray(code)
+    patched[13] = 1
+    vm = VM(code, 256)            # плотная память array
+    vm.step(2)
+    snapshot = Snapshot.from_vm(vm)
+    ok = same_state(vm.run(), expected)   # УВМ и снимок не делят память
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.uvms")
+        snapshot.save(path)
+        loaded = Snapshot.load(path)
+        ok = (ok and loaded.code is None and loaded.memory == snapshot.memory
+              and (loaded.registers, loaded.pc, loaded.code_size, loaded.executed)
+              == (snapshot.registers, snapshot.pc, snapshot.code_size, snapshot.executed))
+        plain, poked = run_forks(loaded, [{}, {13: 1}])
+        ok = ok and same_state(plain, expected) and same_state(poked, run_program(patched, 256))
+
+        with open(path, "r+b") as f:
+            f.write(b"XXXX")
+        try:
+            Snapshot.load(path)
+            ok = False
+        except ValueError:
+            pass
+    return check("Snapshot: save/load и форки загруженного снимка", ok)
+
+
+def copy_fill_source(count: int) -> str:
+    """Заполнение ячеек 300.. константами и копирование их в 400.. по одной."""
+    lines = []
+    for i in range(count):
+        lines += [f"LOAD_CONST r1, {300 + i}", f"LOAD_CONST r2, {i * 7 + 1}", "STORE r2, [r1]"]
+    for i in range(count):
+        lines += [f"LOAD_CONST r3, {300 + i}", f"LOAD_CONST r4, {400 + i}",
+                  "LOAD r5, [r3]", "STORE r5, [r4]"]
+    return "\n".join(lines)
+
+
+def test_idioms() -> bool:
+    """Движок idioms совпадает с run_program и находит идиомы заполнения и копирования."""
+    from idioms import BulkCopy, BulkStore, find_idioms, run_program_idioms
+    from vm import init_memory
+
+    ok = check_engine_matches_reference("idioms", run_program_idioms)
+    code = bytes(assemble_text(copy_fill_source(10))[0])
+    kinds = {type(idiom) for idiom in find_idioms(init_memory(code, 1024), len(code)).values()}
+    expected = run_program(code, 1024)
+    ok = ok and kinds == {BulkCopy, BulkStore} and list(expected[1][400:410]) == [
+        i * 7 + 1 for i in range(10)]
+    for _ in range(ENGINE_RUNS):
+        ok = same_state(run_program_idioms(code, 1024), expected) and ok
+    return check("идиомы копирования и заполнения", ok)
+
+
+def test_paged_dump() -> bool:
+    """Большая память разреженная, rle-дамп совпадает с дампом обычной памяти."""
+    from paged_memory import PAGE_SIZE, PagedMemory
+
+    code = bytes(assemble_text(SELF_MODIFYING_SOURCE)[0])
+    registers, memory = run_program(code, DENSE_MEMORY_LIMIT * 2)
+    ok = isinstance(memory, PagedMemory) and memory.allocated_pages() == 1
+    memory[PAGE_SIZE * 5 + 3] = 9     # две соседние страницы — один участок
+    memory[PAGE_SIZE * 6] = 8
+    memory[DENSE_MEMORY_LIMIT * 2 - 1] = 7
+    ok = ok and list(memory.allocated_ranges(10, PAGE_SIZE * 8)) == [
+        (10, PAGE_SIZE), (PAGE_SIZE * 5, PAGE_SIZE * 7)]
+
+    end = PAGE_SIZE * 8
+    dense = array(MEMORY_TYPECODE, memory[:end])
+    with tempfile.TemporaryDirectory() as tmp:
+        dumps = []
+        for name, mem in (("paged", memory), ("dense", dense)):
+            path = os.path.join(tmp, name + ".rle")
+            dump_memory(mem, registers, path, 1, end - 1, "rle")
+            with open(path, encoding="utf-8") as f:
+                dumps.append(f.read())
+    ok = ok and dumps[0] == dumps[1] and f"D {PAGE_SIZE * 6} 8" in dumps[0]
+    return check("разреженная память и rle-дамп", ok)
+
+
+def test_assemble_stream() -> bool:
+    """Потоковое ассемблирование совпадает с обычным; при ошибке output не тронут."""
+    import yaml
+    from bench import generate_program
+
+    program, _ = generate_program(500, "balanced", seed=2)
+    with tempfile.TemporaryDirectory() as tmp:
+        source, output = os.path.join(tmp, "prog.yaml"), os.path.join(tmp, "out.bin")
+        with open(source, "w", encoding="utf-8") as f:
+            yaml.safe_dump({"program": program}, f)
+        size, count = assemble_stream(source, output, chunk_size=64)
+        with open(output, "rb") as f:
+            ok = f.read() == bytes(assemble(program)[0]) and count == 500 and size > 0
+        mask = os.umask(0o022)
+        os.umask(mask)
+        ok = ok and os.stat(output).st_mode & 0o777 == 0o666 & ~mask
+
+        # нет исходника: временный файл удалён, его дескриптор закрыт
+        fds = len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else None
+        try:
+            assemble_stream(os.path.join(tmp, "missing.yaml"), output)
+            ok = False
+        except FileNotFoundError:
+            pass
+        if fds is not None:
+            ok = ok and len(os.listdir("/proc/self/fd")) == fds
+
+        with open(source, "a", encoding="utf-8") as f:
+            f.write("- {op: BAD, dst: 1}\n")
+        try:
+            assemble_stream(source, output, chunk_size=64)
+            ok = False
+        except ValueError:
+            pass
+        with open(output, "rb") as f:
+            ok = ok and len(f.read()) == size
+        ok = ok and sorted(os.listdir(tmp)) == ["out.bin", "prog.yaml"]  # без .tmp
+    return check("потоковое ассемблирование", ok)
+
+
+def test_asm_cache() -> bool:
+    """Кэш ассемблера: попадание, перекодирование только изменённого блока, .uasm."""
+    import yaml
+    from asm_cache import CHUNK_ITEMS, AssemblyCache, assemble_cached
+    from bench import generate_program
+
+    program, _ = generate_program(CHUNK_ITEMS * 2 + 100, "balanced", seed=3)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "prog.yaml")
+        with open(source, "w", encoding="utf-8") as f:
+            yaml.safe_dump({"program": program}, f, sort_keys=False)
+        cache = AssemblyCache(os.path.join(tmp, "cache"))
+        ok = assemble_cached(source, cache) == bytes(assemble(program)[0])
+        ok = ok and assemble_cached(source, cache) == bytes(assemble(program)[0])
+        ok = ok and (cache.hits, cache.misses) == (1, 4)  # файл + 3 блока, затем файл
+
+        # правка в последнем блоке: первые два берутся из кэша
+        program[-1] = {"op": "LOAD_CONST", "dst": 1, "value": 12345}
+        with open(source, "w", encoding="utf-8") as f:
+            yaml.safe_dump({"program": program}, f, sort_keys=False)
+        ok = ok and assemble_cached(source, cache) == bytes(assemble(program)[0])
+        ok = ok and (cache.hits, cache.misses) == (3, 6)
+
+        text_source = os.path.join(tmp, "prog.uasm")
+        with open(text_source, "w", encoding="utf-8") as f:
+            f.write(SELF_MODIFYING_SOURCE)
+        expected = bytes(assemble_text(SELF_MODIFYING_SOURCE)[0])
+        ok = ok and assemble_cached(text_source, cache) == expected
+        ok = ok and assemble_cached(text_source, cache) == expected and cache.hits == 4
+
+        # в каталог кэша нельзя писать (на его месте обычный файл): сборка идёт без кэша
+        broken = AssemblyCache(os.path.join(source, "cache"))
+        ok = ok and assemble_cached(source, broken) == bytes(assemble(program)[0])
+        ok = ok and assemble_cached(text_source, broken) == expected and broken.hits == 0
+    return check("кэш ассемблера", ok)
+
+
+def test_disassemble_round_trip() -> bool:
+    """disassemble -> assemble_text возвращает те же байты, включая не-команды."""
+    from bench import generate_program
+
+    program, _ = generate_program(500, "ror", seed=4)
+    codes = [
+        bytes(assemble(program)[0]),
+        bytes(assemble_text(SELF_MODIFYING_SOURCE)[0]),
+        bytes([0x3F, 0x00, 0x5E, 0xD9, 0x05]),  # неизвестный opcode и неполная LOAD_CONST
+        bytes([0x85, 0xFF]),                      # LOAD с лишними старшими битами
+        b"",
+    ]
+    ok = True
+    for code in codes:
+        text = "\n".join(disassemble(code))
+        ok = bytes(assemble_text(text)[0]) == code and ok
+    ok = ok and disassemble(codes[1])[:3] == ["LOAD_CONST r1, 200", "LOAD_CONST r2, 12",
+                                               "STORE r1, [r2]"]
+    return check("дизассемблер: обратное ассемблирование даёт тот же код", ok)
+
+
+def sequential_decode(memory, code_size: int) -> tuple[list, bool]:
+    """Команды, которые прочитал бы decode_instruction по порядку, и признак обрыва."""
+    from vm import decode_instruction
+
+    instrs, pc = [], 0
+    while True:
+        try:
+            A, B, C, size = decode_instruction(memory, pc, code_size)
+        except ValueError:
+            return instrs, True
+        if size == 0:
+            return instrs, False
+        instrs.append((pc, A, B, C, size))
+        pc += size
+
+
+def test_decode_program() -> bool:
+    """decode_program (NumPy и чистый Python) совпадает с decode_instruction."""
+    from bench import generate_program
+    from decoder import decode_program
+
+    program, _ = generate_program(2000, "const", seed=5)
+    code = bytes(assemble_text(SELF_MODIFYING_SOURCE)[0])
+    _, modified = run_program(code, 256)   # ячейки кода больше 255
+    cases = [
+        (bytes(assemble(program)[0]), None),
+        (modified, len(code)),
+        (bytes([0x5E, 0xD9, 0x05, 0x00, 0x85, 0x01, 0x5E, 0xD9]), None),  # обрыв LOAD_CONST
+        (bytes([0x85]), None),
+        (b"", None),
+    ]
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "program.bin")
+        with open(path, "wb") as f:
+            f.write(cases[0][0])
+        cases.append((load_binary(path), None))   # mmap
+        for memory, code_size in cases:
+            size = len(memory) if code_size is None else code_size
+            expected = sequential_decode(memory, size)
+            for use_numpy in (True, False):
+                decoded = decode_program(memory, code_size, use_numpy=use_numpy)
+                ok = (list(decoded.instructions()), decoded.truncated) == expected and ok
+    return check("decode_program совпадает с decode_instruction", ok)
+
+
+def test_addr_analysis() -> bool:
+    """Доказанные обращения идут без проверок, STORE в код по-прежнему сбрасывает записи."""
+    from addr_analysis import (
+        PROVEN, UNCHECKED_FLAG, UNSAFE, analyze_addresses, get_unchecked_code,
+    )
+    from vm import init_memory, predecode_program
+
+    # STORE в уже выполненный код (адрес 0) не мешает доказательствам дальше
+    source = """
+LOAD_CONST r1, 77
+LOAD_CONST r2, 0
+STORE r1, [r2]
+LOAD_CONST r4, 100
+STORE r1, [r4]
+LOAD r5, [r4]
+ROR r5, [r2]
+"""
+    code = bytes(assemble_text(source)[0])
+    memory = init_memory(code, 256)
+    report = analyze_addresses(predecode_program(memory, len(code)), len(code), 256)
+    ok = [a[4] for a in report.accesses] == [PROVEN] * 4 and report.unsafe_from is None
+
+    expected = run_program(code, 256)
+    for _ in range(ENGINE_RUNS):
+        ok = same_state(run_program_predecoded(code, 256), expected) and ok
+    flags = [entry[4] for entry in get_unchecked_code(code, init_memory(code, 256))
+             if entry is not None and entry[4] & UNCHECKED_FLAG]
+    ok = ok and len(flags) == 3   # STORE в код остаётся с проверкой
+
+    self_modifying = bytes(assemble_text(SELF_MODIFYING_SOURCE)[0])
+    memory = init_memory(self_modifying, 256)
+    report = analyze_addresses(predecode_program(memory, len(self_modifying)),
+                               len(self_modifying), 256)
+    ok = ok and report.unsafe_from == 8 and report.accesses[-1][4] == UNSAFE
+    return check("анализ адресов и обработчики без проверок", ok)
+
+
+def vm_state_after(code: bytes, memory_size: int, steps: int):
+    from vm import VM
+
+    vm = VM(code, memory_size)
+    vm.step(steps)
+    return vm.registers, vm.memory
+
+
+def test_trace_replay() -> bool:
+    """Состояния, восстановленные по полной и кольцевой трассе, совпадают с выполнением."""
+    from bench import generate_program
+    from exec_trace import RingTrace, TraceReplay, TraceWriter
+
+    program, memory_size = generate_program(3000, "memory", seed=6)
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for code in (bytes(assemble(program)[0]), bytes(assemble_text(SELF_MODIFYING_SOURCE)[0])):
+            steps = len(sequential_decode(code, len(code))[0])
+            expected = run_program(code, memory_size)
+            full, ring = os.path.join(tmp, "full.trace"), os.path.join(tmp, "ring.trace")
+            with TraceWriter(full, code, memory_size, buffer_records=256) as trace:
+                ok = same_state(run_program(code, memory_size, trace=trace), expected) and ok
+            trace = RingTrace(code, memory_size, capacity=500)
+            run_program(code, memory_size, trace=trace)
+            trace.save(ring)
+
+            replay = TraceReplay(full)
+            ok = ok and replay.count == steps
+            for step in (steps, steps // 2, 0, steps // 3, steps):
+                replay.seek(step)
+                ok = same_state((replay.registers, replay.memory),
+                                vm_state_after(code, memory_size, step)) and ok
+            replay.close()
+
+            replay = TraceReplay(ring)
+            ok = ok and replay.last_step == steps and replay.first_step == max(0, steps - 500)
+            for step in (replay.first_step, steps - 1, steps):
+                replay.seek(step)
+                ok = same_state((replay.registers, replay.memory),
+                                vm_state_after(code, memory_size, step)) and ok
+            replay.close()
+    return check("трасса: запись и воспроизведение", ok)
+
+
+def test_scheduler() -> bool:
+    """Планировщик: результаты как у run_program, ошибка одной УВМ не мешает другим."""
+    import asyncio
+    from bench import generate_program
+    from scheduler import Scheduler
+    from vm import VM
+
+    programs = [generate_program(size, "balanced", seed=size) for size in (200, 700, 1500)]
+    codes = [(bytes(assemble(program)[0]), memory_size) for program, memory_size in programs]
+    failing = bytes(assemble_text("LOAD_CONST r0, 70000\nLOAD r1, [r0]")[0])
+
+    async def run_all():
+        scheduler = Scheduler(quota=50)
+        tasks = [scheduler.submit(VM(code, size), priority=i + 1) for i, (code, size) in
+                 enumerate(codes)]
+        bad = scheduler.submit(VM(failing, 256))
+        await scheduler.run()
+        results = [await task for task in tasks]
+        try:
+            await bad
+            return results, None, scheduler.metrics()
+        except IndexError as e:
+            return results, e, scheduler.metrics()
+
+    results, error, metrics = asyncio.run(run_all())
+    ok = error is not None and all(
+        same_state(result, run_program(code, size)) for result, (code, size) in zip(results, codes))
+    ok = ok and [t["state"] for t in metrics["tasks"]] == ["done"] * 3 + ["failed"]
+    # квантами по 50 команд: программа из 1500 команд не выполнена за один раз
+    longest = metrics["tasks"][2]
+    ok = ok and longest["instructions"] == 1500 and longest["slices"] >= 1500 // 50
+    ok = ok and metrics["active"] == 0
+    return check("планировщик УВМ", ok)
+
+
+def test_delta_dumps() -> bool:
+    """База + дельты собираются в тот же дамп, что и полный дамп на тот же момент."""
+    from bench import generate_program
+    from delta_dump import IncrementalDumper, merge_dumps, read_bin_dump, run_with_deltas
+    from vm import VM
+
+    program, memory_size = generate_program(2000, "memory", seed=7)
+    code = bytes(assemble(program)[0])
+    end = memory_size - 1
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = run_with_deltas(code, os.path.join(tmp, "run"), 0, end, every=300,
+                                memory_size=memory_size)
+        registers, memory = run_program(code, memory_size)
+        _, _, merged_registers, cells = merge_dumps(paths[0], paths[1:])
+        ok = len(paths) > 3 and merged_registers == registers and list(cells) == list(memory)
+
+        # запись через poke между дампами тоже попадает в дельту
+        vm = VM(code, memory_size)
+        dumper = IncrementalDumper(vm, os.path.join(tmp, "poke"), 0, end)
+        paths = [dumper.dump()]
+        vm.step(500)
+        vm.poke(end, 123)
+        paths.append(dumper.dump())
+        full = os.path.join(tmp, "full.bin")
+        dump_memory(vm.memory, vm.registers, full, 0, end, "bin")
+        merged = merge_dumps(paths[0], paths[1:])
+        ok = ok and merged[3][end] == 123 and list(merged[3]) == list(read_bin_dump(full)[3])
+
+        try:
+            IncrementalDumper(run_program(code, memory_size), "x", 0, 1)
+            ok = False
+        except TypeError:
+            pass
+    return check("дельта-дампы: слияние совпадает с полным дампом", ok)
+
+
+def test_server() -> bool:
+    """Сервер: ответы как у run_program, ограничения запросов, перезапуск упавшего пула."""
+    import asyncio
+    import json
+    import signal
+    from server import MAX_RESPONSE_CELLS, Server
+
+    async def ask(server, request: dict) -> dict:
+        return json.loads(await server.process_line(json.dumps(request)))
+
+    code = bytes(assemble_text(SELF_MODIFYING_SOURCE)[0])
+    registers, memory = run_program(code, 256)
+
+    async def in_process(root: str):
+        server = Server(0, root=root, max_memory=1 << 16)
+        await server.start()
+        good = await ask(server, {"id": 1, "path": "prog.uasm", "memory_size": 256,
+                                  "start": 98, "end": 101, "engine": "blocks"})
+        errors = [await ask(server, request) for request in (
+            {"id": 2, "source": "", "memory_size": 1 << 17},
+            {"id": 3, "source": "", "memory_size": 1 << 16, "end": MAX_RESPONSE_CELLS},
+            {"id": 4, "path": "../outside.uasm"},
+            {"id": 5, "path": "/etc/passwd"},
+            {"id": 6, "source": "", "end": "1"},
+        )]
+        server.close()
+        return good, errors
+
+    async def crashed_worker():
+        server = Server(1, max_memory=1 << 16)
+        await server.start()
+        for pid in list(server.pool._processes):
+            os.kill(pid, signal.SIGKILL)
+        await asyncio.sleep(0.2)
+        crashed = await ask(server, {"id": 7, "source": SELF_MODIFYING_SOURCE, "syntax": "uasm"})
+        after = await ask(server, {"id": 8, "source": SELF_MODIFYING_SOURCE, "syntax": "uasm",
+                                   "memory_size": 256})
+        server.close()
+        return crashed, after, server.restarts
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "root")
+        os.mkdir(root)
+        for path in (os.path.join(root, "prog.uasm"), os.path.join(tmp, "outside.uasm")):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(SELF_MODIFYING_SOURCE)
+        good, errors = asyncio.run(in_process(root))
+    ok = (good["ok"] and good["registers"] == list(registers)
+          and good["memory"] == list(memory[98:102]))
+    ok = ok and [e["id"] for e in errors if not e["ok"]] == [2, 3, 4, 5, 6]
+
+    crashed, after, restarts = asyncio.run(crashed_worker())
+    ok = ok and not crashed["ok"] and crashed["id"] == 7 and restarts == 1
+    ok = ok and after["ok"] and after["registers"] == list(registers)
+    return check("сервер: запросы, ограничения и перезапуск пула", ok)
+
+
+def test_memory_types() -> bool:
+    """load_binary и run_program: типы результатов и содержимое (см. readme)."""
+    code = bytes(assemble_text(SELF_MODIFYING_SOURCE)[0])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "prog.bin")
+        with open(path, "wb") as f:
+            f.write(code)
+        loaded = load_binary(path)
+        ok = (bytes(loaded) == code and loaded[0] == code[0]
+              and bytes(loaded[:4]) == code[:4] and len(loaded) == len(code))
+        registers, memory = run_program(loaded, 256)
+
+        empty = os.path.join(tmp, "empty.bin")
+        open(empty, "wb").close()
+        ok = ok and load_binary(empty) == b""
+    ok = (ok and isinstance(registers, list) and isinstance(memory, array)
+          and len(memory) == 256 and memory[100] == registers[3]
+          and memory[12] == 200 and not any(memory[len(code):100])
+          and memory.itemsize >= 4)
+    return check("load_binary (mmap) и память run_program (array)", ok)
+
+
+def test_encoding() -> bool:
     # Тесты из спецификации УВМ (вариант 5)
     tests = [
         {
@@ -62,6 +631,36 @@ def main():
             print("  => FAIL\n")
             all_ok = False
 
+    return all_ok
+
+
+TESTS = [
+    test_encoding,
+    test_predecoded,
+    test_memory_types,
+    test_blocks,
+    test_paged_memory_fork,
+    test_vm_resume,
+    test_snapshot_file,
+    test_idioms,
+    test_paged_dump,
+    test_assemble_stream,
+    test_asm_cache,
+    test_disassemble_round_trip,
+    test_decode_program,
+    test_addr_analysis,
+    test_trace_replay,
+    test_scheduler,
+    test_delta_dumps,
+    test_server,
+]
+
+
+def main():
+    all_ok = True
+    for test in TESTS:
+        all_ok = test() and all_ok
+
     if all_ok:
         print("ИТОГ: ВСЕ ТЕСТЫ ПРОЙДЕНЫ")
     else:
@@ -1,5 +1,11 @@
+import argparse
+import json
+import mmap
+import os
+import struct
 import sys
-import xml.etree.ElementTree as ET
+from array import array
+from itertools import groupby
 
 # Опкоды из спецификации УВМ (вариант 5)
 OP_LOAD_CONST = 30  # загрузка константы
@@ -7,15 +13,39 @@ OP_LOAD = 5         # чтение значения из памяти
 OP_STORE = 33       # запись значения в память
 OP_ROR = 37         # побитовый циклический сдвиг вправо (для этапа 4)
 
+OPCODE_NAMES = {
+    OP_LOAD_CONST: "LOAD_CONST",
+    OP_LOAD: "LOAD",
+    OP_STORE: "STORE",
+    OP_ROR: "ROR",
+}
+
 NUM_REGS = 8                # B и C по 3 бита => 8 регистров
 DEFAULT_MEMORY_SIZE = 65536  # размер единой памяти УВМ (команды + данные)
 
+# Ячейка памяти хранит значение регистра (до 32 бит), поэтому bytearray
+# не подходит: память — это array беззнаковых 32-битных чисел.
+MEMORY_TYPECODE = "I" if array("I").itemsize >= 4 else "L"
+
+# Память больше этого размера (в ячейках) создаётся разреженной
+# (paged_memory.PagedMemory): страницы выделяются при первой записи.
+# Обычный array такого размера — 4 МБ, которые заполняются нулями при
+# каждом запуске, даже если программа трогает несколько ячеек.
+DENSE_MEMORY_LIMIT = 1 << 20
+
 
-def load_binary(path: str) -> list[int]:
-    """Читает бинарный файл программы и возвращает список байт (ints 0..255)."""
+def load_binary(path: str):
+    """
+    Отображает бинарный файл программы в память (mmap, только чтение).
+    Возвращает не список, а объект с интерфейсом bytes: индексация даёт
+    ints 0..255, срез — bytes; bytes() при необходимости делает копию.
+    Пустой файл отобразить нельзя, для него возвращается b"".
+    """
     with open(path, "rb") as f:
-        data = f.read()
-    return list(data)
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        # отображение остаётся действительным и после закрытия файла
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
 
 def decode_instruction(memory: list[int], pc: int, code_size: int):
@@ -125,19 +155,45 @@ def execute_instruction(A: int, B: int, C: int,
         raise ValueError(f"Неизвестный opcode A={A}")
 
 
-def run_program(program_bytes: list[int], memory_size: int = DEFAULT_MEMORY_SIZE):
+def program_cells(program_bytes) -> array:
+    """Байты программы (bytes, bytearray, mmap или список) как ячейки памяти."""
+    if not isinstance(program_bytes, list):
+        # итерация mmap отдаёт bytes длины 1, memoryview — ints
+        program_bytes = memoryview(program_bytes)
+    # iter() нужен, чтобы bytes не читались как сырые 4-байтовые элементы
+    return array(MEMORY_TYPECODE, iter(program_bytes))
+
+
+def init_memory(program_bytes: bytes, memory_size: int = DEFAULT_MEMORY_SIZE):
     """
-    Загружает программу в объединённую память, запускает интерпретатор
-    и возвращает (registers, memory) после выполнения.
+    Создаёт объединённую память УВМ и загружает в её начало байты программы.
+    Возвращает array или, для больших адресных пространств, PagedMemory.
     """
     if len(program_bytes) > memory_size:
         raise ValueError("Программа не помещается в память УВМ")
 
-    # Единая память: сначала байты программы, дальше — нули (данные)
-    memory = [0] * memory_size
-    for i, b in enumerate(program_bytes):
-        memory[i] = b
+    if memory_size > DENSE_MEMORY_LIMIT:
+        from paged_memory import PagedMemory  # модуль сам импортирует vm
+        return PagedMemory.from_program(program_bytes, memory_size)
+
+    # Единая память: сначала байты программы, дальше — нули (данные).
+    # Нулевая память размножается на уровне C, программа копируется одним
+    # присваиванием среза.
+    memory = array(MEMORY_TYPECODE, [0]) * memory_size
+    memory[:len(program_bytes)] = program_cells(program_bytes)
+    return memory
 
+
+def run_program(program_bytes: bytes, memory_size: int = DEFAULT_MEMORY_SIZE, trace=None):
+    """
+    Загружает программу в объединённую память, запускает интерпретатор
+    и возвращает (registers, memory) после выполнения. registers — список,
+    memory — array (см. init_memory), а не список: индексация, срезы, len
+    и итерация те же, но для сравнения со списком нужен list(memory).
+    trace — TraceWriter или RingTrace (exec_trace.py): каждая команда
+    выполняется через trace.execute, который пишет её запись.
+    """
+    memory = init_memory(program_bytes, memory_size)
     registers = [0] * NUM_REGS
     pc = 0
     code_size = len(program_bytes)
@@ -148,13 +204,460 @@ def run_program(program_bytes: list[int], memory_size: int = DEFAULT_MEMORY_SIZE
         if size == 0:
             break  # больше команд нет
 
-        execute_instruction(A, B, C, registers, memory)
+        if trace is None:
+            execute_instruction(A, B, C, registers, memory)
+        else:
+            trace.execute(pc, A, B, C, registers, memory)
         pc += size
 
     return registers, memory
 
 
-def dump_memory_to_xml(memory: list[int],
+# --- Движок с предварительным декодированием ---
+#
+# Область кода декодируется один раз в массив записей (handler, B, C, size, A),
+# индексируемый адресом команды. Выполнение идёт через таблицу обработчиков
+# по опкоду, без цепочки if/elif. Если STORE пишет в область кода, записи,
+# которые могли захватить изменённую ячейку, сбрасываются и декодируются
+# заново при следующем обращении. STORE узнаётся по опкоду A в записи, а не
+# по обработчику: записи, которые подставляют анализаторы (addr_analysis,
+# idioms), несут свой код операции вне 6-битного диапазона или None.
+
+def _exec_load_const(B: int, C: int, registers: list[int], memory: list[int]):
+    registers[B] = C
+
+
+def _exec_load(B: int, C: int, registers: list[int], memory: list[int]):
+    addr = registers[C]
+    if not (0 <= addr < len(memory)):
+        raise IndexError(f"LOAD: выход за пределы памяти: addr={addr}")
+    registers[B] = memory[addr]
+
+
+def _exec_store(B: int, C: int, registers: list[int], memory: list[int]):
+    addr = registers[C]
+    if not (0 <= addr < len(memory)):
+        raise IndexError(f"STORE: выход за пределы памяти: addr={addr}")
+    memory[addr] = registers[B]
+
+
+def _exec_ror(B: int, C: int, registers: list[int], memory: list[int]):
+    addr = registers[C]
+    if not (0 <= addr < len(memory)):
+        raise IndexError(f"ROR: выход за пределы памяти: addr={addr}")
+    shift = memory[addr] % 32
+    value = registers[B] & 0xFFFFFFFF
+    registers[B] = ((value >> shift) | (value << (32 - shift))) & 0xFFFFFFFF
+
+
+def _make_unknown_handler(A: int):
+    """Обработчик для неизвестного опкода: ошибка возникает только при выполнении."""
+    def handler(B: int, C: int, registers: list[int], memory: list[int]):
+        raise ValueError(f"Неизвестный opcode A={A}")
+    return handler
+
+
+# Таблица обработчиков, индексируемая опкодом (A — 6 бит => 64 элемента)
+OPCODE_HANDLERS = [_make_unknown_handler(A) for A in range(64)]
+OPCODE_HANDLERS[OP_LOAD_CONST] = _exec_load_const
+OPCODE_HANDLERS[OP_LOAD] = _exec_load
+OPCODE_HANDLERS[OP_STORE] = _exec_store
+OPCODE_HANDLERS[OP_ROR] = _exec_ror
+
+MAX_INSTRUCTION_SIZE = 4  # самая длинная команда — LOAD_CONST
+
+
+def decode_entry(memory: list[int], pc: int, code_size: int):
+    """
+    Декодирует команду по адресу pc в запись (handler, B, C, size, A).
+    Возвращает None, если команд больше нет.
+    """
+    A, B, C, size = decode_instruction(memory, pc, code_size)
+    if size == 0:
+        return None
+    return OPCODE_HANDLERS[A], B, C, size, A
+
+
+# Записи неизменяемы, поэтому одинаковые команды делят одну запись:
+# слово команды -> (handler, B, C, size, A). Размер словаря ограничен.
+ENTRY_MEMO_LIMIT = 1 << 16
+_entry_by_word: dict[int, tuple] = {}
+
+
+def _entry_for_word(word: int) -> tuple:
+    A = word & 0x3F
+    if A == OP_LOAD_CONST:
+        entry = (OPCODE_HANDLERS[A], (word >> 6) & 0x07, (word >> 9) & 0x1FFFF, 4, A)
+    else:
+        entry = (OPCODE_HANDLERS[A], (word >> 6) & 0x07, (word >> 9) & 0x07, 2, A)
+    if len(_entry_by_word) >= ENTRY_MEMO_LIMIT:
+        _entry_by_word.clear()
+    _entry_by_word[word] = entry
+    return entry
+
+
+def predecode_program(memory: list[int], code_size: int) -> list:
+    """
+    Декодирует область кода в массив записей длиной code_size:
+    по адресу начала команды лежит её запись, в остальных ячейках — None.
+    Ошибки декодирования не выбрасываются здесь: такая команда останется
+    None и будет декодирована (и выдаст ошибку) только при выполнении.
+    """
+    # Разбор слова продублирован из decode_instruction: вызов функции
+    # на каждую команду стоил бы дороже самого декодирования.
+    code = [None] * code_size
+    memo = _entry_by_word
+    pc = 0
+    while pc + 2 <= code_size:
+        word = memory[pc] | (memory[pc + 1] << 8)
+        if word & 0x3F == OP_LOAD_CONST:
+            if pc + 4 > code_size:
+                break
+            word |= (memory[pc + 2] << 16) | (memory[pc + 3] << 24)
+        entry = memo.get(word)
+        if entry is None:
+            entry = _entry_for_word(word)
+        code[pc] = entry
+        pc += entry[3]
+    return code
+
+
+# Кэш предекодированных программ: повторные запуски одной и той же
+# программы (пакетный режим, форки) не декодируют её заново.
+PREDECODE_CACHE_SIZE = 32
+_predecode_cache: dict[bytes, list] = {}
+
+
+def get_predecoded(program_bytes: bytes, memory: list[int]) -> list:
+    """Возвращает копию предекодированного кода программы (из кэша, если есть)."""
+    key = bytes(program_bytes)
+    code = _predecode_cache.pop(key, None)
+    if code is None:
+        code = predecode_program(memory, len(program_bytes))
+        if len(_predecode_cache) >= PREDECODE_CACHE_SIZE:
+            del _predecode_cache[next(iter(_predecode_cache))]
+    _predecode_cache[key] = code
+    # копия: при самомодификации кода записи в ней сбрасываются
+    return code.copy()
+
+
+def invalidate_code(code: list, addr: int):
+    """Сбрасывает записи, которые могли включать байт по адресу addr."""
+    for pc in range(max(0, addr - MAX_INSTRUCTION_SIZE + 1), min(addr + 1, len(code))):
+        code[pc] = None
+
+
+def run_program_predecoded(program_bytes: bytes,
+                           memory_size: int = DEFAULT_MEMORY_SIZE):
+    """
+    То же, что run_program, но команды декодируются один раз заранее,
+    а выполнение идёт через таблицу OPCODE_HANDLERS. При повторных запусках
+    обращения к памяти с доказанным адресом идут без проверок (addr_analysis.py).
+    Возвращает (registers, memory).
+    """
+    from addr_analysis import get_unchecked_code  # модуль сам импортирует vm
+
+    memory = init_memory(program_bytes, memory_size)
+    registers = [0] * NUM_REGS
+    code_size = len(program_bytes)
+    # доказанные статическим анализом обращения к памяти — без проверок границ
+    code = get_unchecked_code(program_bytes, memory)
+
+    store = OP_STORE
+    pc = 0
+    while pc < code_size:
+        entry = code[pc]
+        if entry is None:
+            entry = decode_entry(memory, pc, code_size)
+            if entry is None:
+                break  # больше команд нет
+            code[pc] = entry
+
+        handler, B, C, size, A = entry
+        handler(B, C, registers, memory)
+        if A == store and registers[C] < code_size:
+            # самомодифицирующийся код: декодируем изменённые команды заново
+            invalidate_code(code, registers[C])
+        pc += size
+
+    return registers, memory
+
+
+DIRTY_PAGE_BITS = 8  # страница отслеживания записей — 256 ячеек
+
+
+class VM:
+    """
+    Возобновляемая УВМ: регистры, pc и память сохраняются между вызовами
+    step(), поэтому выполнение можно прерывать, продолжать и копировать.
+    Исполняет команды так же, как run_program_predecoded.
+    После track_dirty() номера страниц (addr >> DIRTY_PAGE_BITS), в которые
+    писал STORE, накапливаются в dirty; take_dirty() забирает их.
+    Отслеживаются только записи через step() и poke(): движки run_program*
+    и прямое присваивание vm.memory[addr] грязные страницы не отмечают.
+    """
+
+    def __init__(self, program_bytes: bytes, memory_size: int = DEFAULT_MEMORY_SIZE,
+                 memory=None):
+        # memory — уже подготовленная память (например, PagedMemory),
+        # иначе создаётся обычная память с загруженной программой
+        self.memory = memory if memory is not None else init_memory(program_bytes, memory_size)
+        self.registers = [0] * NUM_REGS
+        self.code_size = len(program_bytes)
+        self.code = get_predecoded(program_bytes, self.memory)
+        self.pc = 0
+        self.executed = 0   # выполнено команд с начала программы
+        self.halted = False
+        self.dirty = None   # множество грязных страниц, если отслеживание включено
+
+    @classmethod
+    def from_state(cls, memory, registers: list[int], pc: int, code_size: int,
+                   code: list | None = None, executed: int = 0) -> "VM":
+        """
+        Восстанавливает УВМ из сохранённого состояния. Если предекодированный
+        код не передан, он строится заново по текущему содержимому памяти.
+        """
+        vm = cls.__new__(cls)
+        vm.memory = memory
+        vm.registers = list(registers)
+        vm.code_size = code_size
+        vm.code = code.copy() if code is not None else predecode_program(memory, code_size)
+        vm.pc = pc
+        vm.executed = executed
+        vm.halted = False
+        vm.dirty = None
+        return vm
+
+    def track_dirty(self):
+        """Включает отслеживание страниц памяти, изменённых STORE."""
+        self.dirty = set()
+
+    def take_dirty(self) -> set:
+        """Возвращает грязные страницы с прошлого вызова и начинает отсчёт заново."""
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    def poke(self, addr: int, value: int):
+        """
+        Запись в память извне программы (как STORE): отмечает грязную
+        страницу и сбрасывает предекодированные команды, если addr в коде.
+        """
+        if not (0 <= addr < len(self.memory)):
+            raise IndexError(f"poke: выход за пределы памяти: addr={addr}")
+        self.memory[addr] = value
+        if self.dirty is not None:
+            self.dirty.add(addr >> DIRTY_PAGE_BITS)
+        if addr < self.code_size:
+            invalidate_code(self.code, addr)
+
+    def step(self, n: int = 1) -> int:
+        """Выполняет не больше n команд. Возвращает число выполненных."""
+        memory, registers, code = self.memory, self.registers, self.code
+        code_size = self.code_size
+        dirty = self.dirty
+        store = OP_STORE
+        pc = self.pc
+        done = 0
+        try:
+            while done < n:
+                if pc >= code_size:
+                    self.halted = True
+                    break
+                entry = code[pc]
+                if entry is None:
+                    entry = decode_entry(memory, pc, code_size)
+                    if entry is None:
+                        self.halted = True
+                        break
+                    code[pc] = entry
+
+                handler, B, C, size, A = entry
+                handler(B, C, registers, memory)
+                if A == store:
+                    addr = registers[C]
+                    if dirty is not None:
+                        dirty.add(addr >> DIRTY_PAGE_BITS)
+                    if addr < code_size:
+                        invalidate_code(code, addr)
+                pc += size
+                done += 1
+        finally:
+            self.pc = pc
+            self.executed += done
+        return done
+
+    def run(self):
+        """Выполняет программу до конца. Возвращает (registers, memory)."""
+        while not self.halted:
+            self.step(1 << 20)
+        return self.registers, self.memory
+
+
+ENGINE_NAMES = ("reference", "predecoded", "blocks", "idioms")
+
+
+def get_engine(name: str):
+    """Возвращает функцию запуска (как run_program) по имени движка."""
+    if name == "reference":
+        return run_program
+    if name == "predecoded":
+        return run_program_predecoded
+    if name == "blocks":
+        from block_compiler import run_program_blocks  # модуль сам импортирует vm
+        return run_program_blocks
+    if name == "idioms":
+        from idioms import run_program_idioms
+        return run_program_idioms
+    raise ValueError(f"Неизвестный движок: {name}")
+
+
+# --- Дамп памяти ---
+#
+# Дамп пишется в файл по частям, не собирая всё дерево/строку в памяти.
+# Кроме XML поддерживаются компактные форматы:
+#   bin   — заголовок b"UVMD" + start, end, число регистров (little-endian),
+#           затем регистры и ячейки как 32-битные little-endian слова;
+#   hex   — строка регистров и строки "АДРЕС: слово слово ..." по 8 ячеек;
+#   jsonl — заголовок {"start", "end", "registers"}, затем {"addr", "value"};
+#   rle   — как hex, но серии нулей записываются строкой "Z адрес длина",
+#           а данные — строками "D адрес слово слово ...".
+
+DUMP_FORMATS = ("xml", "bin", "hex", "jsonl", "rle")
+DUMP_CHUNK = 4096       # ячеек за одну запись в файл
+HEX_CELLS_PER_LINE = 8
+
+
+def _check_dump_range(memory, start_addr: int, end_addr: int):
+    if start_addr < 0 or end_addr >= len(memory):
+        raise ValueError("Диапазон адресов выходит за пределы памяти")
+
+
+def _dump_chunks(memory, start_addr: int, end_addr: int):
+    """Отдаёт (адрес, срез ячеек) кусками по DUMP_CHUNK."""
+    for addr in range(start_addr, end_addr + 1, DUMP_CHUNK):
+        yield addr, memory[addr:min(addr + DUMP_CHUNK, end_addr + 1)]
+
+
+def _write_xml(f, memory, registers, start_addr: int, end_addr: int):
+    # Вывод совпадает байт в байт с прежней сборкой через ElementTree
+    f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+    f.write(f'<uvm_dump><memory start="{start_addr}" end="{end_addr}">')
+    for addr, cells in _dump_chunks(memory, start_addr, end_addr):
+        f.write("".join(f'<cell addr="{addr + i}">{value}</cell>'
+                        for i, value in enumerate(cells)))
+    f.write("</memory><registers>")
+    f.write("".join(f'<reg index="{i}">{value}</reg>'
+                    for i, value in enumerate(registers)))
+    f.write("</registers></uvm_dump>")
+
+
+def _write_bin(f, memory, registers, start_addr: int, end_addr: int):
+    f.write(struct.pack("<4sIIB", b"UVMD", start_addr, end_addr, len(registers)))
+    f.write(struct.pack(f"<{len(registers)}I", *registers))
+    for _, cells in _dump_chunks(memory, start_addr, end_addr):
+        f.write(struct.pack(f"<{len(cells)}I", *cells))
+
+
+def _hex_lines(addr: int, cells):
+    for i in range(0, len(cells), HEX_CELLS_PER_LINE):
+        words = " ".join(f"{v:08X}" for v in cells[i:i + HEX_CELLS_PER_LINE])
+        yield f"{addr + i:08X}: {words}\n"
+
+
+def _write_hex(f, memory, registers, start_addr: int, end_addr: int):
+    f.write("R: " + " ".join(f"{v:08X}" for v in registers) + "\n")
+    for addr, cells in _dump_chunks(memory, start_addr, end_addr):
+        f.writelines(_hex_lines(addr, cells))
+
+
+def _write_jsonl(f, memory, registers, start_addr: int, end_addr: int):
+    header = {"start": start_addr, "end": end_addr, "registers": list(registers)}
+    f.write(json.dumps(header) + "\n")
+    for addr, cells in _dump_chunks(memory, start_addr, end_addr):
+        f.write("".join(f'{{"addr": {addr + i}, "value": {value}}}\n'
+                        for i, value in enumerate(cells)))
+
+
+def data_spans(memory, start: int, stop: int):
+    """
+    Участки [начало, конец) внутри [start, stop), где могут быть ненулевые
+    ячейки. У разреженной памяти это выделенные страницы, у обычной —
+    весь диапазон.
+    """
+    allocated_ranges = getattr(memory, "allocated_ranges", None)
+    if allocated_ranges is None:
+        return [(start, stop)] if start < stop else []
+    return allocated_ranges(start, stop)
+
+
+def _write_rle(f, memory, registers, start_addr: int, end_addr: int):
+    f.write(f"UVM-RLE {start_addr} {end_addr}\n")
+    f.write("R " + " ".join(str(v) for v in registers) + "\n")
+    zero_start, zeros = start_addr, 0   # ещё не записанная серия нулей
+    addr = start_addr
+    # у разреженной памяти невыделенные страницы пропускаются целиком
+    for span_start, span_end in data_spans(memory, start_addr, end_addr + 1):
+        if span_start > addr:
+            if not zeros:
+                zero_start = addr
+            zeros += span_start - addr
+            addr = span_start
+        while addr < span_end:
+            cells = memory[addr:min(addr + DUMP_CHUNK, span_end)]
+            for is_data, run in groupby(cells, key=bool):
+                run = list(run)
+                if not is_data:
+                    if not zeros:
+                        zero_start = addr
+                    zeros += len(run)
+                else:
+                    if zeros:
+                        f.write(f"Z {zero_start} {zeros}\n")
+                        zeros = 0
+                    for i in range(0, len(run), HEX_CELLS_PER_LINE):
+                        words = " ".join(str(v) for v in run[i:i + HEX_CELLS_PER_LINE])
+                        f.write(f"D {addr + i} {words}\n")
+                addr += len(run)
+    if addr <= end_addr:
+        if not zeros:
+            zero_start = addr
+        zeros += end_addr + 1 - addr
+    if zeros:
+        f.write(f"Z {zero_start} {zeros}\n")
+
+
+DUMP_WRITERS = {
+    "xml": _write_xml,
+    "bin": _write_bin,
+    "hex": _write_hex,
+    "jsonl": _write_jsonl,
+    "rle": _write_rle,
+}
+
+
+def dump_memory(memory,
+                registers: list[int],
+                dump_path: str,
+                start_addr: int,
+                end_addr: int,
+                fmt: str = "xml"):
+    """
+    Сохраняет дамп диапазона памяти [start_addr, end_addr] и регистров
+    в файл dump_path в формате fmt (см. DUMP_FORMATS).
+    """
+    if fmt not in DUMP_WRITERS:
+        raise ValueError(f"Неизвестный формат дампа: {fmt}")
+    _check_dump_range(memory, start_addr, end_addr)
+
+    if fmt == "bin":
+        f = open(dump_path, "wb")
+    else:
+        f = open(dump_path, "w", encoding="utf-8", newline="\n")
+    with f:
+        DUMP_WRITERS[fmt](f, memory, registers, start_addr, end_addr)
+
+
+def dump_memory_to_xml(memory,
                        registers: list[int],
                        dump_path: str,
                        start_addr: int,
@@ -172,44 +675,51 @@ def dump_memory_to_xml(memory: list[int],
       </registers>
     </uvm_dump>
     """
-    if start_addr < 0 or end_addr >= len(memory):
-        raise ValueError("Диапазон адресов выходит за пределы памяти")
-
-    root = ET.Element("uvm_dump")
-
-    mem_el = ET.SubElement(
-        root,
-        "memory",
-        start=str(start_addr),
-        end=str(end_addr)
-    )
-
-    for addr in range(start_addr, end_addr + 1):
-        cell_el = ET.SubElement(mem_el, "cell", addr=str(addr))
-        cell_el.text = str(memory[addr])
-
-    regs_el = ET.SubElement(root, "registers")
-    for i, value in enumerate(registers):
-        reg_el = ET.SubElement(regs_el, "reg", index=str(i))
-        reg_el.text = str(value)
-
-    tree = ET.ElementTree(root)
-    tree.write(dump_path, encoding="utf-8", xml_declaration=True)
+    dump_memory(memory, registers, dump_path, start_addr, end_addr, "xml")
 
 
 def main():
-    # Ожидаемые аргументы:
-    # python vm.py program.bin dump.xml start_addr end_addr
-    if len(sys.argv) != 5:
-        print("Использование: python vm.py program.bin dump.xml start_addr end_addr")
-        sys.exit(1)
-
-    program_path = sys.argv[1]
-    dump_path = sys.argv[2]
+    # python vm.py program.bin dump.xml start_addr end_addr [--format FMT]
+    ap = argparse.ArgumentParser(description="Интерпретатор УВМ (вариант 5)")
+    ap.add_argument("program", help="бинарный файл программы")
+    ap.add_argument("dump", help="файл дампа памяти")
+    ap.add_argument("start_addr", help="начальный адрес дампа")
+    ap.add_argument("end_addr", help="конечный адрес дампа (включительно)")
+    ap.add_argument("--format", choices=DUMP_FORMATS, default="xml",
+                    help="формат дампа (по умолчанию xml)")
+    ap.add_argument("--memory-size", type=int, default=DEFAULT_MEMORY_SIZE,
+                    help="размер памяти в ячейках, до 2^32 (большая память разреженная)")
+    # Одиночный запуск выполняет программу один раз: предекодирование и
+    # кэши окупаются только при повторах (batch.py, server.py), поэтому
+    # по умолчанию здесь эталонный интерпретатор.
+    ap.add_argument("--engine", choices=ENGINE_NAMES, default="reference",
+                    help="движок выполнения (по умолчанию reference)")
+    ap.add_argument("--check", action="store_true",
+                    help="сверить результат с эталонным run_program")
+    ap.add_argument("--profile", action="store_true",
+                    help="выполнить с профилированием и напечатать отчёт")
+    ap.add_argument("--profile-json", metavar="PATH",
+                    help="выполнить с профилированием и сохранить отчёт в JSON")
+    ap.add_argument("--trace", metavar="PATH",
+                    help="записать трассу выполнения (эталонным интерпретатором)")
+    ap.add_argument("--trace-ring", type=int, metavar="N",
+                    help="хранить в трассе только последние N команд и конечное состояние")
+    ap.add_argument("--addr-report", metavar="PATH",
+                    help="сохранить в JSON статический анализ адресов LOAD/STORE/ROR")
+    args = ap.parse_args()
+    # профилировщик и трасса — инструментированные копии эталонного цикла
+    if (args.profile or args.profile_json) and args.engine != "reference":
+        ap.error("--profile и --profile-json выполняют программу эталонным "
+                 "интерпретатором и несовместимы с --engine " + args.engine)
+    if args.trace and args.engine != "reference":
+        ap.error("--trace выполняет программу эталонным интерпретатором "
+                 "и несовместим с --engine " + args.engine)
+    if args.trace_ring and not args.trace:
+        ap.error("--trace-ring задаёт размер трассы и требует --trace")
 
     try:
-        start_addr = int(sys.argv[3])
-        end_addr = int(sys.argv[4])
+        start_addr = int(args.start_addr)
+        end_addr = int(args.end_addr)
     except ValueError:
         print("start_addr и end_addr должны быть целыми числами")
         sys.exit(1)
@@ -219,14 +729,53 @@ def main():
         sys.exit(1)
 
     # 1) читаем бинарную программу
-    program_bytes = load_binary(program_path)
+    program_bytes = load_binary(args.program)
+
+    if args.addr_report:
+        from addr_analysis import analyze_addresses
+        memory = init_memory(program_bytes, args.memory_size)
+        report = analyze_addresses(predecode_program(memory, len(program_bytes)),
+                                   len(program_bytes), len(memory))
+        print(report.report())
+        report.save_json(args.addr_report)
 
     # 2) запускаем интерпретатор
-    registers, memory = run_program(program_bytes, DEFAULT_MEMORY_SIZE)
+    if args.trace:
+        # трасса пишется даже при ошибке выполнения — ради неё и пишется
+        from exec_trace import RingTrace, TraceWriter
+        if args.trace_ring:
+            trace = RingTrace(program_bytes, args.memory_size, args.trace_ring)
+        else:
+            trace = TraceWriter(args.trace, program_bytes, args.memory_size)
+        try:
+            registers, memory = run_program(program_bytes, args.memory_size, trace=trace)
+        finally:
+            if args.trace_ring:
+                trace.save(args.trace)
+            else:
+                trace.close()
+            print(f"Трасса: {trace.steps} команд записано в {args.trace}")
+    elif args.profile or args.profile_json:
+        # профилирование — отдельный инструментированный цикл
+        from profiler import run_program_profiled
+        registers, memory, profile = run_program_profiled(program_bytes, args.memory_size)
+        if args.profile:
+            print(profile.report())
+        if args.profile_json:
+            profile.save_json(args.profile_json)
+    else:
+        run = get_engine(args.engine)
+        registers, memory = run(program_bytes, args.memory_size)
+
+    if args.check:
+        ref_registers, ref_memory = run_program(program_bytes, args.memory_size)
+        if list(registers) != list(ref_registers) or memory != ref_memory:
+            print(f"Движок {args.engine} расходится с эталонным run_program")
+            sys.exit(1)
 
-    # 3) делаем дамп памяти в XML по указанному диапазону
+    # 3) делаем дамп памяти по указанному диапазону
     try:
-        dump_memory_to_xml(memory, registers, dump_path, start_addr, end_addr)
+        dump_memory(memory, registers, args.dump, start_addr, end_addr, args.format)
     except ValueError as e:
         print("Ошибка при формировании дампа:", e)
         sys.exit(1)
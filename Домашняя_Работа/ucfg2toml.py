@@ -1,8 +1,12 @@
 import argparse
+import hashlib
+import io
+import os
 import re
 import sys
+import time
 import unittest
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Optional, Sequence, TextIO
 
 from lark import Lark, Transformer, v_args, Token
 from lark.exceptions import UnexpectedInput
@@ -11,6 +15,9 @@ from lark.exceptions import UnexpectedInput
 class ParseError(Exception):
     pass
 
+
+NESTING_ERROR = "Слишком глубокая вложенность словарей и массивов"
+
 NUMBER_RE = r"-?(?:\d+\.\d+|\.\d+|\d+\.(?:[eE][+-]?\d+)?(?=\s*;)|\d+)(?:[eE][+-]?\d+)?"
 
 
@@ -52,7 +59,46 @@ BLOCK_COMMENT: /--\[\[[\s\S]*?\]\]/
 %ignore BLOCK_COMMENT
 """
 
-parser = Lark(GRAMMAR, start="start", parser="lalr")
+# Парсер строится лениво, при первом разборе: построение таблиц LALR
+# занимает большую часть времени запуска. Готовый парсер Lark сохраняет
+# в кэш на диске (файл назван по хэшу грамматики, внутри Lark ещё
+# проверяет свой хэш с версией библиотеки), и следующие запуски только
+# читают его. Каталог кэша задаёт UCFG_CACHE_DIR; пустое значение
+# отключает кэш.
+CACHE_DIR_ENV = "UCFG_CACHE_DIR"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ucfg2toml")
+GRAMMAR_HASH = hashlib.sha256(GRAMMAR.encode("utf-8")).hexdigest()[:16]
+
+_parser: Optional[Lark] = None
+
+
+def parser_cache_path() -> Optional[str]:
+    cache_dir = os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+    if not cache_dir:
+        return None
+    return os.path.join(cache_dir, f"lalr-{GRAMMAR_HASH}.lark")
+
+
+def get_parser() -> Lark:
+    global _parser
+    if _parser is None:
+        path = parser_cache_path()
+        cache: Any = False
+        if path is not None:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                cache = path
+            except OSError:
+                pass  # каталог недоступен — строим без кэша
+        _parser = Lark(GRAMMAR, start="start", parser="lalr", cache=cache)
+    return _parser
+
+
+def __getattr__(name: str) -> Any:
+    # совместимость: раньше парсер был атрибутом модуля ucfg2toml.parser
+    if name == "parser":
+        return get_parser()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 @v_args(inline=True)
@@ -118,6 +164,138 @@ def resolve_refs(obj: Any, consts: Dict[str, Any]) -> Any:
     return obj
 
 
+# Fast parser
+#
+# Однопроходный разбор без Lark: токены выдаёт один регулярный
+# сканер (пробелы, переводы строк и оба вида комментариев пропускаются
+# той же регуляркой), рекурсивный спуск сразу строит словари и списки,
+# а !(имя) подставляется при разборе. Ключевые слова узнаются по
+# контексту, как у контекстного лексера Lark: после global и внутри !( )
+# любое слово — имя, в словаре ключевое только end.
+#
+# Ошибки здесь не диагностируются: на любом расхождении с ожидаемым
+# (синтаксическая ошибка, неизвестная константа, пустой массив, плохая
+# escape-последовательность) process_text повторяет разбор через Lark,
+# который и выдаёт прежнее сообщение ParseError.
+
+# Каждый элемент пропуска совпадает единственным образом (строчный
+# комментарий — до конца строки, блочный — до первого «]]», пробел — по
+# одному символу). Иначе при неудаче следующего токена поиск с возвратом
+# продлил бы блочный комментарий до следующего «]]» или перебирал бы
+# разбиения пробелов; захватывающий *+ для этого нужен Python 3.11.
+_SKIP_RE = r"(?:[ \t]|\r?\n|\|\|[^\n]*(?![^\n])|--\[\[(?:[^\]]|\](?!\]))*\]\])*"
+_TOKEN_RE = re.compile(
+    _SKIP_RE
+    + rf"(?:(?P<number>{NUMBER_RE})|(?P<word>[a-zA-Z][a-zA-Z0-9]*)"
+    + r'|(?P<string>".*?(?<!\\)(?:\\\\)*?")|(?P<punct>:=|[;=.{}!()])|(?P<eof>\Z))'
+)
+
+
+class _FastPathError(Exception):
+    pass
+
+
+class _FastParser:
+    def __init__(self, text: Any, token_re: "re.Pattern" = _TOKEN_RE):
+        self._match = token_re.scanner(text).match
+        self.consts: Dict[str, Any] = {}
+        self.kind = ""
+        self.value = ""
+        self.advance()
+
+    def advance(self) -> None:
+        m = self._match()
+        if m is None:
+            raise _FastPathError()
+        kind = m.lastgroup
+        self.value = m.group(kind)
+        # для знаков препинания вид токена — сам знак
+        self.kind = self.value if kind == "punct" else kind
+
+    def expect(self, kind: str) -> str:
+        if self.kind != kind:
+            raise _FastPathError()
+        value = self.value
+        self.advance()
+        return value
+
+    def parse(self) -> Dict[str, Any]:
+        self.parse_globals()
+        body = self.parse_dict()
+        if self.kind != "eof":
+            raise _FastPathError()
+        return body
+
+    def parse_globals(self) -> None:
+        """Объявления global; останавливается на begin корневого словаря."""
+        while self.kind == "word" and self.value == "global":
+            self.advance()
+            name = self.expect("word")
+            self.expect("=")
+            self.consts[name] = self.parse_value()
+            if self.kind == ";":
+                self.advance()
+        if self.kind != "word" or self.value != "begin":
+            raise _FastPathError()
+
+    def const(self, name: str) -> Any:
+        if name not in self.consts:
+            raise _FastPathError()
+        return self.consts[name]
+
+    def parse_dict(self) -> Dict[str, Any]:
+        self.advance()  # begin
+        d: Dict[str, Any] = {}
+        while self.kind == "word":
+            key = self.value
+            self.advance()
+            if key == "end":
+                return d
+            self.expect(":=")
+            d[key] = self.parse_value()
+            self.expect(";")
+        raise _FastPathError()
+
+    def parse_value(self) -> Any:
+        kind, s = self.kind, self.value
+        if kind == "number":
+            self.advance()
+            if "." in s or "e" in s or "E" in s:
+                return float(s)
+            return int(s)
+        if kind == "string":
+            self.advance()
+            try:
+                return bytes(s[1:-1], "utf-8").decode("unicode_escape")
+            except UnicodeDecodeError:
+                raise _FastPathError()
+        if kind == "{":
+            self.advance()
+            items = [self.parse_value()]  # пустой массив Lark разбирает иначе
+            while self.kind == ".":
+                self.advance()
+                items.append(self.parse_value())
+            self.expect("}")
+            return items
+        if kind == "word" and s == "begin":
+            return self.parse_dict()
+        if kind == "!":
+            self.advance()
+            self.expect("(")
+            name = self.expect("word")
+            self.expect(")")
+            return self.const(name)
+        raise _FastPathError()
+
+
+def parse_fast(text: str) -> Dict[str, Any]:
+    """Разбирает конфигурацию без Lark; константы уже подставлены."""
+    try:
+        return _FastParser(text).parse()
+    except RecursionError:
+        raise _FastPathError()
+
+
 # TOML emit
 
 def escape_toml_string(s: str) -> str:
@@ -143,31 +321,104 @@ def render_value(value: Any) -> str:
     raise ValueError(f"Неподдерживаемый тип значения для TOML: {type(value)}")
 
 
-def emit_table(d: Dict[str, Any], lines: List[str], prefix: Optional[str] = None) -> None:
+# Таблицы выдаются по мере обхода дерева кусками текста, без списка строк
+# и без общей строки результата: write_toml пишет их сразу в файл или
+# stdout. Массив длиннее ARRAY_CHUNK элементов тоже выдаётся по кускам.
+ARRAY_CHUNK = 1024
+
+
+def iter_value(value: Any) -> Iterator[str]:
+    """Как render_value, но длинный массив выдаётся кусками по ARRAY_CHUNK элементов."""
+    if not isinstance(value, list) or len(value) <= ARRAY_CHUNK:
+        yield render_value(value)
+        return
+    yield "[ "
+    for i in range(0, len(value), ARRAY_CHUNK):
+        if i:
+            yield ", "
+        chunk = value[i:i + ARRAY_CHUNK]
+        if any(isinstance(v, list) and len(v) > ARRAY_CHUNK for v in chunk):
+            for j, v in enumerate(chunk):
+                if j:
+                    yield ", "
+                yield from iter_value(v)
+        else:
+            yield ", ".join(map(render_value, chunk))
+    yield " ]"
+
+
+def iter_table(d: Dict[str, Any], prefix: Optional[str] = None,
+               started: bool = False) -> Iterator[str]:
+    """
+    Строки таблицы d и её подтаблиц (каждая с "\n" в конце). started —
+    было ли уже что-то выдано: пустая строка ставится перед заголовком
+    любой таблицы, кроме самой первой строки результата.
+    """
     for k, v in d.items():
         if isinstance(v, dict):
             continue
-        lines.append(f"{k} = {render_value(v)}")
+        started = True
+        if isinstance(v, list) and len(v) > ARRAY_CHUNK:
+            yield f"{k} = "
+            yield from iter_value(v)
+            yield "\n"
+        else:
+            yield f"{k} = {render_value(v)}\n"
 
     for k, v in d.items():
         if not isinstance(v, dict):
             continue
         full = k if prefix is None else f"{prefix}.{k}"
-        if prefix is not None or lines:
-            lines.append("")
-        lines.append(f"[{full}]")
-        emit_table(v, lines, full)
+        yield f"\n[{full}]\n" if started else f"[{full}]\n"
+        started = True
+        yield from iter_table(v, full, True)
+
+
+def iter_toml(data: Dict[str, Any]) -> Iterator[str]:
+    empty = True
+    try:
+        for chunk in iter_table(data):
+            empty = False
+            yield chunk
+    except RecursionError:
+        raise ParseError(NESTING_ERROR)
+    if empty:
+        yield "\n"
+
+
+def write_toml(data: Dict[str, Any], out: TextIO) -> None:
+    write = out.write
+    for chunk in iter_toml(data):
+        write(chunk)
 
 
 def to_toml(data: Dict[str, Any]) -> str:
-    lines: List[str] = []
-    emit_table(data, lines)
-    return "\n".join(lines) + "\n"
+    return "".join(iter_toml(data))
+
+
+def parse_text(text: str) -> Dict[str, Any]:
+    """Разбирает конфигурацию: быстрый разбор, при неудаче — Lark."""
+    try:
+        return parse_fast(text)
+    except _FastPathError:
+        pass
+    try:
+        return parse_text_lark(text)
+    except RecursionError:
+        raise ParseError(NESTING_ERROR)
 
 
 def process_text(text: str) -> str:
+    return to_toml(parse_text(text))
+
+
+def process_text_lark(text: str) -> str:
+    return to_toml(parse_text_lark(text))
+
+
+def parse_text_lark(text: str) -> Dict[str, Any]:
     try:
-        tree = parser.parse(text)
+        tree = get_parser().parse(text)
         globals_list, body = Build().transform(tree)
 
         consts: Dict[str, Any] = {}
@@ -178,7 +429,7 @@ def process_text(text: str) -> str:
         if not isinstance(data, dict):
             raise ParseError("Корневой конфигурацией должен быть словарь (begin ... end)")
 
-        return to_toml(data)
+        return data
 
     except UnexpectedInput as e:
         ctx = ""
@@ -192,9 +443,646 @@ def process_text(text: str) -> str:
         raise ParseError(msg)
 
 
+# Streaming conversion
+#
+# Режим для очень больших файлов. Вход отображается в память (mmap) и
+# сканируется байтовой версией регулярки быстрого разбора, без чтения
+# файла в строку. Корневой словарь не строится: пары сразу выводятся в
+# TOML, массивы — поэлементно, значения !(имя) подставляются при разборе.
+#
+# Обычный вывод ставит скаляры таблицы перед её подтаблицами. Поэтому
+# подтаблицы вложенного словаря пишутся в отдельный буфер (в памяти до
+# SPILL_MEMORY символов, дальше во временный файл) и дописываются после
+# его end, а скаляры идут сразу. Таблица верхнего уровня выводится, как
+# только закрыт её end. В памяти остаются глобальные константы, ключи
+# открытых словарей и не больше SPILL_MEMORY на уровень вложенности — объём
+# определяется вложенностью, а не размером файла.
+#
+# Чего потоковый режим не повторяет (и сообщает об ошибке): скаляр корневого
+# словаря после таблицы верхнего уровня (она уже выведена), повторный
+# ключ (обычный вывод заменяет значение на прежнем месте) и таблицы глубже
+# STREAM_MAX_DEPTH. Сообщения об ошибках формирует сам потоковый разбор, без
+# Lark. Только файл не больше STREAM_FALLBACK_BYTES сначала преобразуется в
+# память и при ошибке разбирается обычным путём — так небольшие файлы дают
+# тот же результат, что и без --stream.
+
+SPILL_MEMORY = 1 << 20
+STREAM_MAX_DEPTH = 100  # и буферов подтаблиц не больше этого числа
+STREAM_FALLBACK_BYTES = 1 << 20
+
+_TOKEN_RE_BYTES = re.compile(_TOKEN_RE.pattern.encode("ascii"))
+_STREAMED = object()  # значение ещё не разобрано и выводится по мере разбора
+
+
+class _StreamConverter(_FastParser):
+    def __init__(self, buf: Any, out: TextIO):
+        self.buf = buf
+        self.out = out
+        self._last: Any = None
+        self._failed = False
+        self.started = False  # выведено ли что-нибудь в out (пустая строка перед таблицей)
+        self.spills: List[Any] = []  # буферы подтаблиц открытых словарей
+        try:
+            super().__init__(buf, _TOKEN_RE_BYTES)
+        except _FastPathError:
+            raise self.error("Синтаксическая ошибка")
+
+    def advance(self) -> None:
+        m = self._match()
+        if m is None:
+            self._failed = True
+            raise _FastPathError()
+        self._last = m
+        kind = m.lastgroup
+        self.value = m.group(kind).decode("utf-8")
+        self.kind = self.value if kind == "punct" else kind
+
+    @property
+    def pos(self) -> int:
+        """Смещение текущего токена (или места, где сканер не нашёл токена)."""
+        m = self._last
+        if m is None:
+            return 0
+        return m.end() if self._failed else m.start(m.lastgroup)
+
+    def const(self, name: str) -> Any:
+        if name not in self.consts:
+            raise ParseError(f"Неизвестная константа {name!r}")
+        return self.consts[name]
+
+    def error(self, message: str, pos: Optional[int] = None) -> ParseError:
+        line, column, context = _position(self.buf, self.pos if pos is None else pos)
+        return ParseError(f"{message} на {line}:{column}\n{context}")
+
+    def convert(self) -> None:
+        try:
+            self.parse_globals()
+            self.stream_table(None, self.out.write, 0)
+            if self.kind != "eof":
+                raise _FastPathError()
+        except _FastPathError:
+            raise self.error("Синтаксическая ошибка")
+        except RecursionError:
+            raise self.error(NESTING_ERROR)
+        finally:
+            for spill in self.spills:
+                spill.close()
+        if not self.started:
+            self.out.write("\n")
+
+    def stream_table(self, prefix: Optional[str], write: Any, depth: int) -> None:
+        """
+        Выводит словарь begin ... end как таблицу prefix (None — корень):
+        скаляры сразу в write, подтаблицы — после end.
+        """
+        if depth > STREAM_MAX_DEPTH:
+            raise self.error(f"{NESTING_ERROR} (больше {STREAM_MAX_DEPTH} уровней таблиц "
+                             "в потоковом режиме)")
+        self.advance()  # begin
+        keys = set()
+        spill = None
+        sub_write = write
+        has_tables = False
+        while self.kind == "word":
+            key = self.value
+            if key == "end":
+                self.advance()
+                if spill is not None:
+                    spill.seek(0)
+                    while chunk := spill.read(1 << 16):
+                        write(chunk)
+                    self.spills.pop().close()
+                return
+            if key in keys:
+                raise self.error(f"Повторный ключ {key!r} в потоковом режиме")
+            keys.add(key)
+            key_token = self._last
+            self.advance()
+            self.expect(":=")
+
+            if self.kind == "word" and self.value == "begin":
+                value = _STREAMED
+                is_table = True
+            else:
+                value = self.parse_value() if self.kind == "!" else _STREAMED
+                is_table = isinstance(value, dict)  # константа-словарь — тоже таблица
+
+            if is_table:
+                full = key if prefix is None else f"{prefix}.{key}"
+                if prefix is None:
+                    # верхний уровень — прямо в out
+                    self.out.write(f"\n[{full}]\n" if self.started else f"[{full}]\n")
+                    self.started = has_tables = True
+                else:
+                    if spill is None:
+                        import tempfile
+
+                        spill = tempfile.SpooledTemporaryFile(SPILL_MEMORY, "w+",
+                                                              encoding="utf-8")
+                        self.spills.append(spill)
+                        sub_write = spill.write
+                    sub_write(f"\n[{full}]\n")
+                if value is _STREAMED:
+                    self.stream_table(full, sub_write, depth + 1)
+                else:
+                    for chunk in iter_table(value, full, True):
+                        sub_write(chunk)
+                if prefix is None and hasattr(self.out, "flush"):
+                    self.out.flush()  # таблица верхнего уровня готова
+            else:
+                if prefix is None:
+                    if has_tables:
+                        raise self.error(f"Ключ {key!r} после таблиц верхнего уровня "
+                                         "в потоковом режиме",
+                                         key_token.start(key_token.lastgroup))
+                    self.started = True
+                write(f"{key} = ")
+                if value is _STREAMED:
+                    self.stream_value(write)
+                else:
+                    for chunk in iter_value(value):
+                        write(chunk)
+                write("\n")
+            self.expect(";")
+        raise _FastPathError()
+
+    def stream_value(self, write: Any) -> None:
+        """Выводит значение в строчной записи TOML по мере разбора."""
+        kind = self.kind
+        if kind == "{":
+            self.advance()
+            if self.kind == "}":
+                raise ValueError(f"Неподдерживаемый тип значения для TOML: {type(None)}")
+            write("[ ")
+            self.stream_value(write)
+            while self.kind == ".":
+                self.advance()
+                write(", ")
+                self.stream_value(write)
+            self.expect("}")
+            write(" ]")
+        elif kind == "word" and self.value == "begin":
+            self.advance()
+            keys = set()
+            write("{ ")
+            while self.kind == "word" and self.value != "end":
+                key = self.value
+                if key in keys:
+                    raise self.error(f"Повторный ключ {key!r} в потоковом режиме")
+                write(f", {key} = " if keys else f"{key} = ")
+                keys.add(key)
+                self.advance()
+                self.expect(":=")
+                self.stream_value(write)
+                self.expect(";")
+            self.expect("word")  # end
+            write(" }")
+        else:
+            value = self.parse_value()
+            if isinstance(value, list) and len(value) > ARRAY_CHUNK:
+                for chunk in iter_value(value):
+                    write(chunk)
+            else:
+                write(render_value(value))
+
+
+def _position(buf: Any, pos: int) -> Tuple[int, int, str]:
+    """Строка, столбец (с 1) и контекст с указателем, как в сообщениях Lark."""
+    line = 1
+    step = 1 << 20
+    for start in range(0, pos, step):
+        line += buf[start:min(start + step, pos)].count(b"\n")
+    line_start = buf.rfind(b"\n", 0, pos) + 1
+    before = bytes(buf[max(pos - 50, line_start):pos]).decode("utf-8", "replace")
+    after = bytes(buf[pos:pos + 50]).split(b"\n", 1)[0].decode("utf-8", "replace")
+    column = len(bytes(buf[line_start:pos]).decode("utf-8", "replace")) + 1
+    return line, column, before + after + "\n" + " " * len(before.expandtabs()) + "^"
+
+
+def convert_stream(path: str, out: TextIO, fallback_bytes: int = STREAM_FALLBACK_BYTES) -> None:
+    """
+    Потоково преобразует файл path в TOML, записывая результат в out.
+    Файл не больше fallback_bytes при ошибке потокового разбора
+    преобразуется обычным путём.
+    """
+    import mmap
+
+    with open(path, "rb") as f:
+        try:
+            buf: Any = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            buf = b""  # пустой файл нельзя отобразить в память
+    # отображение не закрываем явно: на буфер ссылается сканер регулярки
+    # (а при ошибке — и traceback), оно освободится вместе с ними
+    if len(buf) > fallback_bytes:
+        _StreamConverter(buf, out).convert()
+        return
+    result = io.StringIO()
+    try:
+        _StreamConverter(buf, result).convert()
+    except ParseError:
+        write_toml(parse_text(bytes(buf).decode("utf-8")), out)
+        return
+    out.write(result.getvalue())
+
+
+# Conversion cache
+#
+# Готовый TOML хранится на диске под ключом sha256 от исходного кода
+# самого преобразователя, текста входного файла и текстов файлов, от
+# которых он зависит (подключаемых глобальных констант в языке пока нет,
+# но ключ уже учитывает их). Неизменённый файл не разбирается повторно.
+# Записи — файлы <ключ>.toml; при попадании обновляется mtime. evict()
+# удаляет записи, не использованные дольше CACHE_MAX_AGE, а затем самые
+# старые, пока кэш больше max_bytes.
+
+CACHE_MAX_BYTES = 64 << 20
+CACHE_MAX_AGE = 30 * 24 * 3600
+
+_converter_digest: Optional[bytes] = None
+
+
+def converter_digest() -> bytes:
+    """Хэш исходного кода модуля: новая версия не берёт записи старой."""
+    global _converter_digest
+    if _converter_digest is None:
+        with open(os.path.abspath(__file__), "rb") as f:
+            _converter_digest = hashlib.sha256(f.read()).digest()
+    return _converter_digest
+
+
+def content_key(data: bytes, dependencies: Sequence[Tuple[str, bytes]] = ()) -> str:
+    """Ключ записи по содержимому файла и его зависимостей (путь, содержимое)."""
+    h = hashlib.sha256(converter_digest())
+    for part in (data, *(b for dep in sorted(dependencies) for b in (dep[0].encode(), dep[1]))):
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()
+
+
+def default_toml_cache_dir() -> Optional[str]:
+    cache_dir = os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+    return os.path.join(cache_dir, "toml") if cache_dir else None
+
+
+class ConversionCache:
+    def __init__(self, path: str, max_bytes: int = CACHE_MAX_BYTES,
+                 max_age: float = CACHE_MAX_AGE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + ".toml")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._file(key)
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                toml = f.read()
+            os.utime(path)  # отметка для LRU
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return toml
+
+    def put(self, key: str, toml: str) -> None:
+        path = self._file(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8", newline="") as f:
+                f.write(toml)
+            os.replace(tmp, path)  # параллельные процессы не видят недописанный файл
+        except OSError:
+            pass  # кэш не должен ломать преобразование
+
+    def put_stream(self, key: str, chunks: Iterable[str], out: TextIO) -> None:
+        """Пишет куски в out и одновременно в запись key; запись появляется, только если дописана."""
+        path = self._file(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            f: Optional[TextIO] = open(tmp, "w", encoding="utf-8", newline="")
+        except OSError:
+            f = None
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                if f is not None:
+                    try:
+                        f.write(chunk)
+                    except OSError:
+                        f.close()
+                        f = None
+        finally:
+            if f is not None:
+                f.close()
+            try:
+                if f is not None and sys.exc_info()[0] is None:
+                    os.replace(tmp, path)
+                else:
+                    os.remove(tmp)
+            except OSError:
+                pass
+
+    def evict(self) -> int:
+        """Удаляет устаревшие записи и самые старые сверх max_bytes. Возвращает их число."""
+        entries = []
+        total = 0
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.name.endswith(".toml") and entry.is_file():
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+        entries.sort()
+        oldest = time.time() - self.max_age
+        removed = 0
+        for mtime, size, path in entries:
+            if total <= self.max_bytes and mtime >= oldest:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+            total -= size
+        return removed
+
+
+def write_converted(data: bytes, out: TextIO, cache: Optional[ConversionCache] = None) -> bool:
+    """
+    Пишет TOML для содержимого файла в out по мере обхода дерева (при
+    промахе — одновременно в кэш). Возвращает True, если TOML взят из кэша.
+    """
+    key = ""
+    if cache is not None:
+        key = content_key(data)
+        toml = cache.get(key)
+        if toml is not None:
+            out.write(toml)
+            return True
+    chunks = iter_toml(parse_text(data.decode("utf-8")))
+    if cache is None:
+        write = out.write
+        for chunk in chunks:
+            write(chunk)
+    else:
+        cache.put_stream(key, chunks, out)
+    return False
+
+
+def convert_bytes(data: bytes, cache: Optional[ConversionCache] = None) -> str:
+    """Преобразует содержимое файла, беря готовый TOML из кэша, если он есть."""
+    buf = io.StringIO()
+    write_converted(data, buf, cache)
+    return buf.getvalue()
+
+
+# Batch
+
+INPUT_EXTENSION = ".ucfg"
+OUTPUT_EXTENSION = ".toml"
+
+
+def find_inputs(input_dir: str) -> List[str]:
+    """Пути всех .ucfg в каталоге и подкаталогах, относительно input_dir."""
+    found: List[str] = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(INPUT_EXTENSION):
+                found.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return found
+
+
+def convert_file(src: str, dst: str, cache: Optional[ConversionCache] = None) -> Optional[str]:
+    """Преобразует один файл в TOML. Возвращает текст ошибки или None."""
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    try:
+        with open(src, "rb") as f:
+            data = f.read()
+        os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+        # пишем во временный файл: при ошибке посреди вывода dst не портится
+        with open(tmp, "w", encoding="utf-8") as out:
+            cached = write_converted(data, out, cache)
+        if cached and _same_files(tmp, dst):
+            os.remove(tmp)  # файл не менялся — выход не переписываем
+        else:
+            os.replace(tmp, dst)
+    except Exception as e:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        if isinstance(e, ParseError):
+            return str(e)
+        # ошибка одного файла не должна прерывать весь пакет
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def _same_files(a: str, b: str) -> bool:
+    try:
+        with open(a, "rb") as fa, open(b, "rb") as fb:
+            return fa.read() == fb.read()
+    except OSError:
+        return False
+
+
+# кэш процесса-исполнителя пакета (см. _init_worker)
+_batch_cache: Optional[ConversionCache] = None
+
+
+def _convert_task(task: Tuple[str, str, str]) -> Tuple[str, int, Optional[str], bool]:
+    rel, src, dst = task
+    try:
+        size = os.path.getsize(src)
+    except OSError:
+        size = 0
+    hits = _batch_cache.hits if _batch_cache is not None else 0
+    error = convert_file(src, dst, _batch_cache)
+    hit = _batch_cache is not None and _batch_cache.hits > hits
+    return rel, size, error, hit
+
+
+def _init_worker(cache_dir: Optional[str] = None) -> None:
+    global _batch_cache
+    if cache_dir is not None:
+        _batch_cache = ConversionCache(cache_dir)
+    # прогрев: парсер Lark (нужен для диагностики) читается из кэша один раз на процесс
+    get_parser()
+    parse_fast("begin a := 1; end")
+
+
+def _convert_chunk(tasks: List[Tuple[str, str, str]]) -> List[Tuple[str, int, Optional[str], bool]]:
+    return [_convert_task(task) for task in tasks]
+
+
+WORKER_CRASHED = "Процесс-исполнитель завершился аварийно"
+
+
+def _convert_isolated(tasks: List[Tuple[str, str, str]],
+                      cache_dir: Optional[str]) -> List[Tuple[str, int, Optional[str], bool]]:
+    """
+    Файлы, не обработанные упавшим пулом, — по одному в отдельном процессе:
+    если он снова падает, ошибкой отмечается только этот файл, а процесс
+    создаётся заново.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    results = []
+    pool = None
+    try:
+        for task in tasks:
+            if pool is None:
+                pool = ProcessPoolExecutor(1, initializer=_init_worker, initargs=(cache_dir,))
+            try:
+                results += pool.submit(_convert_chunk, [task]).result()
+            except BrokenProcessPool:
+                pool.shutdown(wait=False)
+                pool = None
+                rel, src, _ = task
+                try:
+                    size = os.path.getsize(src)
+                except OSError:
+                    size = 0
+                results.append((rel, size, WORKER_CRASHED, False))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
+
+
+def convert_batch(input_dir: str, output_dir: str, jobs: int = 1,
+                  cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Преобразует все .ucfg из input_dir в .toml в output_dir (структура
+    подкаталогов сохраняется) на jobs процессах. С cache_dir неизменённые
+    файлы берутся из кэша преобразований. Возвращает сводку.
+    """
+    global _batch_cache
+    tasks = []
+    for rel in find_inputs(input_dir):
+        dst = os.path.join(output_dir, os.path.splitext(rel)[0] + OUTPUT_EXTENSION)
+        tasks.append((rel, os.path.join(input_dir, rel), dst))
+
+    started = time.perf_counter()
+    if jobs <= 1 or len(tasks) <= 1:
+        _batch_cache = ConversionCache(cache_dir) if cache_dir is not None else None
+        try:
+            results = [_convert_task(task) for task in tasks]
+        finally:
+            _batch_cache = None
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+
+        # куски по несколько файлов: меньше пересылок между процессами
+        chunksize = max(1, len(tasks) // (jobs * 8))
+        chunks = [tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize)]
+        results = []
+        unfinished = []
+        with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(cache_dir,)) as pool:
+            futures = [pool.submit(_convert_chunk, chunk) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                try:
+                    results += future.result()
+                except BrokenProcessPool:
+                    unfinished += chunk  # готовые куски сохраняются
+        if unfinished:
+            order = {task[0]: i for i, task in enumerate(tasks)}
+            results += _convert_isolated(unfinished, cache_dir)
+            results.sort(key=lambda result: order[result[0]])
+    seconds = time.perf_counter() - started
+
+    failed = [(rel, error) for rel, _, error, _ in results if error is not None]
+    hits = sum(1 for _, _, _, hit in results if hit)
+    evicted = ConversionCache(cache_dir).evict() if cache_dir is not None else 0
+    return {
+        "files": len(results),
+        "bytes": sum(size for _, size, _, _ in results),
+        "seconds": seconds,
+        "failed": failed,
+        "cache": cache_dir is not None,
+        "hits": hits,
+        "misses": len(results) - hits if cache_dir is not None else 0,
+        "evicted": evicted,
+    }
+
+
+def print_batch_summary(summary: Dict[str, Any], stats: bool = False) -> None:
+    for rel, error in summary["failed"]:
+        print(f"{rel}: {error}", file=sys.stderr)
+    seconds = summary["seconds"] or 1e-9
+    print(f"Файлов: {summary['files']}, успешно: {summary['files'] - len(summary['failed'])}, "
+          f"с ошибками: {len(summary['failed'])}", file=sys.stderr)
+    print(f"Время: {summary['seconds']:.2f} с, {summary['files'] / seconds:.1f} файлов/с, "
+          f"{summary['bytes'] / seconds / 1e6:.2f} МБ/с", file=sys.stderr)
+    if stats:
+        print_cache_stats(summary["cache"], summary["hits"], summary["misses"],
+                          summary["evicted"])
+
+
+def print_cache_stats(enabled: bool, hits: int, misses: int, evicted: int = 0) -> None:
+    if not enabled:
+        print("Кэш преобразований отключён", file=sys.stderr)
+        return
+    print(f"Кэш: попаданий {hits}, промахов {misses}, вытеснено {evicted}", file=sys.stderr)
+
+
 #Tests 
 
+# Общий корпус для сравнения быстрого разбора с Lark (плюс examples/*.ucfg)
+PARSER_CORPUS = [
+    "begin end",
+    "global p = 8080\nbegin\n server := begin port := !(p); end;\nend",
+    "global a = 1; global a = !(a)\nbegin x := !(a); end",
+    "global begin = {1. 2} begin endx := !(begin); end",
+    "begin begin := 1; global := 2; end",
+    "begin a := {1. .5}; b := {2.5. {3. 4}}; c := 2. ; end",
+    "begin a := -10; b := .5; c := 2.e3;\n d := -.5E+2; e := 1e3; end",
+    'begin s := "a\\"b\\\\"; t := "\\u00e9\\n"; end',
+    "|| c\n--[[ x\n]] begin --[[ ]] a || c\n := 1; end || c",
+    "begin c := { begin x := 1; end }; a := begin b := begin end; end; end",
+]
+
+
 class TestVariant5(unittest.TestCase):
+    def _corpus(self) -> List[str]:
+        texts = list(PARSER_CORPUS)
+        examples = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+        if os.path.isdir(examples):
+            for name in sorted(os.listdir(examples)):
+                if name.endswith(".ucfg"):
+                    with open(os.path.join(examples, name), "r", encoding="utf-8") as f:
+                        texts.append(f.read())
+        return texts
+
+    def test_fast_parser_matches_lark(self):
+        for src in self._corpus():
+            with self.subTest(src=src):
+                self.assertEqual(to_toml(parse_fast(src)), process_text_lark(src))
+
+    def test_fast_parser_falls_back_for_errors(self):
+        for src in ("begin a := 1 end", "begin a := !(x); end", "begin a := {1 .5}; end",
+                    "begin\r a := 1; end", "begin a := --[[ ]] -}0; b := 1; --[[ ]] end"):
+            with self.subTest(src=src):
+                with self.assertRaises(_FastPathError):
+                    parse_fast(src)
+                try:
+                    expected = process_text_lark(src)
+                except ParseError as e:
+                    with self.assertRaises(ParseError) as cm:
+                        process_text(src)
+                    self.assertEqual(str(cm.exception), str(e))
+                else:
+                    self.assertEqual(process_text(src), expected)
+
     def test_arrays_with_dots(self):
         src = """
         begin
@@ -265,6 +1153,158 @@ class TestVariant5(unittest.TestCase):
         self.assertIn(r'quote = "He said: \"ok\""', toml)
         self.assertIn(r'nl = "line1\nline2"', toml)
 
+    def test_batch_collects_errors(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            src_dir = os.path.join(tmp, "in")
+            os.makedirs(os.path.join(src_dir, "sub"))
+            for rel, text in (("ok.ucfg", "begin x := 1; end"),
+                              (os.path.join("sub", "bad.ucfg"), "begin x := 1 end")):
+                with open(os.path.join(src_dir, rel), "w", encoding="utf-8") as f:
+                    f.write(text)
+            summary = convert_batch(src_dir, os.path.join(tmp, "out"))
+            self.assertEqual(summary["files"], 2)
+            self.assertEqual([rel for rel, _ in summary["failed"]], [os.path.join("sub", "bad.ucfg")])
+            with open(os.path.join(tmp, "out", "ok.toml"), "r", encoding="utf-8") as f:
+                self.assertEqual(f.read(), "x = 1\n")
+
+    def test_batch_survives_worker_crash(self):
+        import multiprocessing
+        import tempfile
+        from unittest import mock
+
+        if multiprocessing.get_start_method() != "fork":
+            self.skipTest("подмена функции доходит до исполнителей только при fork")
+        convert_task = _convert_task
+
+        def crashing_task(task):
+            if task[0] == "crash.ucfg":
+                os._exit(1)  # как аварийное завершение исполнителя
+            return convert_task(task)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            src_dir = os.path.join(tmp, "in")
+            os.makedirs(src_dir)
+            names = [f"f{i}.ucfg" for i in range(8)] + ["crash.ucfg"]
+            for name in names:
+                with open(os.path.join(src_dir, name), "w", encoding="utf-8") as f:
+                    f.write("begin x := 1; end")
+            with mock.patch.object(sys.modules[__name__], "_convert_task", crashing_task):
+                summary = convert_batch(src_dir, os.path.join(tmp, "out"), jobs=2)
+            self.assertEqual(summary["files"], len(names))
+            self.assertEqual(summary["failed"], [("crash.ucfg", WORKER_CRASHED)])
+            self.assertEqual(sorted(os.listdir(os.path.join(tmp, "out"))),
+                             sorted(f"f{i}.toml" for i in range(8)))
+
+    def test_streaming_emitter(self):
+        big = list(range(ARRAY_CHUNK * 2 + 1))
+        data = {"a": big, "b": [big, [1, 2]], "t": {"x": "s", "u": {"y": [{"z": 1}]}}}
+        expected = (f"a = {render_value(big)}\nb = {render_value(data['b'])}\n"
+                    "\n[t]\nx = \"s\"\n\n[t.u]\ny = [ { z = 1 } ]\n")
+        buf = io.StringIO()
+        write_toml(data, buf)
+        self.assertEqual(buf.getvalue(), expected)
+        self.assertEqual(to_toml({}), "\n")
+        self.assertEqual(to_toml({"t": {}}), "[t]\n")
+
+    def test_stream_conversion(self):
+        import tempfile
+
+        sources = self._corpus() + [
+            "global c = begin y := 2; end\nbegin x := 1; t := begin u := begin end; "
+            "v := {1. begin a := {2}; end}; w := !(c); z := 3; end; end",
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "in.ucfg")
+            for src in sources:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(src)
+                with self.subTest(src=src):
+                    buf = io.StringIO()
+                    convert_stream(path, buf)
+                    self.assertEqual(buf.getvalue(), process_text(src))
+            # небольшой файл, который потоковый разбор не повторяет,
+            # преобразуется обычным путём; большой — ошибка с позицией
+            for src, message in (("begin t := begin end; x := 1; end", "после таблиц"),
+                                 ("begin x := 1; x := 2; end", "Повторный ключ"),
+                                 ("begin t := begin x := 1; x := 2; end; end", "Повторный ключ")):
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(src)
+                with self.subTest(src=src):
+                    buf = io.StringIO()
+                    convert_stream(path, buf)
+                    self.assertEqual(buf.getvalue(), process_text(src))
+                    with self.assertRaisesRegex(ParseError, message + ".* на 1:"):
+                        convert_stream(path, io.StringIO(), fallback_bytes=0)
+            for src in ("begin x := 1 end", "begin x := !(c); end"):
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(src)
+                for limit in (STREAM_FALLBACK_BYTES, 0):
+                    with self.assertRaises(ParseError):
+                        convert_stream(path, io.StringIO(), fallback_bytes=limit)
+            # таблица верхнего уровня выводится до того, как разобран весь файл
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("begin t := begin a := 1; end; u := begin b := {2. 3}; end; w := begin y := 1 end")
+            buf = io.StringIO()
+            with self.assertRaisesRegex(ParseError, "Синтаксическая ошибка на 1:"):
+                convert_stream(path, buf, fallback_bytes=0)
+            self.assertTrue(buf.getvalue().startswith("[t]\na = 1\n\n[u]\nb = [ 2, 3 ]\n"))
+
+    def test_deep_nesting(self):
+        import tempfile
+
+        depth = 5000
+        sources = ["begin x := " + "begin a := " * depth + "1" + "; end" * depth + "; end",
+                   "begin x := " + "{" * depth + "1" + "}" * depth + "; end"]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "in.ucfg")
+            for src in sources:
+                with self.assertRaisesRegex(ParseError, "вложенность"):
+                    process_text(src)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(src)
+                for limit in (STREAM_FALLBACK_BYTES, 0):
+                    with self.assertRaisesRegex(ParseError, "вложенность"):
+                        convert_stream(path, io.StringIO(), fallback_bytes=limit)
+
+    def test_conversion_cache(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ConversionCache(tmp, max_bytes=0)
+            data = b"begin x := 1; end"
+            self.assertEqual(convert_bytes(data, cache), "x = 1\n")
+            self.assertEqual(convert_bytes(data, cache), "x = 1\n")
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            self.assertNotEqual(content_key(data), content_key(data, [("inc.ucfg", b"global a = 1")]))
+            self.assertEqual(cache.evict(), 1)  # max_bytes=0: вытесняется всё
+            self.assertEqual(os.listdir(tmp), [])
+
+    def test_cache_opt_in_for_single_file(self):
+        import contextlib
+        import io
+        import tempfile
+        from unittest import mock
+
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "a.ucfg")
+            with open(src, "w", encoding="utf-8") as f:
+                f.write("begin x := 1; end")
+            default_dir = os.path.join(tmp, "default")
+            explicit_dir = os.path.join(tmp, "explicit")
+            with mock.patch.dict(os.environ, {CACHE_DIR_ENV: default_dir}), \
+                    contextlib.redirect_stdout(io.StringIO()) as out:
+                self.assertEqual(main_cli(["ucfg2toml", "--input", src]), 0)
+                self.assertFalse(os.path.exists(os.path.join(default_dir, "toml")))
+                self.assertEqual(main_cli(["ucfg2toml", "--input", src,
+                                           "--cache-dir", explicit_dir]), 0)
+                self.assertTrue(os.listdir(explicit_dir))
+                self.assertEqual(main_cli(["ucfg2toml", "--input-dir", tmp, "--output-dir",
+                                           os.path.join(tmp, "out"), "--jobs", "1"]), 0)
+                self.assertTrue(os.listdir(os.path.join(default_dir, "toml")))
+            self.assertEqual(out.getvalue().count("x = 1"), 2)
+
 
 def run_tests() -> int:
     suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestVariant5)
@@ -272,6 +1312,47 @@ def run_tests() -> int:
     return 0 if result.wasSuccessful() else 1
 
 
+# Benchmark
+
+_STARTUP_SNIPPET = (
+    "import time; t = time.perf_counter(); import ucfg2toml; "
+    "ucfg2toml.process_text('begin x := 1; end'); print(time.perf_counter() - t)"
+)
+
+
+def _startup_once(cache_dir: str) -> Tuple[float, float]:
+    """Один запуск нового интерпретатора: (весь процесс, импорт + первый разбор), с."""
+    import subprocess
+    env = dict(os.environ, **{CACHE_DIR_ENV: cache_dir})
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", _STARTUP_SNIPPET], env=env, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)),
+                         capture_output=True, text=True).stdout
+    return time.perf_counter() - started, float(out)
+
+
+def bench_startup(runs: int = 5) -> int:
+    """Время запуска: холодный (кэш пуст), тёплый (кэш есть) и без кэша."""
+    # модули нужны только бенчмарку и не должны удлинять обычный запуск
+    import statistics
+    import tempfile
+
+    results: Dict[str, List[Tuple[float, float]]] = {"холодный": [], "тёплый": [], "без кэша": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(runs):
+            cold_dir = os.path.join(tmp, f"cold{i}")
+            results["холодный"].append(_startup_once(cold_dir))
+            results["тёплый"].append(_startup_once(cold_dir))
+            results["без кэша"].append(_startup_once(""))
+
+    print(f"{'запуск':<10} {'процесс, мс':>12} {'импорт+разбор, мс':>18}  (медиана из {runs})")
+    for name, samples in results.items():
+        total = statistics.median(s[0] for s in samples) * 1e3
+        parse = statistics.median(s[1] for s in samples) * 1e3
+        print(f"{name:<10} {total:12.1f} {parse:18.1f}")
+    return 0
+
+
 # CLI
 
 def main_cli(argv: List[str]) -> int:
@@ -279,20 +1360,88 @@ def main_cli(argv: List[str]) -> int:
         description="Преобразователь учебного конфигурационного языка (вариант №5) в TOML"
     )
     ap.add_argument("--input", help="путь к входному .ucfg файлу")
+    ap.add_argument("--input-dir", help="каталог с .ucfg файлами для пакетного преобразования")
+    ap.add_argument("--output-dir", help="каталог для .toml файлов (с --input-dir)")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                    help="число процессов для --input-dir")
+    ap.add_argument("--cache-dir", help="каталог кэша преобразований; с --input кэш включается "
+                                        "только им, с --input-dir по умолчанию "
+                                        f"${CACHE_DIR_ENV}/toml")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="не использовать кэш преобразований в пакетном режиме")
+    ap.add_argument("--stats", action="store_true", help="вывести попадания и промахи кэша")
+    ap.add_argument("--stream", action="store_true",
+                    help="потоковое преобразование --input с памятью по глубине вложенности")
     ap.add_argument("--test", action="store_true", help="запустить встроенные тесты")
+    ap.add_argument("--bench-startup", type=int, nargs="?", const=5, metavar="RUNS",
+                    help="измерить время запуска с кэшем парсера и без него")
     args = ap.parse_args(argv[1:])
 
     if args.test:
         return run_tests()
 
+    if args.bench_startup:
+        return bench_startup(args.bench_startup)
+
+    if args.stream and args.cache_dir:
+        ap.error("--stream не использует кэш преобразований, --cache-dir с ним не сочетается")
+    if args.no_cache and args.cache_dir:
+        ap.error("--no-cache и --cache-dir взаимоисключающие")
+
+    # Одиночный файл кэшируется только по явному --cache-dir: повторно его
+    # преобразуют редко, и без спроса писать в домашний каталог незачем.
+    # Пакетный режим кэширует по умолчанию.
+    if args.no_cache:
+        cache_dir = None
+    elif args.cache_dir:
+        cache_dir = args.cache_dir
+    elif args.input_dir:
+        cache_dir = default_toml_cache_dir()
+    else:
+        cache_dir = None
+    if cache_dir is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError as e:
+            print(f"Кэш преобразований недоступен: {e}", file=sys.stderr)
+            cache_dir = None
+
+    if args.input_dir:
+        if not args.output_dir:
+            print("Ошибка: не указан --output-dir <dir>", file=sys.stderr)
+            return 2
+        if not os.path.isdir(args.input_dir):
+            print(f"Каталог не найден: {args.input_dir}", file=sys.stderr)
+            return 1
+        summary = convert_batch(args.input_dir, args.output_dir, args.jobs, cache_dir)
+        print_batch_summary(summary, args.stats)
+        return 1 if summary["failed"] else 0
+
     if not args.input:
-        print("Ошибка: не указан --input <file>", file=sys.stderr)
+        print("Ошибка: не указан --input <file> или --input-dir <dir>", file=sys.stderr)
         return 2
 
+    if args.stream:
+        try:
+            convert_stream(args.input, sys.stdout)
+            return 0
+        except FileNotFoundError:
+            print(f"Файл не найден: {args.input}", file=sys.stderr)
+            return 1
+        except ParseError as e:
+            print(str(e), file=sys.stderr)
+            return 1
+
+    cache = ConversionCache(cache_dir) if cache_dir is not None else None
     try:
-        with open(args.input, "r", encoding="utf-8") as f:
-            text = f.read()
-        sys.stdout.write(process_text(text))
+        with open(args.input, "rb") as f:
+            data = f.read()
+        write_converted(data, sys.stdout, cache)
+        if args.stats:
+            print_cache_stats(cache is not None, cache.hits if cache else 0,
+                              cache.misses if cache else 0)
+        if cache is not None and cache.misses:
+            cache.evict()
         return 0
     except FileNotFoundError:
         print(f"Файл не найден: {args.input}", file=sys.stderr)